@@ -1,8 +1,11 @@
 """Django admin interface for `~builds.models.Build` and related models."""
 
 from __future__ import absolute_import
+from django.conf.urls import url
 from django.contrib import admin
+from django.template.response import TemplateResponse
 from readthedocs.builds.models import Build, VersionAlias, Version, BuildCommandResult
+from readthedocs.builds.scheduler import build_scheduler_enabled, get_queue_stats
 from guardian.admin import GuardedModelAdmin
 
 
@@ -12,9 +15,11 @@ class BuildCommandResultInline(admin.TabularInline):
 
 
 class BuildAdmin(admin.ModelAdmin):
-    fields = ('project', 'version', 'type', 'state', 'error', 'success', 'length', 'cold_storage')
-    list_display = ('id', 'project', 'version_name', 'success', 'type', 'state', 'date')
-    list_filter = ('type', 'state', 'success')
+    fields = ('project', 'version', 'type', 'state', 'error', 'success', 'length',
+              'cold_storage', 'priority', 'dispatched')
+    list_display = ('id', 'project', 'version_name', 'success', 'type', 'state', 'priority',
+                    'date')
+    list_filter = ('type', 'state', 'success', 'priority')
     list_select_related = ('project', 'version')
     raw_id_fields = ('project', 'version')
     inlines = (BuildCommandResultInline,)
@@ -23,6 +28,24 @@ class BuildAdmin(admin.ModelAdmin):
     def version_name(self, obj):
         return obj.version.verbose_name
 
+    def get_urls(self):
+        urls = [
+            url(r'^queue/$', self.admin_site.admin_view(self.queue_view),
+                name='builds_build_queue'),
+        ]
+        return urls + super(BuildAdmin, self).get_urls()
+
+    def queue_view(self, request):
+        """Depth and wait times of the build queues."""
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title='Build queues',
+            queues=get_queue_stats(),
+            scheduler_enabled=build_scheduler_enabled(),
+        )
+        return TemplateResponse(request, 'admin/builds/build/queue.html', context)
+
 
 class VersionAdmin(GuardedModelAdmin):
     search_fields = ('slug', 'project__name')
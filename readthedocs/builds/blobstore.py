@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Content addressed storage for artifact files shared between versions.
+
+Files that are usually identical across versions, like the theme assets in
+``_static``, are replaced by hardlinks to a single copy in the store, keyed by
+the SHA1 of their content. The link count of a stored file is its reference
+count: once no version links to it anymore, only the store does, and garbage
+collection removes it.
+
+Files in the store must never be modified in place, writers have to replace
+them instead. Our syncers already do this, either by removing the target first
+or by writing to a new file and renaming it.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import errno
+import logging
+import os
+
+from builtins import object
+from django.conf import settings
+
+from readthedocs.builds.syncers import file_checksum, staging_path
+
+log = logging.getLogger(__name__)
+
+
+def blob_store_enabled():
+    return getattr(settings, 'ARTIFACT_BLOB_STORE', False)
+
+
+class BlobStore(object):
+
+    """
+    Hardlink store of file contents, under ``ARTIFACT_BLOB_ROOT``.
+
+    :param root: directory of the store, which must be on the same filesystem
+        as the files being deduplicated
+    """
+
+    def __init__(self, root=None):
+        if root is None:
+            root = getattr(
+                settings,
+                'ARTIFACT_BLOB_ROOT',
+                os.path.join(settings.PRODUCTION_ROOT, 'blobs'),
+            )
+        self.root = root
+
+    def blob_path(self, sha1):
+        return os.path.join(self.root, sha1[:2], sha1[2:])
+
+    def add(self, path, sha1):
+        """
+        Store the content of ``path``, unless it's already stored.
+
+        :returns: the path of the stored file, or ``None`` if ``path`` can't be
+            linked into the store
+        """
+        blob = self.blob_path(sha1)
+        if os.path.exists(blob):
+            return blob
+        parent = os.path.dirname(blob)
+        if not os.path.exists(parent):
+            try:
+                os.makedirs(parent)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        try:
+            os.link(path, blob)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                log.warning('Unable to store %s: %s', path, e)
+                return None
+        return blob
+
+    def link(self, path, sha1=None):
+        """
+        Replace ``path`` with a hardlink to the stored copy of its content.
+
+        :param sha1: SHA1 of the content of ``path``, computed if not given
+        :returns: whether ``path`` was replaced by a link
+        """
+        if sha1 is None:
+            sha1 = file_checksum(path)
+        blob = self.add(path, sha1)
+        if blob is None:
+            return False
+        blob_stat = os.stat(blob)
+        path_stat = os.stat(path)
+        if (blob_stat.st_ino, blob_stat.st_dev) == (path_stat.st_ino, path_stat.st_dev):
+            return False
+        if blob_stat.st_size != path_stat.st_size:
+            log.warning('Stored file size mismatch, not linking: %s', blob)
+            return False
+        tmp_path = staging_path(path)
+        os.link(blob, tmp_path)
+        os.rename(tmp_path, path)
+        return True
+
+    def dedup_tree(self, path, dirs=None):
+        """
+        Link the files under ``path`` that are in one of ``dirs`` to the store.
+
+        :param dirs: names of the directories to deduplicate, by default
+            ``ARTIFACT_BLOB_DIRS``
+        :returns: the number of files replaced by links
+        """
+        if dirs is None:
+            dirs = getattr(settings, 'ARTIFACT_BLOB_DIRS', ['_static'])
+        linked = 0
+        for root, __, files in os.walk(path):
+            relpath = os.path.relpath(root, path)
+            if not set(relpath.split(os.sep)) & set(dirs):
+                continue
+            for name in files:
+                full_path = os.path.join(root, name)
+                if os.path.islink(full_path):
+                    continue
+                if self.link(full_path):
+                    linked += 1
+        log.info('Deduplicated %s files in %s', linked, path)
+        return linked
+
+    def collect_garbage(self):
+        """
+        Remove stored files that aren't linked from anywhere else.
+
+        :returns: the number of files removed
+        """
+        removed = 0
+        for root, __, files in os.walk(self.root):
+            for name in files:
+                blob = os.path.join(root, name)
+                try:
+                    if os.stat(blob).st_nlink <= 1:
+                        os.remove(blob)
+                        removed += 1
+                except OSError:
+                    log.warning('Unable to collect %s', blob, exc_info=True)
+        log.info('Removed %s unreferenced files from %s', removed, self.root)
+        return removed
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Artifact bundles, a single archive holding the artifacts of a build.
+
+Bundles are created once on the build server and copied to the web servers as
+one file, instead of syncing every file of the artifact directory. A bundle is
+a gzipped tarball, read sequentially, with these members in order:
+
+``index.json``
+    The content index: each file path mapped to its size, its SHA1 and
+    whether its content is stored as a shared object.
+``objects/<sha1>``
+    Content of the files under the dedup directories (``_static`` by
+    default), stored once no matter how many files share it.
+``files/<path>``
+    The content of every other file.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tarfile
+
+from django.conf import settings
+
+from readthedocs.builds.syncers import file_checksum, staging_path, swap_tree
+
+log = logging.getLogger(__name__)
+
+BUNDLE_FORMAT = 1
+INDEX_NAME = 'index.json'
+OBJECTS_DIR = 'objects'
+FILES_DIR = 'files'
+
+SHA1_RE = re.compile('^[0-9a-f]{40}$')
+
+
+class BundleError(Exception):
+
+    """The bundle is malformed or its contents don't match its index."""
+
+
+def get_bundle_path(path):
+    """Return the bundle file path for the artifact directory ``path``."""
+    return os.path.normpath(path) + '.tar.gz'
+
+
+def get_dedup_dirs():
+    return getattr(settings, 'ARTIFACT_BUNDLE_DEDUP_DIRS', ['_static'])
+
+
+def _is_dedup(relpath, dedup_dirs):
+    return any(part in dedup_dirs for part in relpath.split('/')[:-1])
+
+
+def _safe_relpath(relpath):
+    """Return ``relpath`` if it stays inside the bundle, raise otherwise."""
+    normalized = os.path.normpath(relpath)
+    if (os.path.isabs(normalized) or normalized != relpath or
+            normalized.split('/')[0] in ('', '.', '..')):
+        raise BundleError('Invalid path in bundle: {0}'.format(relpath))
+    return relpath
+
+
+def build_index(path, dedup_dirs=None):
+    """
+    Build the content index of the directory ``path``.
+
+    :param dedup_dirs: directory names whose files are stored as objects
+    """
+    if dedup_dirs is None:
+        dedup_dirs = get_dedup_dirs()
+    files = {}
+    for root, __, filenames in os.walk(path, followlinks=True):
+        for filename in filenames:
+            full_path = os.path.join(root, filename)
+            relpath = os.path.relpath(full_path, path).replace(os.sep, '/')
+            files[relpath] = {
+                'size': os.path.getsize(full_path),
+                'sha1': file_checksum(full_path),
+                'object': _is_dedup(relpath, dedup_dirs),
+            }
+    return {'format': BUNDLE_FORMAT, 'files': files}
+
+
+def create_bundle(path, bundle_file=None, dedup_dirs=None):
+    """
+    Pack the directory ``path`` into a bundle.
+
+    :param bundle_file: path of the bundle, next to ``path`` by default
+    :returns: the path of the bundle
+    """
+    if bundle_file is None:
+        bundle_file = get_bundle_path(path)
+    index = build_index(path, dedup_dirs=dedup_dirs)
+    log.info(
+        'Creating bundle %s with %s files', bundle_file, len(index['files']))
+
+    staging = staging_path(bundle_file)
+    try:
+        with tarfile.open(staging, 'w:gz', compresslevel=6) as tar:
+            data = json.dumps(index, sort_keys=True).encode('utf-8')
+            info = tarfile.TarInfo(INDEX_NAME)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+            entries = sorted(index['files'].items())
+            written = set()
+            for relpath, entry in entries:
+                if entry['object'] and entry['sha1'] not in written:
+                    tar.add(
+                        os.path.join(path, relpath),
+                        arcname='/'.join([OBJECTS_DIR, entry['sha1']]),
+                        recursive=False,
+                    )
+                    written.add(entry['sha1'])
+            for relpath, entry in entries:
+                if not entry['object']:
+                    tar.add(
+                        os.path.join(path, relpath),
+                        arcname='/'.join([FILES_DIR, relpath]),
+                        recursive=False,
+                    )
+        os.rename(staging, bundle_file)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    return bundle_file
+
+
+def _extract_member(tar, member, dest, sha1):
+    """Write ``member`` to ``dest``, checking its content against ``sha1``."""
+    parent = os.path.dirname(dest)
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    digest = hashlib.sha1()
+    source = tar.extractfile(member)
+    with open(dest, 'wb') as fh:
+        for block in iter(lambda: source.read(65536), b''):
+            digest.update(block)
+            fh.write(block)
+    if digest.hexdigest() != sha1:
+        raise BundleError('Checksum mismatch for {0}'.format(member.name))
+    os.chmod(dest, member.mode & 0o777)
+    os.utime(dest, (member.mtime, member.mtime))
+
+
+def extract_bundle(bundle_file, target):
+    """
+    Unpack a bundle into ``target``, verifying it against its index.
+
+    The bundle is read in a single pass into a directory next to ``target``,
+    which is swapped in once every file was written and verified. Files that
+    share an object are hardlinks to the same content.
+    """
+    log.info('Extracting bundle %s to %s', bundle_file, target)
+    parent = os.path.dirname(os.path.normpath(target))
+    if parent and not os.path.exists(parent):
+        os.makedirs(parent)
+    staging = staging_path(target)
+    objects = staging_path(os.path.join(parent, OBJECTS_DIR))
+    try:
+        os.makedirs(staging)
+        os.makedirs(objects)
+        files = None
+        extracted = set()
+        with tarfile.open(bundle_file, 'r|gz') as tar:
+            for member in tar:
+                if files is None:
+                    if member.name != INDEX_NAME:
+                        raise BundleError('Bundle index not found')
+                    index = json.loads(
+                        tar.extractfile(member).read().decode('utf-8'))
+                    if index.get('format') != BUNDLE_FORMAT:
+                        raise BundleError('Unknown bundle format')
+                    files = index['files']
+                    for relpath in files:
+                        _safe_relpath(relpath)
+                    continue
+                if not member.isfile():
+                    raise BundleError(
+                        'Unexpected bundle member: {0}'.format(member.name))
+                kind, __, name = member.name.partition('/')
+                if kind == OBJECTS_DIR and SHA1_RE.match(name):
+                    _extract_member(
+                        tar, member, os.path.join(objects, name), name)
+                elif (kind == FILES_DIR and name in files and
+                      not files[name]['object']):
+                    _extract_member(
+                        tar, member, os.path.join(staging, name),
+                        files[name]['sha1'])
+                else:
+                    raise BundleError(
+                        'Unexpected bundle member: {0}'.format(member.name))
+                extracted.add(member.name)
+
+        if files is None:
+            raise BundleError('Bundle index not found')
+        for relpath, entry in files.items():
+            dest = os.path.join(staging, relpath)
+            if entry['object']:
+                source = os.path.join(objects, entry['sha1'])
+                if not os.path.exists(source):
+                    raise BundleError('Object missing for {0}'.format(relpath))
+                if not os.path.exists(os.path.dirname(dest)):
+                    os.makedirs(os.path.dirname(dest))
+                os.link(source, dest)
+            elif '/'.join([FILES_DIR, relpath]) not in extracted:
+                raise BundleError('File missing from bundle: {0}'.format(relpath))
+        swap_tree(staging, target)
+    except tarfile.TarError as e:
+        raise BundleError('Invalid bundle: {0}'.format(e))
+    finally:
+        shutil.rmtree(objects, ignore_errors=True)
+        if os.path.exists(staging):
+            shutil.rmtree(staging, ignore_errors=True)
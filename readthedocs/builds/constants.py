@@ -17,6 +17,17 @@ BUILD_STATE = (
     (BUILD_STATE_FINISHED, _('Finished')),
 )
 
+# Builds with a higher priority are dispatched first by the build scheduler
+BUILD_PRIORITY_LOW = 0
+BUILD_PRIORITY_NORMAL = 5
+BUILD_PRIORITY_HIGH = 9
+
+BUILD_PRIORITY = (
+    (BUILD_PRIORITY_LOW, _('Low')),
+    (BUILD_PRIORITY_NORMAL, _('Normal')),
+    (BUILD_PRIORITY_HIGH, _('High')),
+)
+
 BUILD_TYPES = (
     ('html', _('HTML')),
     ('pdf', _('PDF')),
@@ -50,3 +61,6 @@ NON_REPOSITORY_VERSIONS = (
     LATEST,
     STABLE,
 )
+
+# Types of the downloadable files of a version
+ARTIFACT_TYPES = ('pdf', 'epub', 'htmlzip')
@@ -4,6 +4,7 @@ from __future__ import absolute_import
 from builtins import object
 from django import forms
 
+from readthedocs.builds.constants import BUILD_PRIORITY_HIGH
 from readthedocs.builds.models import VersionAlias, Version
 from readthedocs.projects.models import Project
 from readthedocs.core.utils import trigger_build
@@ -36,5 +37,9 @@ class VersionForm(forms.ModelForm):
     def save(self, commit=True):
         obj = super(VersionForm, self).save(commit=commit)
         if obj.active and not obj.built and not obj.uploaded:
-            trigger_build(project=obj.project, version=obj)
+            trigger_build(
+                project=obj.project,
+                version=obj,
+                priority=BUILD_PRIORITY_HIGH,
+            )
         return obj
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0004_add-apiversion-proxy-model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='timings',
+            field=jsonfield.fields.JSONField(blank=True, help_text='Build time in seconds of each output format.', null=True, verbose_name='Timings'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0005_add-build-timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='fingerprint',
+            field=models.CharField(blank=True, help_text='Hash of the documentation sources and build configuration.', max_length=40, null=True, verbose_name='Fingerprint'),
+        ),
+    ]
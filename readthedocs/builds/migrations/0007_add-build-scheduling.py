@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0006_add-build-fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='dispatched',
+            field=models.DateTimeField(blank=True, help_text='When the build was sent to the build queue.', null=True, verbose_name='Dispatched'),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='force',
+            field=models.BooleanField(default=False, help_text='Build the documentation even if the files did not change.', verbose_name='Force'),
+        ),
+        migrations.AddField(
+            model_name='build',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Low'), (5, 'Normal'), (9, 'High')], default=5, verbose_name='Priority'),
+        ),
+    ]
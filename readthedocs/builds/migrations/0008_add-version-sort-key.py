@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from readthedocs.projects.version_handling import version_sort_key
+
+
+def forwards_populate_sort_key(apps, schema_editor):
+    """Compute the sort key of the existing versions."""
+    Version = apps.get_model('builds', 'Version')
+    versions = Version.objects.values_list('pk', 'verbose_name')
+    for pk, verbose_name in versions.iterator():
+        sort_key = version_sort_key(verbose_name)
+        if sort_key:
+            Version.objects.filter(pk=pk).update(sort_key=sort_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0007_add-build-scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='version',
+            name='sort_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='Sort key'),
+        ),
+        migrations.AlterIndexTogether(
+            name='version',
+            index_together=set([('project', 'sort_key')]),
+        ),
+        migrations.RunPython(
+            forwards_populate_sort_key, migrations.RunPython.noop),
+    ]
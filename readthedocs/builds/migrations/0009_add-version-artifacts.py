@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0008_add-version-sort-key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='version',
+            name='artifacts',
+            field=jsonfield.fields.JSONField(blank=True, editable=False, help_text='Downloadable files of the version, by type.', null=True, verbose_name='Artifacts'),
+        ),
+    ]
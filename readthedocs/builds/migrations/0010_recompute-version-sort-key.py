@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from readthedocs.projects.version_handling import version_sort_key
+
+
+def forwards_recompute_sort_key(apps, schema_editor):
+    """Encode the sort key of the existing versions without punctuation."""
+    Version = apps.get_model('builds', 'Version')
+    versions = Version.objects.exclude(sort_key='').values_list(
+        'pk', 'verbose_name')
+    for pk, verbose_name in versions.iterator():
+        Version.objects.filter(pk=pk).update(
+            sort_key=version_sort_key(verbose_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0009_add-version-artifacts'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            forwards_recompute_sort_key, migrations.RunPython.noop),
+    ]
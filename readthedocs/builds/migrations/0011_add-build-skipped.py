@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def forwards_mark_skipped_builds(apps, schema_editor):
+    Build = apps.get_model('builds', 'Build')
+    Build.objects.filter(
+        state='finished',
+        output__startswith='Skipped, superseded by build',
+    ).update(skipped=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0010_recompute-version-sort-key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='build',
+            name='skipped',
+            field=models.BooleanField(default=False, help_text='Superseded by a newer build before it started.', verbose_name='Skipped'),
+        ),
+        migrations.RunPython(
+            forwards_mark_skipped_builds, migrations.RunPython.noop),
+    ]
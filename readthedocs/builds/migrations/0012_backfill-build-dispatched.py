@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import F
+
+
+def forwards_backfill_dispatched(apps, schema_editor):
+    """
+    Mark the builds that were not finished before scheduling as dispatched.
+
+    They were sent to the build queue when they were triggered, the build
+    scheduler must not send them again.
+    """
+    Build = apps.get_model('builds', 'Build')
+    Build.objects.filter(dispatched__isnull=True).exclude(
+        state='finished',
+    ).update(dispatched=F('date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('builds', '0011_add-build-skipped'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            forwards_backfill_dispatched, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,7 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import datetime
 import logging
 import os.path
 import re
@@ -13,21 +14,30 @@ from shutil import rmtree
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ugettext
-from guardian.shortcuts import assign
+from jsonfield import JSONField
 from taggit.managers import TaggableManager
 
 from readthedocs.core.utils import broadcast
+from readthedocs.core.utils.side_effects import (
+    run_side_effect, run_side_effect_on_commit)
 from readthedocs.projects.constants import (
     BITBUCKET_URL, GITHUB_URL, GITLAB_URL, PRIVACY_CHOICES, PRIVATE)
 from readthedocs.projects.models import APIProject, Project
+from readthedocs.projects.version_handling import (
+    VERSION_SORT_KEY_LENGTH, version_sort_key)
 
+from .blobstore import BlobStore, blob_store_enabled
 from .constants import (
-    BRANCH, BUILD_STATE, BUILD_STATE_FINISHED, BUILD_TYPES, LATEST,
-    NON_REPOSITORY_VERSIONS, STABLE, TAG, VERSION_TYPES)
+    ARTIFACT_TYPES, BRANCH, BUILD_PRIORITY, BUILD_PRIORITY_NORMAL, BUILD_STATE,
+    BUILD_STATE_FINISHED, BUILD_TYPES, LATEST, NON_REPOSITORY_VERSIONS, STABLE,
+    TAG, VERSION_TYPES)
 from .managers import VersionManager
+from .syncers import file_checksum
 from .querysets import BuildQuerySet, RelatedBuildQuerySet, VersionQuerySet
 from .utils import (
     get_bitbucket_username_repo, get_github_username_repo,
@@ -77,6 +87,13 @@ class Version(models.Model):
     slug = VersionSlugField(
         _('Slug'), max_length=255, populate_from='verbose_name')
 
+    #: Sorts like the version number in ``verbose_name``, empty if it isn't a
+    #: version number. See
+    #: :py:func:`readthedocs.projects.version_handling.version_sort_key`.
+    sort_key = models.CharField(
+        _('Sort key'), max_length=VERSION_SORT_KEY_LENGTH, blank=True,
+        default='', editable=False)
+
     supported = models.BooleanField(_('Supported'), default=True)
     active = models.BooleanField(_('Active'), default=False)
     built = models.BooleanField(_('Built'), default=False)
@@ -90,11 +107,15 @@ class Version(models.Model):
     )
     tags = TaggableManager(blank=True)
     machine = models.BooleanField(_('Machine Created'), default=False)
+    artifacts = JSONField(
+        _('Artifacts'), null=True, blank=True, editable=False,
+        help_text='Downloadable files of the version, by type.')
 
     objects = VersionManager.from_queryset(VersionQuerySet)()
 
     class Meta(object):
         unique_together = [('project', 'slug')]
+        index_together = [('project', 'sort_key')]
         ordering = ['-verbose_name']
         permissions = (
             # Translators: Permission around whether a user can view the
@@ -165,25 +186,31 @@ class Version(models.Model):
             version_slug=self.slug, private=private)
 
     def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
-        """Add permissions to the Version for all owners on save."""
         from readthedocs.projects import tasks
         obj = super(Version, self).save(*args, **kwargs)
-        for owner in self.project.users.all():
-            assign('view_version', owner, self)
         try:
-            self.project.sync_supported_versions()
+            run_side_effect(
+                ('sync_supported_versions', self.project.pk),
+                self.project.sync_supported_versions,
+            )
         except Exception:
             log.exception('failed to sync supported versions')
-        broadcast(
-            type='app', task=tasks.symlink_project, args=[self.project.pk])
+        run_side_effect_on_commit(
+            ('symlink_project', self.project.pk),
+            broadcast,
+            type='app', task=tasks.symlink_project, args=[self.project.pk],
+        )
         return obj
 
     def delete(self, *args, **kwargs):  # pylint: disable=arguments-differ
         from readthedocs.projects import tasks
         log.info('Removing files for version %s', self.slug)
         broadcast(type='app', task=tasks.clear_artifacts, args=[self.get_artifact_paths()])
-        broadcast(
-            type='app', task=tasks.symlink_project, args=[self.project.pk])
+        run_side_effect_on_commit(
+            ('symlink_project', self.project.pk),
+            broadcast,
+            type='app', task=tasks.symlink_project, args=[self.project.pk],
+        )
         super(Version, self).delete(*args, **kwargs)
 
     @property
@@ -201,25 +228,68 @@ class Version(models.Model):
             private=private,
         )
 
+    def has_artifact(self, type_):
+        """
+        Whether the downloadable file of ``type_`` exists.
+
+        This reads the ``artifacts`` manifest, the production media path is
+        only checked for versions synced before there was a manifest.
+
+        :param type_: ``pdf``, ``epub`` or ``htmlzip``
+        """
+        if self.artifacts is None:
+            return getattr(self.project, 'has_{0}'.format(type_))(self.slug)
+        if type_ == 'pdf' and not self.project.enable_pdf_build:
+            return False
+        if type_ == 'epub' and not self.project.enable_epub_build:
+            return False
+        return type_ in self.artifacts
+
+    def update_artifacts(self):
+        """
+        Write the manifest of the downloadable files in the production media.
+
+        :returns: the manifest, with the size, SHA1 and modification time of
+            each file by type
+        """
+        artifacts = {}
+        for type_ in ARTIFACT_TYPES:
+            path = self.project.get_production_media_path(
+                type_=type_, version_slug=self.slug)
+            try:
+                stat = os.stat(path)
+                checksum = file_checksum(path)
+            except (IOError, OSError):
+                continue
+            artifacts[type_] = {
+                'size': stat.st_size,
+                'sha1': checksum,
+                'modified': datetime.datetime.utcfromtimestamp(
+                    stat.st_mtime).isoformat(),
+            }
+        Version.objects.filter(pk=self.pk).update(artifacts=artifacts)
+        self.artifacts = artifacts
+        return artifacts
+
     def get_downloads(self, pretty=False):
         project = self.project
         data = {}
         if pretty:
-            if project.has_pdf(self.slug):
+            if self.has_artifact('pdf'):
                 data['PDF'] = project.get_production_media_url('pdf', self.slug)
-            if project.has_htmlzip(self.slug):
+            if self.has_artifact('htmlzip'):
                 data['HTML'] = project.get_production_media_url(
                     'htmlzip', self.slug)
-            if project.has_epub(self.slug):
+            if self.has_artifact('epub'):
                 data['Epub'] = project.get_production_media_url(
                     'epub', self.slug)
         else:
-            if project.has_pdf(self.slug):
+            if self.has_artifact('pdf'):
                 data['pdf'] = project.get_production_media_url('pdf', self.slug)
-            if project.has_htmlzip(self.slug):
+            if self.has_artifact('htmlzip'):
                 data['htmlzip'] = project.get_production_media_url(
                     'htmlzip', self.slug)
-            if project.has_epub(self.slug):
+            if self.has_artifact('epub'):
                 data['epub'] = project.get_production_media_url(
                     'epub', self.slug)
         return data
@@ -260,13 +330,16 @@ class Version(models.Model):
         Clean build path for project version.
 
         Ensure build path is clean for project version. Used to ensure stale
-        build checkouts for each project version are removed.
+        build checkouts for each project version are removed. Files in the
+        artifact blob store that are no longer linked are removed as well.
         """
         try:
             path = self.get_build_path()
             if path is not None:
                 log.debug('Removing build path %s for %s', path, self)
                 rmtree(path)
+            if blob_store_enabled():
+                BlobStore().collect_garbage()
         except OSError:
             log.exception('Build path cleanup failed')
 
@@ -368,6 +441,12 @@ class Version(models.Model):
         )
 
 
+@receiver(pre_save, sender=Version)
+def update_version_sort_key(sender, instance, **kwargs):
+    """Compute the sort key on every save, including fixtures loading."""
+    instance.sort_key = version_sort_key(instance.verbose_name)
+
+
 class APIVersion(Version):
 
     """
@@ -456,6 +535,23 @@ class Build(models.Model):
 
     cold_storage = models.NullBooleanField(
         _('Cold Storage'), help_text='Build steps stored outside the database.')
+    timings = JSONField(
+        _('Timings'), null=True, blank=True,
+        help_text='Build time in seconds of each output format.')
+    fingerprint = models.CharField(
+        _('Fingerprint'), max_length=40, null=True, blank=True,
+        help_text='Hash of the documentation sources and build configuration.')
+    priority = models.PositiveSmallIntegerField(
+        _('Priority'), choices=BUILD_PRIORITY, default=BUILD_PRIORITY_NORMAL)
+    force = models.BooleanField(
+        _('Force'), default=False,
+        help_text='Build the documentation even if the files did not change.')
+    dispatched = models.DateTimeField(
+        _('Dispatched'), null=True, blank=True,
+        help_text='When the build was sent to the build queue.')
+    skipped = models.BooleanField(
+        _('Skipped'), default=False,
+        help_text='Superseded by a newer build before it started.')
 
     # Manager
 
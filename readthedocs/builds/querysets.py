@@ -3,8 +3,8 @@
 from __future__ import absolute_import
 
 from django.db import models
-from guardian.shortcuts import get_objects_for_user
 
+from readthedocs.core.visibility import get_visibility
 from readthedocs.core.utils.extend import SettingsOverrideObject
 from readthedocs.projects import constants
 
@@ -19,12 +19,14 @@ class VersionQuerySetBase(models.QuerySet):
     use_for_related_fields = True
 
     def _add_user_repos(self, queryset, user):
-        if user.has_perm('builds.view_version'):
-            return self.all().distinct()
-        if user.is_authenticated():
-            user_queryset = get_objects_for_user(user, 'builds.view_version')
-            queryset = user_queryset | queryset
-        return queryset.distinct()
+        visibility = get_visibility(user)
+        if visibility.all_versions:
+            return self.all()
+        if visibility.member_project_pks or visibility.version_pks:
+            queryset = queryset | self.filter(
+                models.Q(project__in=visibility.member_project_pks) |
+                models.Q(pk__in=visibility.version_pks))
+        return queryset
 
     def public(self, user=None, project=None, only_active=True):
         queryset = self.filter(privacy_level=constants.PUBLIC)
@@ -82,13 +84,14 @@ class BuildQuerySetBase(models.QuerySet):
     use_for_related_fields = True
 
     def _add_user_repos(self, queryset, user=None):
-        if user.has_perm('builds.view_version'):
-            return self.all().distinct()
-        if user.is_authenticated():
-            user_queryset = get_objects_for_user(user, 'builds.view_version')
-            pks = user_queryset.values_list('pk', flat=True)
-            queryset = self.filter(version__pk__in=pks) | queryset
-        return queryset.distinct()
+        visibility = get_visibility(user)
+        if visibility.all_versions:
+            return self.all()
+        if visibility.member_project_pks or visibility.version_pks:
+            queryset = queryset | self.filter(
+                models.Q(version__project__in=visibility.member_project_pks) |
+                models.Q(version__in=visibility.version_pks))
+        return queryset
 
     def public(self, user=None, project=None):
         queryset = self.filter(version__privacy_level=constants.PUBLIC)
@@ -114,14 +117,14 @@ class RelatedBuildQuerySetBase(models.QuerySet):
     use_for_related_fields = True
 
     def _add_user_repos(self, queryset, user=None):
-        if user.has_perm('builds.view_version'):
-            return self.all().distinct()
-        if user.is_authenticated():
-            user_queryset = get_objects_for_user(user, 'builds.view_version')
-            pks = user_queryset.values_list('pk', flat=True)
-            queryset = self.filter(
-                build__version__pk__in=pks) | queryset
-        return queryset.distinct()
+        visibility = get_visibility(user)
+        if visibility.all_versions:
+            return self.all()
+        if visibility.member_project_pks or visibility.version_pks:
+            queryset = queryset | self.filter(
+                models.Q(build__version__project__in=visibility.member_project_pks) |
+                models.Q(build__version__in=visibility.version_pks))
+        return queryset
 
     def public(self, user=None, project=None):
         queryset = self.filter(build__version__privacy_level=constants.PUBLIC)
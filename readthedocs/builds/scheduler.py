@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Build scheduler, dispatching triggered builds to the build queues.
+
+Without the scheduler, a build is sent to its Celery queue as soon as it's
+triggered, and queues are first in, first out: a project triggering hundreds of
+builds delays everybody else's builds. With ``BUILD_SCHEDULER_ENABLED``,
+recorded builds wait in the database until they are dispatched:
+
+* A project has at most ``Project.max_concurrent_builds`` builds dispatched
+  and not finished, ``BUILD_PROJECT_CONCURRENCY`` by default.
+* A queue has at most ``BUILD_QUEUE_CONCURRENCY`` builds dispatched and not
+  finished, no limit by default. This should match the number of workers
+  consuming the queue, so builds wait here and not in the broker.
+* Builds with a higher priority are dispatched first. Between builds of the
+  same priority, projects with fewer builds running go first, then the oldest
+  builds.
+* Builds that aren't requested by a user, like the ones triggered by
+  webhooks, are held for ``BUILD_DEBOUNCE_SECONDS`` after they were
+  triggered, so the next triggers of a burst supersede them.
+
+The scheduler runs when a build is triggered, when a build task ends, and
+periodically in case a task never ended.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import datetime
+import logging
+from collections import Counter, OrderedDict
+
+from builtins import object
+from django.conf import settings
+from django.utils import timezone
+
+from readthedocs.builds.constants import (
+    BUILD_STATE_FINISHED, BUILD_STATE_TRIGGERED)
+from readthedocs.builds.models import Build
+from readthedocs.core.utils import (
+    get_debounce_seconds, is_debounced, update_docs_signature)
+
+log = logging.getLogger(__name__)
+
+
+def build_scheduler_enabled():
+    return getattr(settings, 'BUILD_SCHEDULER_ENABLED', False)
+
+
+def get_queue_name(project):
+    """Celery queue the builds of ``project`` are sent to."""
+    return project.build_queue or settings.CELERY_DEFAULT_QUEUE
+
+
+class BuildScheduler(object):
+
+    """Dispatch the builds held in the database, see the module docstring."""
+
+    def __init__(self):
+        self.project_limit = getattr(settings, 'BUILD_PROJECT_CONCURRENCY', 2)
+        self.queue_limit = getattr(settings, 'BUILD_QUEUE_CONCURRENCY', None)
+
+    def get_project_limit(self, project):
+        return project.max_concurrent_builds or self.project_limit
+
+    def get_pending_builds(self):
+        """Builds waiting to be dispatched, grouped by project."""
+        builds = (
+            Build.objects
+            .filter(state=BUILD_STATE_TRIGGERED, dispatched__isnull=True)
+            .select_related('project')
+            .order_by('-priority', 'date', 'pk')
+        )
+        debounce_limit = timezone.now() - datetime.timedelta(
+            seconds=get_debounce_seconds())
+        pending = OrderedDict()
+        for build in builds:
+            if is_debounced(build.priority) and build.date > debounce_limit:
+                # More triggers of the burst may come
+                continue
+            pending.setdefault(build.project_id, []).append(build)
+        return pending
+
+    def get_running_builds(self):
+        """Count the builds dispatched and not finished, by project and queue."""
+        builds = (
+            Build.objects
+            .filter(dispatched__isnull=False)
+            .exclude(state=BUILD_STATE_FINISHED)
+            .values_list('project_id', 'project__build_queue')
+        )
+        projects = Counter()
+        queues = Counter()
+        for project_id, build_queue in builds:
+            projects[project_id] += 1
+            queues[build_queue or settings.CELERY_DEFAULT_QUEUE] += 1
+        return projects, queues
+
+    def schedule(self):
+        """
+        Dispatch the pending builds that fit in the concurrency limits.
+
+        :returns: the builds that were dispatched
+        """
+        pending = self.get_pending_builds()
+        projects, queues = self.get_running_builds()
+        dispatched = []
+        while pending:
+            candidates = []
+            for project_id, builds in list(pending.items()):
+                project = builds[0].project
+                queue = get_queue_name(project)
+                if (projects[project_id] >= self.get_project_limit(project) or
+                        (self.queue_limit is not None and
+                         queues[queue] >= self.queue_limit)):
+                    del pending[project_id]
+                    continue
+                candidates.append(builds[0])
+            if not candidates:
+                break
+
+            build = min(
+                candidates,
+                key=lambda b: (-b.priority, projects[b.project_id], b.date, b.pk),
+            )
+            pending[build.project_id].pop(0)
+            if not pending[build.project_id]:
+                del pending[build.project_id]
+            if self.dispatch(build):
+                projects[build.project_id] += 1
+                queues[get_queue_name(build.project)] += 1
+                dispatched.append(build)
+
+        if dispatched:
+            log.info('Dispatched %s builds', len(dispatched))
+        return dispatched
+
+    def dispatch(self, build):
+        """
+        Send ``build`` to its queue, unless it was already dispatched.
+
+        :returns: whether the build was sent
+        """
+        updated = Build.objects.filter(
+            pk=build.pk,
+            state=BUILD_STATE_TRIGGERED,
+            dispatched__isnull=True,
+        ).update(dispatched=timezone.now())
+        if not updated:
+            # Superseded, or dispatched by another scheduler run
+            return False
+        log.info(
+            'Dispatching build: project=%s build=%s priority=%s',
+            build.project.slug, build.pk, build.priority)
+        try:
+            update_docs_signature(
+                build.project,
+                version_pk=build.version_id,
+                record=True,
+                force=build.force,
+                build_pk=build.pk,
+            ).apply_async()
+        except Exception:
+            log.exception('Unable to dispatch build %s', build.pk)
+            Build.objects.filter(pk=build.pk).update(dispatched=None)
+            return False
+        return True
+
+
+def get_queue_stats():
+    """
+    Depth and wait times of the build queues.
+
+    :returns: a list of dictionaries, one per queue, with the builds held by
+        the scheduler, waiting in the broker and running, how long the oldest
+        build has been waiting, and the average wait before dispatch of the
+        builds dispatched in the last hour
+    """
+    now = timezone.now()
+    stats = OrderedDict()
+
+    def queue_stats(queue):
+        return stats.setdefault(queue, {
+            'queue': queue,
+            'held': 0,
+            'queued': 0,
+            'running': 0,
+            'oldest': None,
+            'waits': [],
+        })
+
+    builds = (
+        Build.objects
+        .exclude(state=BUILD_STATE_FINISHED)
+        .values_list('project__build_queue', 'state', 'date', 'dispatched')
+    )
+    for build_queue, state, date, dispatched in builds:
+        entry = queue_stats(build_queue or settings.CELERY_DEFAULT_QUEUE)
+        if state != BUILD_STATE_TRIGGERED:
+            entry['running'] += 1
+            continue
+        if dispatched is None:
+            entry['held'] += 1
+        else:
+            entry['queued'] += 1
+        if entry['oldest'] is None or date < entry['oldest']:
+            entry['oldest'] = date
+
+    recent = Build.objects.filter(
+        dispatched__gte=now - datetime.timedelta(hours=1),
+    ).values_list('project__build_queue', 'date', 'dispatched')
+    for build_queue, date, dispatched in recent:
+        entry = queue_stats(build_queue or settings.CELERY_DEFAULT_QUEUE)
+        entry['waits'].append((dispatched - date).total_seconds())
+
+    for entry in stats.values():
+        waits = entry.pop('waits')
+        entry['average_wait'] = sum(waits) / len(waits) if waits else None
+        entry['oldest_wait'] = (
+            (now - entry['oldest']).total_seconds()
+            if entry['oldest'] is not None else None)
+    return sorted(stats.values(), key=lambda entry: entry['queue'])
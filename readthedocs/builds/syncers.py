@@ -8,11 +8,19 @@ local machine.
 from __future__ import absolute_import
 
 import getpass
+import hashlib
+import json
 import logging
 import os
 import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from multiprocessing.pool import ThreadPool
 
-from builtins import object
+from builtins import object, str
 from django.conf import settings
 
 from readthedocs.core.utils.extend import SettingsOverrideObject
@@ -21,9 +29,15 @@ from readthedocs.core.utils import safe_makedirs
 
 log = logging.getLogger(__name__)
 
+MANIFEST_SUFFIX = '.rtd-manifest.json'
+
 
 class LocalSyncer(object):
 
+    # Whether the copies are written on the machine running them, instead of
+    # being pushed or pulled to other servers
+    copies_locally = True
+
     @classmethod
     def copy(cls, path, target, is_file=False, **__):
         """A copy command that works with files or directories."""
@@ -41,7 +55,340 @@ class LocalSyncer(object):
             shutil.copytree(path, target)
 
 
-class RemoteSyncer(object):
+def file_checksum(path, blocksize=65536):
+    """Return the hex SHA1 digest of the file at ``path``."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def files_equal(path, other):
+    """
+    Compare two files by size first, then by content hash.
+
+    Returns ``False`` if either file is missing.
+    """
+    try:
+        if os.path.getsize(path) != os.path.getsize(other):
+            return False
+    except OSError:
+        return False
+    return file_checksum(path) == file_checksum(other)
+
+
+def staging_path(target):
+    """Return a unique sibling path of ``target``, on the same filesystem."""
+    head, tail = os.path.split(os.path.normpath(target))
+    return os.path.join(
+        head,
+        '.{name}.{uid}.tmp'.format(name=tail, uid=uuid.uuid4().hex),
+    )
+
+
+def swap_tree(staging, target):
+    """
+    Move the directory ``staging`` to ``target``, removing the previous tree.
+
+    The previous tree is moved aside and ``staging`` is moved in, so the window
+    where ``target`` is missing is only the time between both renames.
+    """
+    if not os.path.lexists(target):
+        os.rename(staging, target)
+        return
+    if os.path.islink(target) or not os.path.isdir(target):
+        os.remove(target)
+        os.rename(staging, target)
+        return
+    previous = staging_path(target)
+    os.rename(target, previous)
+    try:
+        os.rename(staging, target)
+    except OSError:
+        # Put the previous tree back, there is nothing to serve otherwise
+        os.rename(previous, target)
+        raise
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def _link_or_copy(source, target):
+    """Hardlink ``source`` to ``target``, copying if linking isn't possible."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class LocalSnapshotSyncer(LocalSyncer):
+
+    """
+    Local syncer that swaps a snapshot of the new files into place.
+
+    Instead of removing the target and copying everything over it, a new tree
+    is assembled next to the target: files that didn't change (same size and
+    hash) are hardlinked from the current target, and only new or changed
+    files are copied. The snapshot then replaces the target with a rename, so
+    the target is never served half-written and unchanged files aren't
+    rewritten.
+
+    Directories are swapped with :py:func:`swap_tree`.
+    """
+
+    @classmethod
+    def copy(cls, path, target, is_file=False, **__):
+        log.info("Local Snapshot Copy %s to %s", path, target)
+        if is_file:
+            cls.copy_file(path, target)
+        else:
+            cls.copy_tree(path, target)
+
+    @classmethod
+    def copy_file(cls, path, target):
+        """Copy a single file, replacing the target with a rename."""
+        if path == target:
+            return
+        if files_equal(path, target):
+            log.debug("Skipping unchanged file %s", target)
+            return
+        parent = os.path.dirname(target)
+        if parent and not os.path.exists(parent):
+            safe_makedirs(parent)
+        staging = staging_path(target)
+        try:
+            shutil.copy2(path, staging)
+            os.rename(staging, target)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+
+    @classmethod
+    def copy_tree(cls, path, target):
+        """Build a snapshot of ``path`` next to ``target`` and swap it in."""
+        if os.path.normpath(path) == os.path.normpath(target):
+            return
+        parent = os.path.dirname(os.path.normpath(target))
+        if parent and not os.path.exists(parent):
+            safe_makedirs(parent)
+        staging = staging_path(target)
+        copied = linked = 0
+        try:
+            # Follow symlinks, like ``shutil.copytree`` does by default
+            for root, __, files in os.walk(path, followlinks=True):
+                relpath = os.path.relpath(root, path)
+                staging_root = os.path.normpath(os.path.join(staging, relpath))
+                target_root = os.path.normpath(os.path.join(target, relpath))
+                os.makedirs(staging_root)
+                shutil.copystat(root, staging_root)
+                for name in files:
+                    source_file = os.path.join(root, name)
+                    staging_file = os.path.join(staging_root, name)
+                    target_file = os.path.join(target_root, name)
+                    if files_equal(source_file, target_file):
+                        _link_or_copy(target_file, staging_file)
+                        linked += 1
+                    else:
+                        shutil.copy2(source_file, staging_file)
+                        copied += 1
+            swap_tree(staging, target)
+        finally:
+            if os.path.exists(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+        log.info(
+            "Snapshot of %s swapped in: copied=%s unchanged=%s",
+            target, copied, linked,
+        )
+
+
+def build_manifest(path):
+    """
+    Return a manifest of the files under ``path``.
+
+    The manifest maps each file path, relative to ``path``, to a
+    ``[size, sha1]`` pair.
+    """
+    manifest = {}
+    for root, __, files in os.walk(path, followlinks=True):
+        for name in files:
+            full_path = os.path.join(root, name)
+            relpath = os.path.relpath(full_path, path)
+            manifest[relpath] = [
+                os.path.getsize(full_path),
+                file_checksum(full_path),
+            ]
+    return manifest
+
+
+def diff_manifests(previous, current):
+    """
+    Compare two manifests.
+
+    :returns: a tuple of the sorted paths that were added or changed and the
+        sorted paths that were removed
+    """
+    changed = sorted(
+        relpath for relpath, entry in current.items()
+        if previous.get(relpath) != entry
+    )
+    removed = sorted(set(previous) - set(current))
+    return changed, removed
+
+
+def manifest_path(target):
+    """
+    Path of the manifest of the files synced to ``target``.
+
+    It's a hidden sibling of ``target``, so it isn't served with the files.
+    """
+    head, tail = os.path.split(os.path.normpath(target))
+    return os.path.join(
+        head, '.{name}{suffix}'.format(name=tail, suffix=MANIFEST_SUFFIX))
+
+
+def parse_manifest(data):
+    """
+    Parse a manifest written by :py:func:`write_manifest`.
+
+    :returns: the manifest, ``None`` if ``data`` isn't a valid manifest
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', 'replace')
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(manifest, dict):
+        return None
+    return manifest
+
+
+def write_manifest(manifest, path):
+    """Write ``manifest`` to the file ``path``."""
+    with open(path, 'w') as fh:
+        json.dump(manifest, fh, sort_keys=True)
+
+
+def run_command(cmd, timeout=None):
+    """
+    Run a shell command, killing it if it runs longer than ``timeout``.
+
+    :returns: a tuple of the exit code and the command output
+    """
+    proc = subprocess.Popen(
+        cmd,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+    try:
+        output, __ = proc.communicate()
+    finally:
+        if timer is not None:
+            timer.cancel()
+    return proc.returncode, output
+
+
+class SyncError(Exception):
+
+    """A copy to an application server failed."""
+
+
+class FanOutMixin(object):
+
+    """
+    Run a copy to each of the ``MULTIPLE_APP_SERVERS`` concurrently.
+
+    Each server is synced from a bounded thread pool (``SYNC_MAX_WORKERS``),
+    commands are killed after ``SYNC_TIMEOUT`` seconds and failing servers are
+    retried ``SYNC_RETRIES`` times. ``fan_out`` returns one result per server,
+    a dictionary with the keys ``server``, ``success``, ``attempts``,
+    ``duration`` and ``error``.
+    """
+
+    copies_locally = False
+
+    @classmethod
+    def get_app_servers(cls):
+        return getattr(settings, 'MULTIPLE_APP_SERVERS', [])
+
+    @classmethod
+    def fan_out(cls, servers, func):
+        """Call ``func(server)`` for each server, from a pool of threads."""
+        if not servers:
+            return []
+        max_workers = getattr(settings, 'SYNC_MAX_WORKERS', 4)
+        pool = ThreadPool(max(1, min(max_workers, len(servers))))
+        try:
+            results = pool.map(
+                lambda server: cls.call_with_retries(server, func),
+                servers,
+            )
+        finally:
+            pool.close()
+            pool.join()
+        for result in results:
+            if not result['success']:
+                log.error(
+                    'Copy error to app server: server=%s attempts=%s error=%s',
+                    result['server'], result['attempts'], result['error'],
+                )
+        return results
+
+    @staticmethod
+    def call_with_retries(server, func):
+        retries = getattr(settings, 'SYNC_RETRIES', 2)
+        start = time.time()
+        error = None
+        attempt = 0
+        for attempt in range(1, retries + 2):
+            try:
+                func(server)
+                error = None
+                break
+            except Exception as e:  # noqa
+                error = str(e)
+                log.warning(
+                    'Copy to app server failed: server=%s attempt=%s',
+                    server, attempt, exc_info=True,
+                )
+        return {
+            'server': server,
+            'success': error is None,
+            'attempts': attempt,
+            'duration': round(time.time() - start, 3),
+            'error': error,
+        }
+
+    @staticmethod
+    def run(cmd):
+        """Run ``cmd``, raising ``SyncError`` on failure or timeout."""
+        timeout = getattr(settings, 'SYNC_TIMEOUT', 10 * 60)
+        exit_code, output = run_command(cmd, timeout=timeout)
+        if exit_code != 0:
+            raise SyncError(
+                'cmd={cmd} exit_code={exit_code} output={output}'.format(
+                    cmd=cmd,
+                    exit_code=exit_code,
+                    output=output[-500:].decode('utf-8', 'replace'),
+                ),
+            )
+
+
+class RemoteSyncer(FanOutMixin):
+
+    """
+    Push files from the local machine to each application server.
+
+    A manifest of the files is computed once per copy and compared with the
+    manifest written next to the target on each server after its last
+    successful copy, see :py:func:`manifest_path`, so servers only receive
+    the files that changed. Servers where the target or its manifest are
+    missing, or where files were removed, get a full ``rsync --delete``.
+    """
 
     @classmethod
     def copy(cls, path, target, is_file=False, **__):
@@ -49,73 +396,221 @@ class RemoteSyncer(object):
         A better copy command that works with files or directories.
 
         Respects the ``MULTIPLE_APP_SERVERS`` setting when copying.
+
+        :returns: list of per server results, see :py:class:`FanOutMixin`
+        """
+        app_servers = cls.get_app_servers()
+        if not app_servers:
+            return []
+        log.info("Remote Copy %s to %s on %s", path, target, app_servers)
+        if is_file:
+            return cls.fan_out(
+                app_servers,
+                lambda server: cls.sync_server(
+                    server, path, target, is_file=True),
+            )
+        manifest = build_manifest(path)
+        fd, manifest_file = tempfile.mkstemp(suffix=MANIFEST_SUFFIX)
+        os.close(fd)
+        try:
+            write_manifest(manifest, manifest_file)
+            return cls.fan_out(
+                app_servers,
+                lambda server: cls.sync_server(
+                    server, path, target, manifest=manifest,
+                    manifest_file=manifest_file),
+            )
+        finally:
+            os.remove(manifest_file)
+
+    @classmethod
+    def sync_server(cls, server, path, target, is_file=False, manifest=None,
+                    manifest_file=None):
+        """
+        Sync ``path`` to ``target`` on ``server``, only sending changes.
+
+        :param manifest: manifest of ``path``, the files are compared with the
+            manifest on the server if it's given
+        :param manifest_file: file with ``manifest``, written to the server
+            after the copy
+        """
+        files = None
+        if manifest is not None:
+            previous = cls.get_server_manifest(server, target)
+            if previous is not None:
+                changed, removed = diff_manifests(previous, manifest)
+                if not changed and not removed:
+                    log.info('Nothing changed on %s for %s', server, target)
+                    return
+                if not removed:
+                    files = changed
+        cls.copy_to_server(server, path, target, is_file=is_file, files=files)
+        if manifest_file is not None:
+            cls.put_server_manifest(server, target, manifest_file)
+
+    @classmethod
+    def get_server_manifest(cls, server, target):
+        """
+        Manifest of the files synced to ``target`` on ``server``.
+
+        The manifest is only read if ``target`` exists, so a removed target
+        is sent again.
+
+        :returns: the manifest, ``None`` if it couldn't be read
         """
         sync_user = getattr(settings, 'SYNC_USER', getpass.getuser())
-        app_servers = getattr(settings, 'MULTIPLE_APP_SERVERS', [])
-        if app_servers:
-            log.info("Remote Copy %s to %s on %s", path, target, app_servers)
-            for server in app_servers:
-                mkdir_cmd = ("ssh %s@%s mkdir -p %s" % (sync_user, server, target))
-                ret = os.system(mkdir_cmd)
-                if ret != 0:
-                    log.error("Copy error to app servers: cmd=%s", mkdir_cmd)
-                if is_file:
-                    slash = ""
-                else:
-                    slash = "/"
-                # Add a slash when copying directories
-                sync_cmd = (
-                    "rsync -e 'ssh -T' -av --delete {path}{slash} {user}@{server}:{target}"
-                    .format(
-                        path=path,
-                        slash=slash,
-                        user=sync_user,
-                        server=server,
-                        target=target))
-                ret = os.system(sync_cmd)
-                if ret != 0:
-                    log.error("Copy error to app servers: cmd=%s", sync_cmd)
-
-
-class DoubleRemotePuller(object):
+        cmd = "ssh {user}@{server} 'test -d {target} && cat {manifest}'".format(
+            user=sync_user, server=server, target=target,
+            manifest=manifest_path(target))
+        exit_code, output = run_command(
+            cmd, timeout=getattr(settings, 'SYNC_TIMEOUT', 10 * 60))
+        if exit_code != 0:
+            return None
+        return parse_manifest(output)
 
     @classmethod
-    def copy(cls, path, target, host, is_file=False, **__):
+    def put_server_manifest(cls, server, target, manifest_file):
+        """Write the manifest of the files copied to ``target`` on ``server``."""
+        sync_user = getattr(settings, 'SYNC_USER', getpass.getuser())
+        cls.run(
+            "rsync -e 'ssh -T' -a {manifest_file} {user}@{server}:{manifest}"
+            .format(
+                manifest_file=manifest_file,
+                user=sync_user,
+                server=server,
+                manifest=manifest_path(target)))
+
+    @classmethod
+    def copy_to_server(cls, server, path, target, is_file=False, files=None):
         """
-        A better copy command that works from the webs.
+        Copy ``path`` to ``target`` on ``server``.
 
-        Respects the ``MULTIPLE_APP_SERVERS`` setting when copying.
+        :param files: only copy these paths, relative to ``path``. All of
+            ``path`` is synced, deleting extra files, if this is ``None``.
         """
         sync_user = getattr(settings, 'SYNC_USER', getpass.getuser())
-        app_servers = getattr(settings, 'MULTIPLE_APP_SERVERS', [])
-        if not is_file:
-            path += "/"
-        log.info("Remote Copy %s to %s", path, target)
-        for server in app_servers:
-            if not is_file:
-                mkdir_cmd = "ssh {user}@{server} mkdir -p {target}".format(
-                    user=sync_user, server=server, target=target
-                )
-                ret = os.system(mkdir_cmd)
-                if ret != 0:
-                    log.error("MkDir error to app servers: cmd=%s", mkdir_cmd)
+        cls.run("ssh {user}@{server} mkdir -p {target}".format(
+            user=sync_user, server=server, target=target))
+        if is_file:
+            slash = ""
+        else:
+            slash = "/"
+        if files is None:
             # Add a slash when copying directories
-            sync_cmd = (
-                "ssh {user}@{server} 'rsync -av "
-                "--delete --exclude projects {user}@{host}:{path} {target}'"
+            cls.run(
+                "rsync -e 'ssh -T' -av --delete {path}{slash} {user}@{server}:{target}"
+                .format(
+                    path=path,
+                    slash=slash,
+                    user=sync_user,
+                    server=server,
+                    target=target))
+            return
+        files_list = '\n'.join(files)
+        if not isinstance(files_list, bytes):
+            files_list = files_list.encode('utf-8')
+        with tempfile.NamedTemporaryFile(suffix='.files') as files_from:
+            files_from.write(files_list)
+            files_from.flush()
+            cls.run(
+                "rsync -e 'ssh -T' -av --files-from={files_from} {path}/ "
+                "{user}@{server}:{target}"
                 .format(
-                    host=host,
+                    files_from=files_from.name,
                     path=path,
                     user=sync_user,
                     server=server,
                     target=target))
-            ret = os.system(sync_cmd)
-            if ret != 0:
-                log.error("Copy error to app servers: cmd=%s", sync_cmd)
+
+
+class LocalFanOutSyncer(RemoteSyncer):
+
+    """
+    Stand-in for :py:class:`RemoteSyncer` that copies on the local machine.
+
+    Each application server is a directory named after the server, under
+    ``SYNC_LOCAL_ROOT``. This is used for testing the fan-out.
+    """
+
+    @classmethod
+    def server_path(cls, server, target):
+        return os.path.join(
+            getattr(settings, 'SYNC_LOCAL_ROOT', settings.PRODUCTION_ROOT),
+            server,
+            target.lstrip(os.sep),
+        )
+
+    @classmethod
+    def get_server_manifest(cls, server, target):
+        server_target = cls.server_path(server, target)
+        if not os.path.isdir(server_target):
+            return None
+        try:
+            with open(manifest_path(server_target)) as fh:
+                return parse_manifest(fh.read())
+        except IOError:
+            return None
+
+    @classmethod
+    def put_server_manifest(cls, server, target, manifest_file):
+        LocalSnapshotSyncer.copy_file(
+            manifest_file, manifest_path(cls.server_path(server, target)))
+
+    @classmethod
+    def copy_to_server(cls, server, path, target, is_file=False, files=None):
+        server_target = cls.server_path(server, target)
+        if is_file or files is None:
+            LocalSnapshotSyncer.copy(path, server_target, is_file=is_file)
+            return
+        for relpath in files:
+            LocalSnapshotSyncer.copy_file(
+                os.path.join(path, relpath),
+                os.path.join(server_target, relpath),
+            )
+
+
+class DoubleRemotePuller(FanOutMixin):
+
+    @classmethod
+    def copy(cls, path, target, host, is_file=False, **__):
+        """
+        A better copy command that works from the webs.
+
+        Respects the ``MULTIPLE_APP_SERVERS`` setting when copying.
+
+        :returns: list of per server results, see :py:class:`FanOutMixin`
+        """
+        if not is_file:
+            path += "/"
+        log.info("Remote Copy %s to %s", path, target)
+        return cls.fan_out(
+            cls.get_app_servers(),
+            lambda server: cls.pull_to_server(
+                server, path, target, host, is_file=is_file),
+        )
+
+    @classmethod
+    def pull_to_server(cls, server, path, target, host, is_file=False):
+        sync_user = getattr(settings, 'SYNC_USER', getpass.getuser())
+        if not is_file:
+            cls.run("ssh {user}@{server} mkdir -p {target}".format(
+                user=sync_user, server=server, target=target))
+        # Add a slash when copying directories
+        cls.run(
+            "ssh {user}@{server} 'rsync -av "
+            "--delete --exclude projects {user}@{host}:{path} {target}'"
+            .format(
+                host=host,
+                path=path,
+                user=sync_user,
+                server=server,
+                target=target))
 
 
 class RemotePuller(object):
 
+    copies_locally = True
+
     @classmethod
     def copy(cls, path, target, host, is_file=False, **__):
         """
@@ -124,53 +124,131 @@ class VersionSlugField(models.CharField):
             current = current % length ** exp
         return '_{suffix}'.format(suffix=suffix)
 
-    def create_slug(self, model_instance):
-        """Generate a unique slug for a model instance."""
+    def get_candidate_slug(self, original_slug, count, slug_len):
+        """
+        Return the ``count``-th candidate for ``original_slug``.
+
+        The first candidate, ``-1``, is the slug itself, the next ones have a
+        suffix from :py:meth:`uniquifying_suffix`, truncating the slug to fit
+        in ``slug_len``.
+        """
+        if count < 0:
+            return original_slug
+        end = self.uniquifying_suffix(count)
+        end_len = len(end)
+        slug = original_slug
+        if slug_len and len(slug) + end_len > slug_len:
+            slug = slug[:slug_len - end_len]
+        return slug + end
+
+    def _get_original_slug(self, model_instance, slug_field):
+        slug = self.slugify(getattr(model_instance, self._populate_from))
+        # strip slug depending on max_length attribute of the slug field
+        if slug_field.max_length:
+            slug = slug[:slug_field.max_length]
+        return slug
+
+    def _get_unique_kwargs(self, model_instance):
+        """Filters for any ``unique_together`` constraints with the slug."""
         # pylint: disable=protected-access
+        kwargs = {}
+        for params in model_instance._meta.unique_together:
+            if self.attname in params:
+                for param in params:
+                    if param != self.attname:
+                        kwargs[param] = getattr(model_instance, param, None)
+        return kwargs
 
-        # get fields to populate from and slug field to set
-        slug_field = model_instance._meta.get_field(self.attname)
+    def _allocate_slug(self, original_slug, slug_len, taken, fetch_slugs):
+        """
+        Return the first candidate slug that isn't in ``taken``.
 
-        slug = self.slugify(getattr(model_instance, self._populate_from))
-        count = 0
+        ``fetch_slugs`` is called with the prefix of a candidate, to add the
+        existing slugs starting with it to ``taken``. Candidates share their
+        prefix, unless the suffix truncates the slug, so this is usually a
+        single query.
+        """
+        fetched_prefix = None
+        count = -1
+        while True:
+            slug = self.get_candidate_slug(original_slug, count, slug_len)
+            prefix = original_slug
+            if count >= 0:
+                prefix = slug[:-len(self.uniquifying_suffix(count))]
+            if fetched_prefix is None or not prefix.startswith(fetched_prefix):
+                taken.update(fetch_slugs(prefix))
+                fetched_prefix = prefix
+            if slug and slug not in taken:
+                return slug
+            count += 1
 
-        # strip slug depending on max_length attribute of the slug field
-        # and clean-up
-        slug_len = slug_field.max_length
-        if slug_len:
-            slug = slug[:slug_len]
-        original_slug = slug
+    def create_slug(self, model_instance):
+        """Generate a unique slug for a model instance."""
+        # pylint: disable=protected-access
+        slug_field = model_instance._meta.get_field(self.attname)
+        original_slug = self._get_original_slug(model_instance, slug_field)
 
         # exclude the current model instance from the queryset used in finding
         # the next valid slug
         queryset = self.get_queryset(model_instance.__class__, slug_field)
         if model_instance.pk:
             queryset = queryset.exclude(pk=model_instance.pk)
+        queryset = queryset.filter(**self._get_unique_kwargs(model_instance))
 
-        # form a kwarg dict used to implement any unique_together constraints
-        kwargs = {}
-        for params in model_instance._meta.unique_together:
-            if self.attname in params:
-                for param in params:
-                    kwargs[param] = getattr(model_instance, param, None)
-        kwargs[self.attname] = slug
-
-        # increases the number while searching for the next valid slug
-        # depending on the given slug, clean-up
-        while not slug or queryset.filter(**kwargs):
-            slug = original_slug
-            end = self.uniquifying_suffix(count)
-            end_len = len(end)
-            if slug_len and len(slug) + end_len > slug_len:
-                slug = slug[:slug_len - end_len]
-            slug = slug + end
-            kwargs[self.attname] = slug
-            count += 1
+        def fetch_slugs(prefix):
+            return queryset.filter(**{
+                '{0}__startswith'.format(self.attname): prefix,
+            }).values_list(self.attname, flat=True)
 
+        slug = self._allocate_slug(
+            original_slug, slug_field.max_length, set(), fetch_slugs)
         assert self.test_pattern.match(slug), (
             'Invalid generated slug: {slug}'.format(slug=slug))
         return slug
 
+    def create_slugs(self, model_instances):
+        """
+        Generate unique slugs for several new model instances at once.
+
+        The existing slugs are fetched with one query per group of instances
+        sharing their ``unique_together`` fields, like the versions of a
+        project. Each instance gets a slug that is unique among the existing
+        slugs and the slugs of the instances before it. Instances that
+        already have a slug are kept as they are.
+
+        :returns: the slugs of the instances
+        """
+        # pylint: disable=protected-access
+        slugs = []
+        groups = {}
+        for model_instance in model_instances:
+            slug = getattr(model_instance, self.attname)
+            if slug:
+                slugs.append(slug)
+                continue
+            slug_field = model_instance._meta.get_field(self.attname)
+            kwargs = self._get_unique_kwargs(model_instance)
+            group_key = (model_instance.__class__, tuple(sorted(kwargs.items())))
+            if group_key not in groups:
+                queryset = self.get_queryset(
+                    model_instance.__class__, slug_field)
+                groups[group_key] = set(
+                    queryset.filter(**kwargs)
+                    .values_list(self.attname, flat=True))
+            taken = groups[group_key]
+            slug = self._allocate_slug(
+                self._get_original_slug(model_instance, slug_field),
+                slug_field.max_length,
+                taken,
+                lambda prefix: (),
+            )
+            assert self.test_pattern.match(slug), (
+                'Invalid generated slug: {slug}'.format(slug=slug))
+            taken.add(slug)
+            setattr(model_instance, self.attname, force_text(slug))
+            slugs.append(slug)
+        return slugs
+
     def pre_save(self, model_instance, add):
         value = getattr(model_instance, self.attname)
         # We only create a new slug if none was set yet.
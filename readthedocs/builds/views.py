@@ -16,6 +16,7 @@ from readthedocs.core.permissions import AdminPermission
 from django.core.urlresolvers import reverse
 from django.utils.decorators import method_decorator
 
+from readthedocs.builds.constants import BUILD_PRIORITY_HIGH
 from readthedocs.builds.models import Build, Version
 from readthedocs.core.utils import trigger_build
 from readthedocs.projects.models import Project
@@ -54,7 +55,11 @@ class BuildTriggerMixin(object):
             slug=version_slug,
         )
 
-        trigger_build(project=project, version=version)
+        trigger_build(
+            project=project,
+            version=version,
+            priority=BUILD_PRIORITY_HIGH,
+        )
         return HttpResponseRedirect(reverse('builds_project_list', args=[project.slug]))
 
 
@@ -13,6 +13,7 @@ import logging
 
 from django.core.management.base import BaseCommand
 
+from readthedocs.builds.constants import BUILD_PRIORITY_LOW
 from readthedocs.builds.models import Build, Version
 from readthedocs.core.utils import trigger_build
 from readthedocs.projects import tasks
@@ -66,7 +67,11 @@ class Command(BaseCommand):
                             project__slug=slug,
                             slug=version,
                     ):
-                        trigger_build(project=version.project, version=version)
+                        trigger_build(
+                            project=version.project,
+                            version=version,
+                            priority=BUILD_PRIORITY_LOW,
+                        )
                 elif version == 'all':
                     log.info('Updating all versions for %s', slug)
                     for version in Version.objects.filter(
@@ -94,7 +99,12 @@ class Command(BaseCommand):
                 else:
                     p = Project.all_objects.get(slug=slug)
                     log.info('Building %s', p)
-                    trigger_build(project=p, force=force, record=record)
+                    trigger_build(
+                        project=p,
+                        force=force,
+                        record=record,
+                        priority=BUILD_PRIORITY_LOW,
+                    )
         else:
             if version == 'all':
                 log.info('Updating all versions')
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Serve media files from Python.
+
+This is used instead of nginx's ``X-Accel-Redirect`` when ``PYTHON_MEDIA`` is
+set. Files are streamed with :py:class:`django.http.FileResponse`, so WSGI
+servers with a ``wsgi.file_wrapper`` send whole files without copying them,
+and single byte ranges and conditional requests are supported. Like nginx's
+``gzip_static``, the ``.br`` and ``.gz`` files written next to the docs are
+sent to the clients accepting them.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+
+from builtins import object
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.utils.six.moves.urllib.parse import unquote
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Encodings of the precompressed files written with the docs, by preference
+PRECOMPRESSED_FILES = (('br', '.br'), ('gzip', '.gz'))
+
+
+class MediaFileResponse(FileResponse):
+
+    """File response reading larger blocks than the default of 4 KB."""
+
+    block_size = 64 * 1024
+
+
+class RangeFile(object):
+
+    """
+    Part of a file, read from ``start`` for ``length`` bytes.
+
+    It doesn't expose ``fileno``, so WSGI servers don't send the whole file.
+    """
+
+    def __init__(self, fd, start, length):
+        self.fd = fd
+        self.fd.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fd.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fd.close()
+
+
+def get_file_etag(stat_result):
+    """ETag from the modification time and size, like nginx does."""
+    return '{0:x}-{1:x}'.format(int(stat_result.st_mtime), stat_result.st_size)
+
+
+def get_accepted_encodings(header):
+    """Content codings accepted in an ``Accept-Encoding`` header."""
+    accepted = set()
+    for coding in header.split(','):
+        coding, __, params = coding.partition(';')
+        quality = 1
+        param, __, value = params.partition('=')
+        if param.strip().lower() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                continue
+        coding = coding.strip().lower()
+        if coding and quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def get_precompressed(request, path):
+    """
+    Precompressed variant of the file at ``path`` accepted by the client.
+
+    :returns: a tuple of the path, encoding and stat of the variant, ``None``
+        if the client doesn't accept any or there is none
+    """
+    accepted = get_accepted_encodings(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for encoding, extension in PRECOMPRESSED_FILES:
+        if encoding not in accepted:
+            continue
+        try:
+            stat_result = os.stat(path + extension)
+        except (IOError, OSError):
+            continue
+        if stat.S_ISREG(stat_result.st_mode):
+            return path + extension, encoding, stat_result
+    return None
+
+
+def parse_range(header, size):
+    """
+    Byte range of a ``Range`` header.
+
+    Only single ranges are supported, the whole file is served for others.
+
+    :returns: a tuple of the first and last byte, ``None`` to serve the whole
+        file
+    :raises ValueError: if the range is out of the file
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range, the last bytes of the file
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Empty range')
+        return max(size - length, 0), size - 1
+    first = int(first)
+    if first >= size:
+        raise ValueError('Range starts after the end of the file')
+    last = int(last) if last else size - 1
+    if first > last:
+        return None
+    return first, min(last, size - 1)
+
+
+def serve_file(request, path, etag=None, filename=None):
+    """
+    Serve the file at ``path``.
+
+    :param path: absolute path of the file
+    :param etag: precomputed ETag of the file, like its checksum. Defaults to
+        one from the modification time and size.
+    :param filename: name of the file to download it as
+    :raises: Http404 if the file doesn't exist
+    """
+    try:
+        stat_result = os.stat(path)
+    except (IOError, OSError):
+        raise Http404('"{0}" does not exist'.format(path))
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('"{0}" is not a file'.format(path))
+
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    # Other clients may get a precompressed file
+    negotiated = encoding is None
+    if negotiated:
+        precompressed = get_precompressed(request, path)
+        if precompressed is not None:
+            path, encoding, stat_result = precompressed
+
+    size = stat_result.st_size
+    last_modified = int(stat_result.st_mtime)
+    etag = etag or get_file_etag(stat_result)
+    if negotiated and encoding:
+        etag = '{0}-{1}'.format(etag, encoding)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and _if_range_matches(request, etag, last_modified):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */{0}'.format(size)
+                return response
+
+        fd = open(path, 'rb')
+        if byte_range is None:
+            response = MediaFileResponse(fd, content_type=content_type)
+            response['Content-Length'] = size
+        else:
+            first, last = byte_range
+            length = last - first + 1
+            response = MediaFileResponse(
+                RangeFile(fd, first, length), content_type=content_type,
+                status=206)
+            response['Content-Length'] = length
+            response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(
+                first, last, size)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if filename:
+            response['Content-Disposition'] = 'filename={0}'.format(filename)
+
+    if negotiated:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = quote_etag(etag)
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def serve(request, path, document_root, **kwargs):
+    """
+    Serve the file at ``path`` below ``document_root``.
+
+    This takes the same arguments as :py:func:`django.views.static.serve`,
+    other keyword arguments are passed to :py:func:`serve_file`.
+    """
+    path = posixpath.normpath(unquote(path)).lstrip('/')
+    return serve_file(request, safe_join(document_root, path), **kwargs)
+
+
+def _if_range_matches(request, etag, last_modified):
+    """Whether the range should be served, per the ``If-Range`` header."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == quote_etag(etag)
+    return parse_http_date_safe(if_range) == last_modified
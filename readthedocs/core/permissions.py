@@ -2,6 +2,10 @@
 
 from __future__ import absolute_import
 
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from guardian.models import GroupObjectPermission, UserObjectPermission
+
 from readthedocs.core.utils.extend import SettingsOverrideObject
 
 
@@ -19,3 +23,99 @@ class AdminPermissionBase(object):
 class AdminPermission(SettingsOverrideObject):
     _default_class = AdminPermissionBase
     _override_setting = 'ADMIN_PERMISSION'
+
+
+def _get_object_permission(codename, model):
+    content_type = ContentType.objects.get_for_model(model)
+    permission = Permission.objects.get(
+        content_type=content_type, codename=codename)
+    return content_type, permission
+
+
+def assign_bulk(codename, user_pks, model, object_pks):
+    """
+    Grant the ``codename`` permission to the users on the objects.
+
+    This is the bulk version of guardian's ``assign_perm``, each permission
+    missing is created in a single query.
+
+    :param user_pks: primary keys of the users
+    :param model: model of the objects
+    :param object_pks: primary keys of the objects
+    :returns: the number of permissions created
+    """
+    user_pks = set(user_pks)
+    object_pks = set(str(pk) for pk in object_pks)
+    if not user_pks or not object_pks:
+        return 0
+    content_type, permission = _get_object_permission(codename, model)
+    existing = set(
+        UserObjectPermission.objects.filter(
+            permission=permission,
+            user__in=user_pks,
+            object_pk__in=object_pks,
+        ).values_list('user_id', 'object_pk')
+    )
+    UserObjectPermission.objects.bulk_create([
+        UserObjectPermission(
+            permission=permission,
+            content_type=content_type,
+            user_id=user_pk,
+            object_pk=object_pk,
+        )
+        for user_pk in user_pks
+        for object_pk in object_pks
+        if (user_pk, object_pk) not in existing
+    ])
+    return len(user_pks) * len(object_pks) - len(existing)
+
+
+def remove_bulk(codename, user_pks, model, object_pks):
+    """Revoke the ``codename`` permission of the users on the objects."""
+    user_pks = set(user_pks)
+    object_pks = set(str(pk) for pk in object_pks)
+    if not user_pks or not object_pks:
+        return
+    __, permission = _get_object_permission(codename, model)
+    UserObjectPermission.objects.filter(
+        permission=permission,
+        user__in=user_pks,
+        object_pk__in=object_pks,
+    ).delete()
+
+
+def get_member_project_pks(user):
+    """
+    Subquery of the primary keys of the projects ``user`` is an owner of.
+
+    It reads the project owners table only, so querysets filtering on it don't
+    join the object permissions and don't need a ``DISTINCT``.
+    """
+    return (
+        user.projects.through.objects
+        .filter(user=user)
+        .values('project_id')
+    )
+
+
+def get_granted_object_pks(user, codename, model):
+    """
+    Primary keys of the ``model`` objects ``user`` has a permission on.
+
+    These are the ``codename`` object permissions granted to the user, like
+    the ones given from the admin, directly or through the user's groups.
+    """
+    content_type = ContentType.objects.get_for_model(model)
+    filters = {
+        'permission__codename': codename,
+        'permission__content_type': content_type,
+    }
+    pks = set(
+        UserObjectPermission.objects.filter(user=user, **filters)
+        .values_list('object_pk', flat=True)
+    )
+    pks.update(
+        GroupObjectPermission.objects.filter(group__user=user, **filters)
+        .values_list('object_pk', flat=True)
+    )
+    return set(int(pk) for pk in pks)
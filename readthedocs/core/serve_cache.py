@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Caches of the doc serving from Python.
+
+Serving a page resolves its path, checks the symlink roots for the file and
+the permissions of the user on the version. The resolved files are kept in a
+per process LRU cache, valid until the files of the version are synced again
+or the symlinks of the project are updated, and the permissions of a user on
+a project are cached for a short time.
+
+Settings
+--------
+
+SERVE_FILE_CACHE_SIZE (10000) - Number of resolved files kept per process,
+    ``0`` disables the cache
+SERVE_FILE_CACHE_MAX_AGE (600) - Seconds a resolved file is kept for, even if
+    the files weren't synced again
+SERVE_PERMISSION_CACHE_TIMEOUT (60) - Seconds the permissions of a user on a
+    project are cached for, ``0`` disables the cache
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from builtins import object
+from django.conf import settings
+from django.core.cache import cache
+
+from readthedocs.core.permissions import AdminPermission
+from readthedocs.projects import constants
+
+ServedFile = namedtuple('ServedFile', ['basepath', 'filename'])
+
+
+class LRUCache(object):
+
+    """Thread safe mapping keeping the ``size`` most recently used keys."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return default
+            self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+served_files = LRUCache(0)
+
+
+def _get_file_cache_size():
+    return getattr(settings, 'SERVE_FILE_CACHE_SIZE', 10000)
+
+
+def _get_file_max_age():
+    return getattr(settings, 'SERVE_FILE_CACHE_MAX_AGE', 600)
+
+
+def _generation_cache_key(project_slug, version_slug):
+    return 'serve-generation:{0}:{1}'.format(project_slug, version_slug)
+
+
+def _symlinks_generation_cache_key(project_slug):
+    return 'serve-symlinks-generation:{0}'.format(project_slug)
+
+
+def _get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        # Evicted or never set, files cached before can't be trusted
+        cache.add(key, uuid.uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_files_generation(project_slug, served_project_slug, version_slug):
+    """
+    Token changing each time the files of the version are synced.
+
+    The token also changes when the symlinks of ``project_slug``, the root the
+    files are served from, are updated. It's stored in the shared cache, so
+    the web processes see the changes done by the workers.
+
+    :param served_project_slug: slug of the project of the version, the
+        subproject if it's served from ``project_slug``
+    """
+    return '{0}:{1}'.format(
+        _get_generation(_symlinks_generation_cache_key(project_slug)),
+        _get_generation(
+            _generation_cache_key(served_project_slug, version_slug)),
+    )
+
+
+def get_served_file(key, generation):
+    """Resolved file of ``key``, if it's from the current ``generation``."""
+    if not _get_file_cache_size():
+        return None
+    entry = served_files.get(key)
+    if entry is None or entry[0] != generation:
+        return None
+    if time.time() - entry[1] > _get_file_max_age():
+        return None
+    return entry[2]
+
+
+def set_served_file(key, generation, served_file):
+    served_files.size = _get_file_cache_size()
+    served_files.set(key, (generation, time.time(), served_file))
+
+
+def clear_served_files(version):
+    """
+    Invalidate the resolved files of ``version`` in all processes.
+
+    Translations are served from the project they translate, their files are
+    invalidated there too.
+    """
+    project = version.project
+    projects = [project]
+    if project.main_language_project is not None:
+        projects.append(project.main_language_project)
+    for served_project in projects:
+        cache.set(
+            _generation_cache_key(served_project.slug, version.slug),
+            uuid.uuid4().hex,
+            None,
+        )
+
+
+def clear_project_served_files(project):
+    """Invalidate the files resolved in the symlinks of ``project``."""
+    cache.set(
+        _symlinks_generation_cache_key(project.slug),
+        uuid.uuid4().hex,
+        None,
+    )
+
+
+def get_version_permissions(user, project):
+    """
+    Privacy levels of the versions of ``project`` that ``user`` can see.
+
+    :returns: a tuple of a dictionary of privacy levels by version slug, and
+        whether the user can see the private versions
+    """
+    timeout = getattr(settings, 'SERVE_PERMISSION_CACHE_TIMEOUT', 60)
+    user_key = user.pk if user.is_authenticated() else 'anonymous'
+    key = 'serve-permissions:{0}:{1}'.format(user_key, project.pk)
+    permissions = cache.get(key) if timeout else None
+    if permissions is None:
+        versions = dict(
+            project.versions.public(user).values_list('slug', 'privacy_level'))
+        is_member = (
+            constants.PRIVATE in versions.values() and
+            AdminPermission.is_member(user=user, obj=project))
+        permissions = (versions, is_member)
+        if timeout:
+            cache.set(key, permissions, timeout)
+    return permissions
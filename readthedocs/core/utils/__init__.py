@@ -10,14 +10,16 @@ import os
 import re
 
 from django.conf import settings
-from django.utils import six
+from django.utils import six, timezone
 from django.utils.functional import allow_lazy
 from django.utils.safestring import SafeText, mark_safe
 from django.utils.text import slugify as slugify_base
 from future.backports.urllib.parse import urlparse
 from celery import group, chord
 
-from readthedocs.builds.constants import LATEST, BUILD_STATE_TRIGGERED
+from readthedocs.builds.constants import (
+    BUILD_PRIORITY_HIGH, BUILD_PRIORITY_NORMAL, BUILD_STATE_FINISHED,
+    BUILD_STATE_TRIGGERED, LATEST)
 from readthedocs.doc_builder.constants import DOCKER_LIMITS
 
 
@@ -77,22 +79,31 @@ def cname_to_slug(host):
 
 
 def prepare_build(
-        project, version=None, record=True, force=False, immutable=True):
+        project, version=None, record=True, force=False, immutable=True,
+        priority=BUILD_PRIORITY_NORMAL, scheduled=False):
     """
     Prepare a build in a Celery task for project and version.
 
     If project has a ``build_queue``, execute the task on this build queue. If
     project has ``skip=True``, the build is not triggered.
 
+    A recorded build supersedes the builds of the version that didn't start
+    yet. Builds that aren't requested by a user, like the ones triggered by
+    webhooks, wait ``BUILD_DEBOUNCE_SECONDS`` before starting, so a burst of
+    pushes ends up in a single build of the newest commit. Builds superseding
+    another one wait as well.
+
     :param project: project's documentation to be built
     :param version: version of the project to be built. Default: ``latest``
     :param record: whether or not record the build in a new Build object
     :param force: build the HTML documentation even if the files haven't changed
     :param immutable: whether or not create an immutable Celery signature
+    :param priority: priority of the build for the build scheduler
+    :param scheduled: whether the build scheduler dispatches the build,
+        instead of the caller executing the returned task
     :returns: Celery signature of UpdateDocsTask to be executed
     """
     # Avoid circular import
-    from readthedocs.projects.tasks import UpdateDocsTask
     from readthedocs.builds.models import Build
 
     if project.skip:
@@ -111,6 +122,7 @@ def prepare_build(
         'force': force,
     }
 
+    countdown = 0
     if record:
         build = Build.objects.create(
             project=project,
@@ -118,8 +130,31 @@ def prepare_build(
             type='html',
             state=BUILD_STATE_TRIGGERED,
             success=True,
+            priority=priority,
+            force=force,
+            dispatched=None if scheduled else timezone.now(),
         )
         kwargs['build_pk'] = build.pk
+        superseded = supersede_builds(build)
+        if superseded:
+            kwargs['force'] = build.force
+        if superseded or is_debounced(build.priority):
+            # Triggers are coming in bursts, wait for the next ones before
+            # building, they supersede this build as well
+            countdown = get_debounce_seconds()
+
+    return update_docs_signature(project, countdown=countdown, **kwargs)
+
+
+def update_docs_signature(project, countdown=0, **kwargs):
+    """
+    Return the Celery signature of UpdateDocsTask for project.
+
+    :param countdown: seconds to wait before executing the task
+    :param kwargs: arguments of the task
+    """
+    # Avoid circular import
+    from readthedocs.projects.tasks import UpdateDocsTask
 
     options = {}
     if project.build_queue:
@@ -145,34 +180,118 @@ def prepare_build(
     # return update_docs_task.si(project.pk, **kwargs, **options)
     kwargs.update(options)
 
-    return update_docs_task.si(project.pk, **kwargs)
+    signature = update_docs_task.si(project.pk, **kwargs)
+    if countdown:
+        signature.set(countdown=countdown)
+    return signature
+
+
+def supersede_builds(build):
+    """
+    Skip the builds of the same version that are waiting to start.
+
+    All builds check out the newest commit when they start, so ``build``
+    makes the builds triggered before it redundant. Their tasks are still in
+    the queue, but finish right away because the builds are already finished.
+    ``build`` takes over the highest priority of the skipped builds, and is
+    forced if any of them was.
+
+    :returns: the number of builds that were skipped
+    """
+    # Avoid circular import
+    from readthedocs.builds.models import Build
+
+    pending = list(
+        Build.objects.filter(
+            project=build.project,
+            version=build.version,
+            state=BUILD_STATE_TRIGGERED,
+            pk__lt=build.pk,
+        ).values_list('pk', 'priority', 'force'))
+    superseded = Build.objects.filter(
+        pk__in=[pk for pk, __, __ in pending],
+        state=BUILD_STATE_TRIGGERED,
+    ).update(
+        state=BUILD_STATE_FINISHED,
+        skipped=True,
+        output='Skipped, superseded by build #{0}'.format(build.pk),
+    )
+    if superseded:
+        priority = max([build.priority] + [p for __, p, __ in pending])
+        force = build.force or any(f for __, __, f in pending)
+        if (priority, force) != (build.priority, build.force):
+            Build.objects.filter(pk=build.pk).update(
+                priority=priority, force=force)
+            build.priority = priority
+            build.force = force
+        log.info(
+            'Skipped %s builds superseded by build %s: project=%s version=%s',
+            superseded, build.pk, build.project.slug, build.version.slug,
+        )
+    return superseded
+
 
+def get_debounce_seconds():
+    """Seconds the builds triggered in bursts wait for the next triggers."""
+    return getattr(settings, 'BUILD_DEBOUNCE_SECONDS', 15)
 
-def trigger_build(project, version=None, record=True, force=False):
+
+def is_debounced(priority):
+    """
+    Whether builds of ``priority`` wait before starting.
+
+    Builds requested by a user have a high priority and start right away.
+    """
+    return priority < BUILD_PRIORITY_HIGH and get_debounce_seconds() > 0
+
+
+def trigger_build(
+        project, version=None, record=True, force=False,
+        priority=BUILD_PRIORITY_NORMAL):
     """
     Trigger a Build.
 
     Helper that calls ``prepare_build`` and just effectively trigger the Celery
-    task to be executed by a worker.
+    task to be executed by a worker. With the build scheduler enabled, recorded
+    builds are dispatched by the scheduler instead.
 
     :param project: project's documentation to be built
     :param version: version of the project to be built. Default: ``latest``
     :param record: whether or not record the build in a new Build object
     :param force: build the HTML documentation even if the files haven't changed
-    :returns: Celery AsyncResult promise
+    :param priority: priority of the build for the build scheduler
+    :returns: Celery AsyncResult promise, or ``None`` if the build wasn't
+        executed right away
     """
+    # Avoid circular import
+    from readthedocs.builds.scheduler import (
+        BuildScheduler, build_scheduler_enabled)
+    from readthedocs.projects.tasks import schedule_builds
+
+    scheduled = record and build_scheduler_enabled()
     update_docs_task = prepare_build(
         project,
         version,
         record,
         force,
         immutable=True,
+        priority=priority,
+        scheduled=scheduled,
     )
 
     if update_docs_task is None:
         # Current project is skipped
         return None
 
+    if scheduled:
+        # The build is dispatched right away if the project and its queue
+        # have room for it, otherwise once a build ends
+        BuildScheduler().schedule()
+        if is_debounced(priority):
+            # Held by the scheduler until the debounce window is over
+            schedule_builds.apply_async(countdown=get_debounce_seconds())
+        return None
+
     return update_docs_task.apply_async()
 
 
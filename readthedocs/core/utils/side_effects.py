@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Side effects of saving models, collected and run once.
+
+Saving a version or a project updates the supported versions of the project
+and broadcasts tasks to re-symlink it. Code saving many objects at once, like
+the version sync, runs inside :py:func:`collect_side_effects`: each action is
+then run once per key, the database updates when the block ends and the tasks
+when the transaction commits, so the tasks see the committed data. Outside of
+it, actions run right away.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from builtins import object
+from django.db import transaction
+
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class SideEffects(object):
+
+    """Actions keyed by what they act on, each key run once."""
+
+    def __init__(self):
+        self.actions = OrderedDict()
+        self.commit_actions = OrderedDict()
+
+    def add(self, key, func, args, kwargs, on_commit=False):
+        actions = self.commit_actions if on_commit else self.actions
+        if key not in actions:
+            actions[key] = (func, args, kwargs)
+
+    @staticmethod
+    def _run(actions):
+        while actions:
+            key, (func, args, kwargs) = actions.popitem(last=False)
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                log.exception('Failed to run side effect: %s', key)
+
+    def run(self):
+        """Run the database actions, and the others once committed."""
+        # Actions can add other actions while running
+        self._run(self.actions)
+        if self.commit_actions:
+            commit_actions = self.commit_actions
+            self.commit_actions = OrderedDict()
+            transaction.on_commit(lambda: self._run(commit_actions))
+
+
+def _get_collector():
+    return getattr(_local, 'collector', None)
+
+
+def run_side_effect(key, func, *args, **kwargs):
+    """
+    Run ``func``, or once per ``key`` when collecting side effects.
+
+    :param key: hashable identifying the action, like ``(name, project_pk)``
+    """
+    collector = _get_collector()
+    if collector is None:
+        return func(*args, **kwargs)
+    collector.add(key, func, args, kwargs)
+
+
+def run_side_effect_on_commit(key, func, *args, **kwargs):
+    """
+    Like :py:func:`run_side_effect`, for actions outside of the database.
+
+    When collecting, ``func`` runs once the transaction commits.
+    """
+    collector = _get_collector()
+    if collector is None:
+        return func(*args, **kwargs)
+    collector.add(key, func, args, kwargs, on_commit=True)
+
+
+@contextmanager
+def collect_side_effects():
+    """
+    Collect the side effects of the saves in the block and run them once.
+
+    Nested blocks are part of the outermost one. If the block raises, the
+    collected actions are discarded.
+    """
+    if _get_collector() is not None:
+        yield
+        return
+    collector = _local.collector = SideEffects()
+    try:
+        yield
+    finally:
+        _local.collector = None
+    collector.run()
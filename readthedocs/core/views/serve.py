@@ -37,11 +37,12 @@ from django.conf import settings
 from django.http import HttpResponse, HttpResponseRedirect, Http404
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
-from django.views.static import serve
 
-from readthedocs.builds.models import Version
-from readthedocs.core.permissions import AdminPermission
+from readthedocs.core.media import serve
 from readthedocs.core.resolver import resolve, resolve_path
+from readthedocs.core.serve_cache import (
+    ServedFile, get_files_generation, get_served_file, get_version_permissions,
+    set_served_file)
 from readthedocs.core.symlink import PrivateSymlink, PublicSymlink
 from readthedocs.projects import constants
 from readthedocs.projects.models import Project, ProjectRelationship
@@ -152,34 +153,54 @@ def serve_docs(
     """Exists to map existing proj, lang, version, filename views to the file format."""
     if not version_slug:
         version_slug = project.get_default_version()
-    try:
-        version = project.versions.public(request.user).get(slug=version_slug)
-    except Version.DoesNotExist:
+    versions, is_member = get_version_permissions(request.user, project)
+    privacy_level = versions.get(version_slug)
+    if privacy_level is None:
         # Properly raise a 404 if the version doesn't exist & a 401 if it does
         if project.versions.filter(slug=version_slug).exists():
             return _serve_401(request, project)
         raise Http404('Version does not exist.')
+    if privacy_level == constants.PRIVATE and not is_member:
+        return _serve_401(request, project)
+
+    served_project = subproject or project
+    generation = get_files_generation(
+        project.slug, served_project.slug, version_slug)
+    cache_key = (
+        project.slug, served_project.slug, lang_slug, version_slug,
+        privacy_level, filename)
+    served_file = get_served_file(cache_key, generation)
+    if served_file is not None:
+        return _serve_file(
+            request, served_file.filename, served_file.basepath)
+
     filename = resolve_path(
-        subproject or project,  # Resolve the subproject if it exists
+        served_project,  # Resolve the subproject if it exists
         version_slug=version_slug,
         language=lang_slug,
         filename=filename,
         subdomain=True,  # subdomain will make it a "full" path without a URL prefix
     )
-    if (version.privacy_level == constants.PRIVATE and
-            not AdminPermission.is_member(user=request.user, obj=project)):
-        return _serve_401(request, project)
     return _serve_symlink_docs(
         request,
         filename=filename,
         project=project,
-        privacy_level=version.privacy_level,
+        privacy_level=privacy_level,
+        cache_key=cache_key,
+        generation=generation,
     )
 
 
 @map_project_slug
-def _serve_symlink_docs(request, project, privacy_level, filename=''):
-    """Serve a file by symlink, or a 404 if not found."""
+def _serve_symlink_docs(
+        request, project, privacy_level, filename='', cache_key=None,
+        generation=None):
+    """
+    Serve a file by symlink, or a 404 if not found.
+
+    :param cache_key: key to cache the resolved file under, for the files
+        ``generation`` of the version
+    """
     # Handle indexes
     if filename == '' or filename[-1] == '/':
         filename += 'index.html'
@@ -198,6 +219,9 @@ def _serve_symlink_docs(request, project, privacy_level, filename=''):
         public_symlink = PublicSymlink(project)
         basepath = public_symlink.project_root
         if os.path.exists(os.path.join(basepath, filename)):
+            if cache_key is not None:
+                set_served_file(
+                    cache_key, generation, ServedFile(basepath, filename))
             return _serve_file(request, filename, basepath)
         else:
             files_tried.append(os.path.join(basepath, filename))
@@ -208,6 +232,9 @@ def _serve_symlink_docs(request, project, privacy_level, filename=''):
         basepath = private_symlink.project_root
 
         if os.path.exists(os.path.join(basepath, filename)):
+            if cache_key is not None:
+                set_served_file(
+                    cache_key, generation, ServedFile(basepath, filename))
             return _serve_file(request, filename, basepath)
         else:
             files_tried.append(os.path.join(basepath, filename))
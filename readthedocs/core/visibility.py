@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Projects and versions a user can see besides the public ones.
+
+Besides their own projects, users see the projects and versions they were
+given the ``view_project`` and ``view_version`` object permissions on, like
+from the admin.
+
+The privacy aware querysets are built several times per request, in the
+footer, the dashboard and the version lists. The visibility of a user is
+computed once per request, kept on the user object like Django does with its
+permissions, and shared between requests through the cache for a short time.
+Changes to the owners of a project clear it.
+
+Settings
+--------
+
+VISIBILITY_CACHE_TIMEOUT (60) - Seconds the visibility of a user is cached for
+    between requests, ``0`` disables the cache
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import itertools
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from readthedocs.core.permissions import (
+    get_granted_object_pks, get_member_project_pks)
+
+Visibility = namedtuple(
+    'Visibility',
+    ['all_projects', 'all_versions', 'member_project_pks', 'project_pks',
+     'version_pks'],
+)
+
+NO_VISIBILITY = Visibility(
+    False, False, frozenset(), frozenset(), frozenset())
+
+# Bumped on owner changes, to refresh the visibility of the current requests
+_generations = itertools.count()
+_generation = next(_generations)
+
+
+def _visibility_cache_key(user_pk):
+    return 'visibility:{0}'.format(user_pk)
+
+
+def get_visibility(user):
+    """
+    Visibility of ``user``.
+
+    :returns: a :py:class:`Visibility` with whether the user can see all the
+        projects and all the versions, the primary keys of the projects the
+        user owns, and of the projects and versions the user can see, from
+        the owners and the object permissions. Versions of the projects the
+        user owns are left out of the version primary keys.
+    """
+    if not user.is_authenticated():
+        return NO_VISIBILITY
+    cached = getattr(user, '_visibility_cache', None)
+    if cached is not None and cached[0] == _generation:
+        return cached[1]
+
+    generation = _generation
+    timeout = getattr(settings, 'VISIBILITY_CACHE_TIMEOUT', 60)
+    key = _visibility_cache_key(user.pk)
+    visibility = cache.get(key) if timeout else None
+    if visibility is None:
+        # Imported here, the querysets of these models use this module
+        from readthedocs.builds.models import Version
+        from readthedocs.projects.models import Project
+        member_project_pks = frozenset(
+            get_member_project_pks(user).values_list('project_id', flat=True))
+        version_pks = get_granted_object_pks(user, 'view_version', Version)
+        if version_pks and member_project_pks:
+            # The owners have the permission on all the versions of their
+            # projects, they are already visible from the projects
+            version_pks.difference_update(
+                Version.objects.filter(project__users=user)
+                .values_list('pk', flat=True))
+        visibility = Visibility(
+            all_projects=user.has_perm('projects.view_project'),
+            all_versions=user.has_perm('builds.view_version'),
+            member_project_pks=member_project_pks,
+            project_pks=member_project_pks.union(
+                get_granted_object_pks(user, 'view_project', Project)),
+            version_pks=frozenset(version_pks),
+        )
+        if timeout:
+            cache.set(key, visibility, timeout)
+    user._visibility_cache = (generation, visibility)
+    return visibility
+
+
+def clear_visibility(user_pks):
+    """Clear the visibility of the users, after their projects changed."""
+    global _generation
+    _generation = next(_generations)
+    cache.delete_many([_visibility_cache_key(pk) for pk in user_pks])
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Zip archives of the build output, for the downloadable HTML.
+
+:py:func:`write_zip` compresses files in worker threads, ``zlib`` releases the
+GIL while compressing, and streams the compressed entries to the archive in
+order. Files that are already compressed, like images and fonts, are stored
+as they are. Entries that didn't change since the previous archive, same size
+and CRC32, are copied from it without compressing them again.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import logging
+import os
+import struct
+import time
+import zipfile
+import zlib
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from builtins import object
+from django.conf import settings
+
+from readthedocs.builds.syncers import staging_path
+
+log = logging.getLogger(__name__)
+
+STORED_EXTENSIONS = (
+    '.png', '.jpg', '.jpeg', '.gif', '.ico', '.webp',
+    '.woff', '.woff2', '.eot',
+    '.gz', '.bz2', '.xz', '.zip', '.epub', '.pdf',
+    '.mp3', '.mp4', '.webm', '.svgz',
+)
+
+BLOCK_SIZE = 65536
+ZIP_VERSION = 20
+ZIP_SYSTEM_UNIX = 3
+ZIP_FLAG_UTF8 = 0x800
+ZIP_FLAG_ENCRYPTED = 0x1
+# Fields of the local file header
+HEADER_SIGNATURE = 0
+HEADER_FILENAME_LENGTH = 10
+HEADER_EXTRA_LENGTH = 11
+# Files are handed to the workers in batches, so compressed entries waiting
+# to be written don't pile up in memory
+BATCH_SIZE = 256
+
+ZipSource = namedtuple('ZipSource', ['path', 'arcname', 'size', 'mode', 'mtime'])
+ZipEntry = namedtuple(
+    'ZipEntry',
+    ['source', 'compress_type', 'crc', 'compress_size', 'data', 'previous'],
+)
+
+
+def get_compress_type(name):
+    """Store files that are already compressed, deflate anything else."""
+    if name.lower().endswith(STORED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def _dos_date_time(mtime):
+    year, month, day, hour, minute, second = time.localtime(mtime)[:6]
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_date, dos_time
+
+
+def _read_blocks(path):
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(BLOCK_SIZE), b''):
+            yield block
+
+
+def _file_crc(path):
+    crc = 0
+    for block in _read_blocks(path):
+        crc = zlib.crc32(block, crc)
+    return crc & 0xffffffff
+
+
+def _deflate(path, level):
+    """Return the CRC32 and the raw deflate stream of the file at ``path``."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc = 0
+    chunks = []
+    for block in _read_blocks(path):
+        crc = zlib.crc32(block, crc)
+        chunks.append(compressor.compress(block))
+    chunks.append(compressor.flush())
+    return crc & 0xffffffff, b''.join(chunks)
+
+
+def _prepare_entry(source, previous, level):
+    """Compress ``source``, or find its unchanged entry in ``previous``."""
+    compress_type = get_compress_type(source.arcname)
+    crc = None
+    info = previous.get(source.arcname)
+    if (info is not None and info.file_size == source.size and
+            info.compress_type == compress_type and
+            not info.flag_bits & ZIP_FLAG_ENCRYPTED):
+        crc = _file_crc(source.path)
+        if crc == info.CRC:
+            return ZipEntry(
+                source, compress_type, crc, info.compress_size, None, info)
+
+    if compress_type == zipfile.ZIP_STORED:
+        if crc is None:
+            crc = _file_crc(source.path)
+        return ZipEntry(source, compress_type, crc, source.size, None, None)
+    crc, data = _deflate(source.path, level)
+    return ZipEntry(source, compress_type, crc, len(data), data, None)
+
+
+def _list_sources(path, prefix):
+    sources = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            stat = os.stat(full_path)
+            arcname = os.path.relpath(full_path, path).replace(os.sep, '/')
+            if prefix:
+                arcname = '/'.join([prefix, arcname])
+            sources.append(ZipSource(
+                full_path, arcname, stat.st_size, stat.st_mode, stat.st_mtime))
+    return sources
+
+
+def _read_previous(zip_file):
+    """Entries of the previous archive by name, empty if it can't be read."""
+    if not os.path.exists(zip_file):
+        return {}
+    try:
+        with zipfile.ZipFile(zip_file) as archive:
+            return dict((info.filename, info) for info in archive.infolist())
+    except (zipfile.BadZipfile, IOError, OSError):
+        log.warning('Unable to read previous archive %s', zip_file, exc_info=True)
+        return {}
+
+
+def _previous_data_offset(previous_fh, info):
+    """Offset of the data of ``info`` in the previous archive, or ``None``."""
+    previous_fh.seek(info.header_offset)
+    header = previous_fh.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        return None
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[HEADER_SIGNATURE] != zipfile.stringFileHeader:
+        return None
+    return (
+        info.header_offset + zipfile.sizeFileHeader +
+        fields[HEADER_FILENAME_LENGTH] + fields[HEADER_EXTRA_LENGTH]
+    )
+
+
+class _ZipWriter(object):
+
+    """Write entries to a zip file, keeping the central directory."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.records = []
+
+    def write_entry(self, entry, data_offset=None, previous_fh=None):
+        source = entry.source
+        name = source.arcname.encode('utf-8')
+        flags = 0
+        try:
+            source.arcname.encode('ascii')
+        except UnicodeEncodeError:
+            flags |= ZIP_FLAG_UTF8
+        dos_date, dos_time = _dos_date_time(source.mtime)
+        offset = self.fh.tell()
+        self.fh.write(struct.pack(
+            zipfile.structFileHeader, zipfile.stringFileHeader,
+            ZIP_VERSION, 0, flags, entry.compress_type, dos_time, dos_date,
+            entry.crc, entry.compress_size, source.size, len(name), 0,
+        ))
+        self.fh.write(name)
+
+        if data_offset is not None:
+            previous_fh.seek(data_offset)
+            remaining = entry.compress_size
+            while remaining:
+                block = previous_fh.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    raise IOError('Truncated previous archive')
+                self.fh.write(block)
+                remaining -= len(block)
+        elif entry.data is not None:
+            self.fh.write(entry.data)
+        else:
+            for block in _read_blocks(source.path):
+                self.fh.write(block)
+
+        self.records.append(struct.pack(
+            zipfile.structCentralDir, zipfile.stringCentralDir,
+            ZIP_VERSION, ZIP_SYSTEM_UNIX, ZIP_VERSION, 0, flags,
+            entry.compress_type, dos_time, dos_date, entry.crc,
+            entry.compress_size, source.size, len(name), 0, 0, 0, 0,
+            (source.mode & 0xFFFF) << 16, offset,
+        ) + name)
+
+    def close(self):
+        start = self.fh.tell()
+        for record in self.records:
+            self.fh.write(record)
+        size = self.fh.tell() - start
+        self.fh.write(struct.pack(
+            zipfile.structEndArchive, zipfile.stringEndArchive,
+            0, 0, len(self.records), len(self.records), size, start, 0,
+        ))
+
+
+def _write_zipfile(sources, zip_file):
+    """Write the archive with :py:mod:`zipfile`, for Zip64 archives."""
+    with zipfile.ZipFile(zip_file, 'w', allowZip64=True) as archive:
+        for source in sources:
+            archive.write(
+                source.path,
+                arcname=source.arcname,
+                compress_type=get_compress_type(source.arcname),
+            )
+
+
+def _write_streaming(sources, zip_file, previous, previous_file, workers, level):
+    reused = 0
+    pool = ThreadPool(max(1, workers))
+    previous_fh = open(previous_file, 'rb') if previous else None
+    try:
+        with open(zip_file, 'wb') as fh:
+            writer = _ZipWriter(fh)
+            for start in range(0, len(sources), BATCH_SIZE):
+                batch = sources[start:start + BATCH_SIZE]
+                entries = pool.imap(
+                    lambda source: _prepare_entry(source, previous, level),
+                    batch,
+                )
+                for entry in entries:
+                    data_offset = None
+                    if entry.previous is not None:
+                        data_offset = _previous_data_offset(
+                            previous_fh, entry.previous)
+                        if data_offset is None:
+                            # Compress the file again, the entry is unusable
+                            entry = _prepare_entry(entry.source, {}, level)
+                        else:
+                            reused += 1
+                    writer.write_entry(entry, data_offset, previous_fh)
+            writer.close()
+    finally:
+        pool.close()
+        pool.join()
+        if previous_fh is not None:
+            previous_fh.close()
+    return reused
+
+
+def write_zip(path, zip_file, prefix='', workers=1, level=None):
+    """
+    Write the files under ``path`` to the zip archive ``zip_file``.
+
+    The archive is written next to ``zip_file`` and renamed over it, the
+    previous archive is used for its unchanged entries until then.
+
+    :param prefix: directory of the files in the archive
+    :param workers: number of threads compressing files
+    :param level: zlib compression level, ``HTMLZIP_COMPRESSION_LEVEL`` by
+        default
+    :returns: the number of entries copied from the previous archive
+    """
+    if level is None:
+        level = getattr(settings, 'HTMLZIP_COMPRESSION_LEVEL', 6)
+    sources = _list_sources(path, prefix)
+    staging = staging_path(zip_file)
+    reused = 0
+    try:
+        # Compressed data is a bit larger than its input in the worst case
+        total_size = sum(source.size + 1024 for source in sources)
+        if (len(sources) >= zipfile.ZIP_FILECOUNT_LIMIT or
+                total_size >= zipfile.ZIP64_LIMIT):
+            log.info('Writing %s with Zip64 extensions', zip_file)
+            _write_zipfile(sources, staging)
+        else:
+            reused = _write_streaming(
+                sources, staging, _read_previous(zip_file), zip_file,
+                workers, level)
+        os.rename(staging, zip_file)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    log.info(
+        'Wrote %s: entries=%s reused=%s', zip_file, len(sources), reused)
+    return reused
@@ -160,6 +160,11 @@ class BaseMkdocs(BaseBuilder):
             # http://www.mkdocs.org/user-guide/configuration/#google_analytics
             analytics_code = mkdocs_config['google_analytics'][0]
 
+        if self.context is not None:
+            commit = self.context.commit
+        else:
+            commit = self.version.project.vcs_repo(self.version.slug).commit
+
         # Will be available in the JavaScript as READTHEDOCS_DATA.
         readthedocs_data = {
             'project': self.version.project.slug,
@@ -173,7 +178,7 @@ class BaseMkdocs(BaseBuilder):
             'source_suffix': ".md",
             'api_host': getattr(settings, 'PUBLIC_API_URL', 'https://readthedocs.org'),
             'ad_free': not self.project.show_advertising,
-            'commit': self.version.project.vcs_repo(self.version.slug).commit,
+            'commit': commit,
             'global_analytics_code': getattr(settings, 'GLOBAL_ANALYTICS_CODE', 'UA-17997319-1'),
             'user_analytics_code': analytics_code,
         }
@@ -258,6 +263,7 @@ class MkdocsHTML(BaseMkdocs):
     type = 'mkdocs'
     builder = 'build'
     build_dir = '_build/html'
+    precompress = True
 
 
 class MkdocsJSON(BaseMkdocs):
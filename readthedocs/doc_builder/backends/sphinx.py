@@ -8,36 +8,55 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
 import codecs
+import hashlib
 import shutil
 import logging
 import os
+import re
 import sys
-import zipfile
+import time
 from glob import glob
+from multiprocessing.pool import ThreadPool
 
 import six
 from django.conf import settings
 from django.template import loader as template_loader
 from django.template.loader import render_to_string
 
-from readthedocs.builds import utils as version_utils
 from readthedocs.projects.exceptions import ProjectConfigurationError
 from readthedocs.projects.utils import safe_write
-from readthedocs.restapi.client import api
 from readthedocs.projects.models import Feature
 
-from ..base import BaseBuilder, restoring_chdir
-from ..constants import PDF_RE, SPHINX_STATIC_DIR, SPHINX_TEMPLATE_DIR
+from ..archive import write_zip
+from ..base import BaseBuilder, move_tree
+from ..constants import (
+    LATEX_RERUN_RE, PDF_RE, SPHINX_DOCTREE_FINGERPRINT, SPHINX_SHARED_DOCTREE_DIR,
+    SPHINX_STATIC_DIR, SPHINX_TEMPLATE_DIR)
 from ..environments import BuildCommand, DockerBuildCommand
-from ..exceptions import BuildEnvironmentError
+from ..exceptions import BuildEnvironmentError, BuildEnvironmentWarning
 from ..signals import finalize_sphinx_context_data
 
 log = logging.getLogger(__name__)
 
+# Failures of parallel builds that a serial build doesn't have
+PARALLEL_ERROR_RE = re.compile(
+    r'parallel build error|not safe for parallel|pickl', re.IGNORECASE)
+
 
 class BaseSphinx(BaseBuilder):
 
-    """The parent for most sphinx builders."""
+    """
+    The parent for most sphinx builders.
+
+    With the ``SHARE_SPHINX_DOCTREE`` feature, the HTML builder reads the
+    sources into a shared doctree, and the other formats start from a copy of
+    it instead of reading and parsing every source file again. The copy is
+    only used if ``conf.py`` and the build options match the ones the shared
+    doctree was built with.
+    """
+
+    #: Whether this builder writes the shared doctree
+    writes_shared_doctree = False
 
     def __init__(self, *args, **kwargs):
         super(BaseSphinx, self).__init__(*args, **kwargs)
@@ -73,29 +92,8 @@ class BaseSphinx(BaseBuilder):
             '',
         )
         remote_version = self.version.commit_name
-
-        github_user, github_repo = version_utils.get_github_username_repo(
-            url=self.project.repo)
-        github_version_is_editable = (self.version.type == 'branch')
-        display_github = github_user is not None
-
-        bitbucket_user, bitbucket_repo = version_utils.get_bitbucket_username_repo(  # noqa
-            url=self.project.repo)
-        bitbucket_version_is_editable = (self.version.type == 'branch')
-        display_bitbucket = bitbucket_user is not None
-
-        gitlab_user, gitlab_repo = version_utils.get_gitlab_username_repo(
-            url=self.project.repo)
-        gitlab_version_is_editable = (self.version.type == 'branch')
-        display_gitlab = gitlab_user is not None
-
-        # Avoid hitting database and API if using Docker build environment
-        if getattr(settings, 'DONT_HIT_API', False):
-            versions = self.project.active_versions()
-            downloads = self.version.get_downloads(pretty=True)
-        else:
-            versions = self.project.api_versions()
-            downloads = api.version(self.version.pk).get()['downloads']
+        context = self.get_context()
+        is_branch = (self.version.type == 'branch')
 
         data = {
             'current_version': self.version.verbose_name,
@@ -110,30 +108,30 @@ class BaseSphinx(BaseBuilder):
                 'PUBLIC_API_URL',
                 'https://readthedocs.org',
             ),
-            'commit': self.project.vcs_repo(self.version.slug).commit,
-            'versions': versions,
-            'downloads': downloads,
+            'commit': context.commit,
+            'versions': context.versions,
+            'downloads': context.downloads,
 
             # GitHub
-            'github_user': github_user,
-            'github_repo': github_repo,
+            'github_user': context.github_user,
+            'github_repo': context.github_repo,
             'github_version': remote_version,
-            'github_version_is_editable': github_version_is_editable,
-            'display_github': display_github,
+            'github_version_is_editable': is_branch,
+            'display_github': context.github_user is not None,
 
             # BitBucket
-            'bitbucket_user': bitbucket_user,
-            'bitbucket_repo': bitbucket_repo,
+            'bitbucket_user': context.bitbucket_user,
+            'bitbucket_repo': context.bitbucket_repo,
             'bitbucket_version': remote_version,
-            'bitbucket_version_is_editable': bitbucket_version_is_editable,
-            'display_bitbucket': display_bitbucket,
+            'bitbucket_version_is_editable': is_branch,
+            'display_bitbucket': context.bitbucket_user is not None,
 
             # GitLab
-            'gitlab_user': gitlab_user,
-            'gitlab_repo': gitlab_repo,
+            'gitlab_user': context.gitlab_user,
+            'gitlab_repo': context.gitlab_repo,
             'gitlab_version': remote_version,
-            'gitlab_version_is_editable': gitlab_version_is_editable,
-            'display_gitlab': display_gitlab,
+            'gitlab_version_is_editable': is_branch,
+            'display_gitlab': context.gitlab_user is not None,
 
             # Features
             'generate_json_artifacts': self.project.has_feature(
@@ -192,9 +190,113 @@ class BaseSphinx(BaseBuilder):
             cwd=self.project.checkout_path(self.version.slug),
         )
 
+    @property
+    def doctree_dir(self):
+        """Doctree directory of this format, relative to the conf dir."""
+        return '_build/doctrees-{format}'.format(format=self.sphinx_builder)
+
+    @property
+    def share_doctree(self):
+        return self.project.has_feature(Feature.SHARE_SPHINX_DOCTREE)
+
+    def get_doctree_fingerprint(self):
+        """
+        Hash the inputs that the doctree depends on, besides the sources.
+
+        Sphinx checks the sources itself, but the doctree can only be shared
+        between formats built with the same ``conf.py`` and options.
+        """
+        digest = hashlib.sha1()
+        try:
+            with open(self.project.conf_file(self.version.slug), 'rb') as fh:
+                digest.update(fh.read())
+        except (ProjectConfigurationError, IOError):
+            return None
+        digest.update(
+            'language={lang}'.format(lang=self.project.language).encode('utf-8'))
+        return digest.hexdigest()
+
+    def prepare_doctree(self):
+        """
+        Set up the doctree for this build.
+
+        :returns: the doctree directory to build with, relative to the conf dir
+        """
+        if not self.share_doctree:
+            return self.doctree_dir
+        cwd = self.project.conf_dir(self.version.slug)
+        fingerprint_path = os.path.join(
+            cwd, SPHINX_SHARED_DOCTREE_DIR, SPHINX_DOCTREE_FINGERPRINT)
+        if self.writes_shared_doctree:
+            # The shared doctree isn't valid until this build finishes
+            if os.path.exists(fingerprint_path):
+                os.remove(fingerprint_path)
+            return SPHINX_SHARED_DOCTREE_DIR
+
+        if self._force or not os.path.exists(fingerprint_path):
+            return self.doctree_dir
+        with open(fingerprint_path) as fh:
+            fingerprint = fh.read().strip()
+        if fingerprint != self.get_doctree_fingerprint():
+            log.info('Not using the shared doctree, the configuration changed')
+            return self.doctree_dir
+
+        # Copy the doctree instead of linking it, Sphinx rewrites the
+        # pickled files in place
+        doctree_path = os.path.join(cwd, self.doctree_dir)
+        if os.path.exists(doctree_path):
+            shutil.rmtree(doctree_path)
+        shutil.copytree(os.path.join(cwd, SPHINX_SHARED_DOCTREE_DIR), doctree_path)
+        log.info('Using the shared doctree for %s', self.type)
+        return self.doctree_dir
+
+    def save_doctree_fingerprint(self):
+        """Mark the shared doctree as valid for the current configuration."""
+        fingerprint = self.get_doctree_fingerprint()
+        if fingerprint is None:
+            return
+        fingerprint_path = os.path.join(
+            self.project.conf_dir(self.version.slug),
+            SPHINX_SHARED_DOCTREE_DIR,
+            SPHINX_DOCTREE_FINGERPRINT,
+        )
+        if os.path.exists(os.path.dirname(fingerprint_path)):
+            with open(fingerprint_path, 'w') as fh:
+                fh.write(fingerprint)
+
+    def run_sphinx_build(self, build_command, **kwargs):
+        """
+        Run ``sphinx-build``, with parallel jobs if the build has CPUs for it.
+
+        Some extensions break parallel builds, in that case the build is run
+        again serially. The failed parallel attempt doesn't fail the build.
+        """
+        resources = getattr(self.build_env, 'resources', None)
+        jobs = resources.parallelism if resources is not None else 1
+        if jobs <= 1:
+            return self.run(*build_command, **kwargs)
+
+        parallel_command = (
+            build_command[:2] + ['-j', str(jobs)] + build_command[2:])
+        try:
+            return self.run(*parallel_command, **kwargs)
+        except BuildEnvironmentWarning as e:
+            if not PARALLEL_ERROR_RE.search(six.text_type(e)):
+                raise
+        log.warning(
+            'Parallel build failed, building serially: project=%s version=%s',
+            self.project.slug, self.version.slug)
+        commands = getattr(self.build_env, 'commands', [])
+        for cmd in reversed(commands):
+            if list(cmd.command) == parallel_command:
+                commands.remove(cmd)
+                break
+        return self.run(*build_command, **kwargs)
+
     def build(self):
         self.clean()
         project = self.project
+        doctree_dir = self.prepare_doctree()
         build_command = [
             'python',
             self.python_env.venv_bin(filename='sphinx-build'),
@@ -206,21 +308,25 @@ class BaseSphinx(BaseBuilder):
             '-b',
             self.sphinx_builder,
             '-d',
-            '_build/doctrees-{format}'.format(format=self.sphinx_builder),
+            doctree_dir,
             '-D',
             'language={lang}'.format(lang=project.language),
             '.',
             self.sphinx_build_dir,
         ])
-        cmd_ret = self.run(
-            *build_command, cwd=project.conf_dir(self.version.slug),
+        cmd_ret = self.run_sphinx_build(
+            build_command, cwd=project.conf_dir(self.version.slug),
             bin_path=self.python_env.venv_bin())
+        if cmd_ret.successful and self.share_doctree and self.writes_shared_doctree:
+            self.save_doctree_fingerprint()
         return cmd_ret.successful
 
 
 class HtmlBuilder(BaseSphinx):
     type = 'sphinx'
     sphinx_build_dir = '_build/html'
+    writes_shared_doctree = True
+    precompress = True
 
     def __init__(self, *args, **kwargs):
         super(HtmlBuilder, self).__init__(*args, **kwargs)
@@ -229,7 +335,7 @@ class HtmlBuilder(BaseSphinx):
     def move(self, **__):
         super(HtmlBuilder, self).move()
         if self.project.has_feature(Feature.BUILD_JSON_ARTIFACTS_WITH_HTML):
-            # Copy json artifacts to its own directory
+            # Move json artifacts to its own directory
             # to keep compatibility with the older builder.
             json_path = os.path.abspath(
                 os.path.join(self.old_artifact_path, '..', 'json')
@@ -238,13 +344,8 @@ class HtmlBuilder(BaseSphinx):
                 version=self.version.slug, type_='sphinx_search'
             )
             if os.path.exists(json_path):
-                if os.path.exists(json_path_target):
-                    shutil.rmtree(json_path_target)
-                log.info('Copying json on the local filesystem')
-                shutil.copytree(
-                    json_path,
-                    json_path_target
-                )
+                log.info('Moving json on the local filesystem')
+                move_tree(json_path, json_path_target)
             else:
                 log.warning(
                     'Not moving json because the build dir is unknown.'
@@ -279,7 +380,6 @@ class LocalMediaBuilder(BaseSphinx):
     sphinx_builder = 'readthedocssinglehtmllocalmedia'
     sphinx_build_dir = '_build/localmedia'
 
-    @restoring_chdir
     def move(self, **__):
         log.info('Creating zip file from %s', self.old_artifact_path)
         target_file = os.path.join(
@@ -288,22 +388,16 @@ class LocalMediaBuilder(BaseSphinx):
         )
         if not os.path.exists(self.target):
             os.makedirs(self.target)
-        if os.path.exists(target_file):
-            os.remove(target_file)
-
-        # Create a <slug>.zip file
-        os.chdir(self.old_artifact_path)
-        archive = zipfile.ZipFile(target_file, 'w')
-        for root, __, files in os.walk('.'):
-            for fname in files:
-                to_write = os.path.join(root, fname)
-                archive.write(
-                    filename=to_write,
-                    arcname=os.path.join(
-                        '{}-{}'.format(self.project.slug, self.version.slug),
-                        to_write),
-                )
-        archive.close()
+
+        # Create a <slug>.zip file, reusing the unchanged entries of the
+        # previous one
+        resources = getattr(self.build_env, 'resources', None)
+        write_zip(
+            self.old_artifact_path,
+            target_file,
+            prefix='{}-{}'.format(self.project.slug, self.version.slug),
+            workers=resources.parallelism if resources is not None else 1,
+        )
 
 
 class EpubBuilder(BaseSphinx):
@@ -354,63 +448,126 @@ class PdfBuilder(BaseSphinx):
 
     type = 'sphinx_pdf'
     sphinx_build_dir = '_build/latex'
+    doctree_dir = '_build/doctrees'
     pdf_file_name = None
 
+    def __init__(self, *args, **kwargs):
+        super(PdfBuilder, self).__init__(*args, **kwargs)
+        #: Time in seconds to convert each document to PDF
+        self.timings = {}
+
     def build(self):
         self.clean()
         cwd = self.project.conf_dir(self.version.slug)
+        doctree_dir = self.prepare_doctree()
 
         # Default to this so we can return it always.
-        self.run(
-            'python',
-            self.python_env.venv_bin(filename='sphinx-build'),
-            '-b',
-            'latex',
-            '-D',
-            'language={lang}'.format(lang=self.project.language),
-            '-d',
-            '_build/doctrees',
-            '.',
-            '_build/latex',
+        self.run_sphinx_build(
+            [
+                'python',
+                self.python_env.venv_bin(filename='sphinx-build'),
+                '-b',
+                'latex',
+                '-D',
+                'language={lang}'.format(lang=self.project.language),
+                '-d',
+                doctree_dir,
+                '.',
+                '_build/latex',
+            ],
             cwd=cwd,
             bin_path=self.python_env.venv_bin(),
         )
         latex_cwd = os.path.join(cwd, '_build', 'latex')
-        tex_files = glob(os.path.join(latex_cwd, '*.tex'))
+        tex_files = sorted(glob(os.path.join(latex_cwd, '*.tex')))
 
         if not tex_files:
             raise BuildEnvironmentError('No TeX files were found')
 
-        # Run LaTeX -> PDF conversions
-        pdflatex_cmds = [
-            ['pdflatex', '-interaction=nonstopmode', tex_file]
-            for tex_file in tex_files]  # yapf: disable
-        makeindex_cmds = [
-            ['makeindex', '-s', 'python.ist', '{0}.idx'.format(
-                os.path.splitext(os.path.relpath(tex_file, latex_cwd))[0])]
-            for tex_file in tex_files]  # yapf: disable
+        # Run LaTeX -> PDF conversions, each document on its own
+        resources = getattr(self.build_env, 'resources', None)
+        workers = resources.parallelism if resources is not None else 1
+        pool = ThreadPool(max(1, min(workers, len(tex_files))))
+        try:
+            results = pool.map(
+                lambda tex_file: self.build_pdf_document(tex_file, latex_cwd),
+                tex_files,
+            )
+        finally:
+            pool.close()
+            pool.join()
+
+        pdf_commands = []
+        for tex_file, (commands, duration) in zip(tex_files, results):
+            name = os.path.splitext(os.path.basename(tex_file))[0]
+            self.timings[name] = duration
+            pdf_commands.extend(commands)
+            pdf_match = PDF_RE.search(commands[-1].output)
+            if pdf_match:
+                self.pdf_file_name = pdf_match.group(1).strip()
+        return all(cmd.successful for cmd in pdf_commands)
 
+    def get_latex_state(self, base):
+        """
+        Return the auxiliary files that pdflatex reads back on the next pass.
+
+        An ``.aux`` file without labels or citations only contains
+        ``\\relax``, that isn't worth another pass.
+        """
+        state = {}
+        for ext in ('aux', 'toc', 'ind'):
+            path = '{0}.{1}'.format(base, ext)
+            if os.path.exists(path):
+                with open(path, 'rb') as fh:
+                    content = fh.read()
+                if ext == 'aux' and content.strip() == b'\\relax':
+                    continue
+                state[ext] = hashlib.sha1(content).hexdigest()
+        return state
+
+    def build_pdf_document(self, tex_file, latex_cwd):
+        """
+        Convert a single TeX file to PDF.
+
+        This runs pdflatex, makeindex if the document has an index, and
+        pdflatex again, unless the first pass didn't write anything the
+        second pass would read back.
+
+        :returns: the commands that were run and the time it took
+        """
         if self.build_env.command_class == DockerBuildCommand:
             latex_class = DockerLatexBuildCommand
         else:
             latex_class = LatexBuildCommand
-        pdf_commands = []
-        for cmd in pdflatex_cmds:
-            cmd_ret = self.build_env.run_command_class(
-                cls=latex_class, cmd=cmd, cwd=latex_cwd, warn_only=True)
-            pdf_commands.append(cmd_ret)
-        for cmd in makeindex_cmds:
+        base = os.path.splitext(tex_file)[0]
+        start = time.time()
+
+        commands = []
+        state = self.get_latex_state(base)
+        pdflatex_cmd = ['pdflatex', '-interaction=nonstopmode', tex_file]
+        cmd_ret = self.build_env.run_command_class(
+            cls=latex_class, cmd=pdflatex_cmd, cwd=latex_cwd, warn_only=True)
+        commands.append(cmd_ret)
+
+        if os.path.exists('{0}.idx'.format(base)):
             cmd_ret = self.build_env.run_command_class(
-                cls=latex_class, cmd=cmd, cwd=latex_cwd, warn_only=True)
-            pdf_commands.append(cmd_ret)
-        for cmd in pdflatex_cmds:
+                cls=latex_class,
+                cmd=['makeindex', '-s', 'python.ist', '{0}.idx'.format(
+                    os.path.relpath(base, latex_cwd))],
+                cwd=latex_cwd,
+                warn_only=True,
+            )
+            commands.append(cmd_ret)
+
+        if (self.get_latex_state(base) != state or
+                LATEX_RERUN_RE.search(commands[0].output or '')):
             cmd_ret = self.build_env.run_command_class(
-                cls=latex_class, cmd=cmd, cwd=latex_cwd, warn_only=True)
-            pdf_match = PDF_RE.search(cmd_ret.output)
-            if pdf_match:
-                self.pdf_file_name = pdf_match.group(1).strip()
-            pdf_commands.append(cmd_ret)
-        return all(cmd.successful for cmd in pdf_commands)
+                cls=latex_class, cmd=pdflatex_cmd, cwd=latex_cwd,
+                warn_only=True)
+            commands.append(cmd_ret)
+        else:
+            log.info('Skipping second LaTeX pass for %s', tex_file)
+        return commands, round(time.time() - start, 2)
 
     def move(self, **__):
         if not os.path.exists(self.target):
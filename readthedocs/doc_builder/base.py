@@ -10,6 +10,9 @@ import shutil
 from builtins import object
 from functools import wraps
 
+from .compression import precompress_tree
+from .context import BuildContext
+
 log = logging.getLogger(__name__)
 
 
@@ -26,6 +29,78 @@ def restoring_chdir(fn):
     return decorator
 
 
+def _remove_ignored(path, ignore):
+    """Remove the entries under ``path`` matched by the ``ignore`` callable."""
+    for root, dirs, files in os.walk(path):
+        ignored = ignore(root, dirs + files)
+        for name in ignored:
+            full_path = os.path.join(root, name)
+            if os.path.isdir(full_path) and not os.path.islink(full_path):
+                shutil.rmtree(full_path)
+            else:
+                os.remove(full_path)
+        dirs[:] = [name for name in dirs if name not in ignored]
+
+
+def _link_tree(source, target, ignore):
+    """
+    Recreate ``source`` at ``target`` with hardlinks to its files.
+
+    Files that can't be linked, like symlinks or files on another filesystem,
+    are copied. Like :py:func:`shutil.copytree`, symlinks are followed.
+    """
+    linked = copied = 0
+    for root, dirs, files in os.walk(source, followlinks=True):
+        ignored = ignore(root, dirs + files)
+        dirs[:] = [name for name in dirs if name not in ignored]
+        target_root = os.path.normpath(
+            os.path.join(target, os.path.relpath(root, source)))
+        os.makedirs(target_root)
+        for name in files:
+            if name in ignored:
+                continue
+            source_file = os.path.join(root, name)
+            target_file = os.path.join(target_root, name)
+            if not os.path.islink(source_file):
+                try:
+                    os.link(source_file, target_file)
+                    linked += 1
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(source_file, target_file)
+            copied += 1
+    log.info('Linked %s files and copied %s files to %s', linked, copied, target)
+
+
+def move_tree(source, target, ignore_patterns=()):
+    """
+    Move the directory ``source`` to ``target``, replacing ``target``.
+
+    The directory is renamed, so no file is read or written. If it can't be
+    renamed, for instance when ``target`` is on another filesystem, files are
+    hardlinked into ``target`` and ``source`` is left in place, files are only
+    copied when they can't be linked either.
+
+    :param ignore_patterns: glob patterns of the files and directories to
+        leave out of ``target``, as in :py:func:`shutil.ignore_patterns`
+    """
+    ignore = shutil.ignore_patterns(*ignore_patterns)
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    parent = os.path.dirname(os.path.normpath(target))
+    if parent and not os.path.exists(parent):
+        os.makedirs(parent)
+    try:
+        os.rename(source, target)
+    except OSError as e:
+        log.info('Unable to rename %s to %s, linking files: %s', source, target, e)
+        _link_tree(source, target, ignore)
+    else:
+        if ignore_patterns:
+            _remove_ignored(target, ignore)
+
+
 class BaseBuilder(object):
 
     """
@@ -39,17 +114,32 @@ class BaseBuilder(object):
 
     ignore_patterns = []
 
+    # Write compressed variants of the text files before moving them
+    precompress = False
+
     # old_artifact_path = ..
 
-    def __init__(self, build_env, python_env, force=False):
+    def __init__(self, build_env, python_env, force=False, context=None):
         self.build_env = build_env
         self.python_env = python_env
         self.version = build_env.version
         self.project = build_env.project
         self._force = force
+        self.context = context
         self.target = self.project.artifact_path(
             version=self.version.slug, type_=self.type)
 
+    def get_context(self):
+        """
+        Return the :py:class:`~readthedocs.doc_builder.context.BuildContext`.
+
+        The build passes the context it computed to all of its builders, it's
+        only fetched here for builders created without one.
+        """
+        if self.context is None:
+            self.context = BuildContext.fetch(self.project, self.version)
+        return self.context
+
     def force(self, **__):
         """An optional step to force a build even when nothing has changed."""
         log.info('Forcing a build')
@@ -60,16 +150,28 @@ class BaseBuilder(object):
         raise NotImplementedError
 
     def move(self, **__):
-        """Move the generated documentation to its artifact directory."""
+        """
+        Move the generated documentation to its artifact directory.
+
+        The build directory is moved with :py:func:`move_tree`, it isn't
+        available after this step.
+        """
         if os.path.exists(self.old_artifact_path):
-            if os.path.exists(self.target):
-                shutil.rmtree(self.target)
-            log.info('Copying %s on the local filesystem', self.type)
+            if self.precompress:
+                resources = getattr(self.build_env, 'resources', None)
+                precompress_tree(
+                    self.old_artifact_path,
+                    previous_path=(
+                        self.target if os.path.exists(self.target) else None),
+                    workers=(
+                        resources.parallelism if resources is not None else 1),
+                )
+            log.info('Moving %s on the local filesystem', self.type)
             log.info('Ignoring patterns %s', self.ignore_patterns)
-            shutil.copytree(
+            move_tree(
                 self.old_artifact_path,
                 self.target,
-                ignore=shutil.ignore_patterns(*self.ignore_patterns)
+                ignore_patterns=self.ignore_patterns,
             )
         else:
             log.warning('Not moving docs, because the build dir is unknown.')
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Precompressed variants of the built documentation.
+
+Text files of the HTML output get ``.gz`` siblings, and ``.br`` siblings when
+the ``brotli`` package is installed, so the web servers send them as they are
+instead of compressing each response (``gzip_static`` in nginx). Files are
+compressed in worker threads, both ``zlib`` and ``brotli`` release the GIL
+while compressing.
+
+Settings
+--------
+
+PRECOMPRESS_MIN_SIZE (1024) - Files smaller than this, in bytes, aren't
+    compressed
+PRECOMPRESS_BROTLI_QUALITY (5) - Brotli quality, from 0 to 11. The higher
+    levels are much slower for a small gain in size
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import gzip
+import logging
+import os
+import shutil
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+
+from readthedocs.builds.syncers import files_equal
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.html', '.htm', '.css', '.js', '.json', '.fjson', '.svg', '.txt', '.xml',
+    '.map',
+)
+
+
+def is_precompressed(path):
+    """Whether ``path`` is the compressed variant of another file."""
+    base, extension = os.path.splitext(path)
+    return extension in ('.gz', '.br') and os.path.exists(base)
+
+
+def get_encodings():
+    """Encodings of the precompressed files, by file extension."""
+    encodings = [('.gz', 'gzip')]
+    if brotli is not None:
+        encodings.insert(0, ('.br', 'br'))
+    return encodings
+
+
+def _write_gzip(path, target):
+    with open(path, 'rb') as source:
+        # No file name and modification time, so the output only depends on
+        # the content
+        with open(target, 'wb') as fd:
+            with gzip.GzipFile(
+                    filename='', mode='wb', fileobj=fd, compresslevel=9,
+                    mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed)
+
+
+def _write_brotli(path, target):
+    with open(path, 'rb') as source:
+        data = source.read()
+    quality = getattr(settings, 'PRECOMPRESS_BROTLI_QUALITY', 5)
+    with open(target, 'wb') as fd:
+        fd.write(brotli.compress(data, quality=quality))
+
+
+def _reuse(previous, target):
+    """Link or copy the ``previous`` compressed file to ``target``."""
+    try:
+        os.link(previous, target)
+    except OSError:
+        shutil.copy2(previous, target)
+
+
+def precompress_tree(path, previous_path=None, workers=1):
+    """
+    Write the compressed variants of the files under ``path``.
+
+    Files under ``PRECOMPRESS_MIN_SIZE`` bytes aren't compressed.
+
+    :param previous_path: output of the previous build. The variants of the
+        files that didn't change are reused from there.
+    :param workers: number of threads compressing files
+    :returns: a tuple of the number of files compressed and reused
+    """
+    min_size = getattr(settings, 'PRECOMPRESS_MIN_SIZE', 1024)
+    writers = {'.gz': _write_gzip, '.br': _write_brotli}
+    pending = []
+    reused = 0
+    for root, __, files in os.walk(path):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            full_path = os.path.join(root, name)
+            if (os.path.islink(full_path) or
+                    os.path.getsize(full_path) < min_size):
+                continue
+            previous = None
+            if previous_path is not None:
+                previous = os.path.join(
+                    previous_path, os.path.relpath(full_path, path))
+                if not files_equal(full_path, previous):
+                    previous = None
+            for extension, __ in get_encodings():
+                target = full_path + extension
+                if previous is not None and os.path.exists(
+                        previous + extension):
+                    _reuse(previous + extension, target)
+                    reused += 1
+                else:
+                    pending.append((writers[extension], full_path, target))
+
+    pool = ThreadPool(max(1, workers))
+    try:
+        pool.map(lambda job: job[0](job[1], job[2]), pending)
+    finally:
+        pool.close()
+        pool.join()
+    compressed = len(pending)
+    log.info(
+        'Precompressed %s files and reused %s files in %s',
+        compressed, reused, path)
+    return compressed, reused
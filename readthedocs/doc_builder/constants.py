@@ -27,6 +27,11 @@ MKDOCS_TEMPLATE_DIR = os.path.join(
 SPHINX_STATIC_DIR = os.path.join(SPHINX_TEMPLATE_DIR, '_static')
 
 PDF_RE = re.compile('Output written on (.*?)')
+LATEX_RERUN_RE = re.compile('Rerun to get|Rerun LaTeX')
+
+# Doctree written by the HTML builder and reused by the other formats
+SPHINX_SHARED_DOCTREE_DIR = '_build/doctrees-shared'
+SPHINX_DOCTREE_FINGERPRINT = 'readthedocs-fingerprint'
 
 # Docker
 DOCKER_SOCKET = getattr(
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Data about a build shared by all of its builders."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+from builtins import object
+from django.conf import settings
+
+from readthedocs.builds import utils as version_utils
+from readthedocs.builds.models import APIVersion
+from readthedocs.projects.templatetags.projects_tags import sort_version_aware
+from readthedocs.restapi.client import api
+
+
+class BuildContext(object):
+
+    """
+    Template data of a build that doesn't depend on the builder.
+
+    This is computed once per build, with :py:meth:`fetch`, and passed to each
+    builder, instead of every builder querying the API and the repository.
+
+    :param commit: commit of the version checkout
+    :param versions: active versions of the project, sorted
+    :param downloads: download URLs of the version, by format
+    """
+
+    def __init__(self, project, version, commit=None, versions=None,
+                 downloads=None):
+        self.project = project
+        self.version = version
+        self.commit = commit
+        self.versions = versions if versions is not None else []
+        self.downloads = downloads if downloads is not None else {}
+
+        self.github_user, self.github_repo = (
+            version_utils.get_github_username_repo(url=project.repo))
+        self.bitbucket_user, self.bitbucket_repo = (
+            version_utils.get_bitbucket_username_repo(url=project.repo))
+        self.gitlab_user, self.gitlab_repo = (
+            version_utils.get_gitlab_username_repo(url=project.repo))
+
+    @classmethod
+    def fetch(cls, project, version, commit=None):
+        """
+        Create the context of a build of ``version``.
+
+        The versions and downloads come from a single API call, or from the
+        database with ``DONT_HIT_API``.
+
+        :param commit: commit of the checkout, read from the repository if
+            not given
+        """
+        if commit is None:
+            commit = project.vcs_repo(version.slug).commit
+        if getattr(settings, 'DONT_HIT_API', False):
+            versions = project.active_versions()
+            downloads = version.get_downloads(pretty=True)
+        else:
+            data = api.version(version.pk).build_context.get()
+            versions = sort_version_aware([
+                APIVersion(**version_data)
+                for version_data in data['versions']
+            ])
+            downloads = data['downloads']
+        return cls(
+            project,
+            version,
+            commit=commit,
+            versions=versions,
+            downloads=downloads,
+        )
@@ -27,6 +27,7 @@ from readthedocs.projects.constants import LOG_TEMPLATE
 from readthedocs.restapi.client import api as api_v2
 from requests.exceptions import ConnectionError
 
+from .resources import BuildResources
 from .exceptions import (BuildEnvironmentException, BuildEnvironmentError,
                          BuildEnvironmentWarning, BuildEnvironmentCreationFailed)
 from .constants import (DOCKER_SOCKET, DOCKER_VERSION, DOCKER_IMAGE,
@@ -45,6 +46,24 @@ __all__ = (
     'LocalBuildEnvironment', 'DockerBuildEnvironment',
 )
 
+MEMORY_UNITS = {'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_memory_limit(limit):
+    """
+    Convert a Docker memory limit, like ``200m``, to bytes.
+
+    :returns: the limit in bytes, or ``None`` if there is no limit
+    """
+    if not limit:
+        return None
+    if isinstance(limit, six.integer_types):
+        return limit
+    limit = str(limit).strip().lower()
+    if limit[-1] in MEMORY_UNITS:
+        return int(float(limit[:-1]) * MEMORY_UNITS[limit[-1]])
+    return int(limit)
+
 
 class BuildCommand(BuildCommandResultMixin):
 
@@ -407,16 +426,20 @@ class BuildEnvironment(BaseEnvironment):
     :param environment: shell environment variables
     :param update_on_success: update the build object via API if the build was
                               successful
+    :param resources: CPUs assigned to the build
+    :type resources: readthedocs.doc_builder.resources.BuildResources
     """
 
     def __init__(self, project=None, version=None, build=None, config=None,
-                 record=True, environment=None, update_on_success=True):
+                 record=True, environment=None, update_on_success=True,
+                 resources=None):
         super(BuildEnvironment, self).__init__(project, environment)
         self.version = version
         self.build = build
         self.config = config
         self.record = record
         self.update_on_success = update_on_success
+        self.resources = resources or BuildResources()
 
         self.failure = None
         self.start_time = datetime.utcnow()
@@ -797,6 +820,7 @@ class DockerBuildEnvironment(BuildEnvironment):
         return self.get_client().create_host_config(
             binds=binds,
             mem_limit=self.container_mem_limit,
+            cpu_shares=self.resources.cpu_shares,
         )
 
     @property
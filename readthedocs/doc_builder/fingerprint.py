@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Fingerprint of the inputs of a build.
+
+Two builds of a version with the same fingerprint produce the same output, so
+the second one can be skipped.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import hashlib
+import json
+import logging
+import os
+
+import readthedocs
+from readthedocs.projects.exceptions import ProjectConfigurationError
+
+from .loader import get_builder_class
+
+log = logging.getLogger(__name__)
+
+IGNORED_DIRS = ('.git', '.hg', '.svn', '.bzr', '_build')
+
+
+def _update_file(digest, path, relpath):
+    digest.update(relpath.encode('utf-8'))
+    digest.update(b'\0')
+    if os.path.islink(path):
+        digest.update(os.readlink(path).encode('utf-8'))
+    elif os.path.isfile(path):
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(65536), b''):
+                digest.update(block)
+    digest.update(b'\0')
+
+
+def _update_tree(digest, path, base):
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(name for name in dirs if name not in IGNORED_DIRS)
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            _update_file(digest, full_path, os.path.relpath(full_path, base))
+
+
+def get_requirements_files(config, checkout_path, docs_dir):
+    """
+    Return the requirements files the build installs.
+
+    This follows the lookup of
+    :py:meth:`readthedocs.doc_builder.python_environments.Virtualenv.install_user_requirements`.
+    """
+    if config.use_conda:
+        return [config.conda_file] if config.conda_file else []
+    if config.requirements_file:
+        return [config.requirements_file]
+    for path in (docs_dir, checkout_path):
+        for req_file in ('pip_requirements.txt', 'requirements.txt'):
+            test_path = os.path.join(path, req_file)
+            if os.path.exists(test_path):
+                return [test_path]
+    return []
+
+
+def get_source_fingerprint(project, version, config, build_env):
+    """
+    Hash the documentation sources and the build configuration.
+
+    This covers the docs directory, the Sphinx or MkDocs configuration, the
+    ``readthedocs.yml`` file, the requirements files, the builder image and
+    the project options that change the output. If the project is installed
+    into the build environment, the whole checkout is hashed instead of just
+    the docs directory, the package can be documented with autodoc.
+
+    :returns: the SHA1 hex digest of the build inputs
+    """
+    checkout_path = project.checkout_path(version.slug)
+    builder = get_builder_class(project.documentation_type)(
+        build_env=build_env,
+        python_env=None,
+    )
+    docs_dir = builder.docs_dir()
+    digest = hashlib.sha1()
+
+    options = {
+        'readthedocs': readthedocs.__version__,
+        'documentation_type': project.documentation_type,
+        'language': project.language,
+        # Feature ids on API projects, Feature objects on projects
+        'features': sorted(
+            getattr(feature, 'feature_id', feature)
+            for feature in getattr(project, 'features', [])
+        ),
+        'build_image': config.build_image,
+        'python_version': config.python_full_version,
+        'formats': sorted(config.formats),
+        'install_project': config.install_project,
+    }
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+
+    files = [config.source_file]
+    files.extend(get_requirements_files(config, checkout_path, docs_dir))
+    try:
+        files.append(project.conf_file(version.slug))
+    except ProjectConfigurationError:
+        pass
+    yaml_file = getattr(builder, 'yaml_file', None)
+    if yaml_file:
+        files.append(yaml_file)
+    for path in files:
+        _update_file(digest, path, os.path.relpath(path, checkout_path))
+
+    if config.install_project:
+        _update_tree(digest, checkout_path, checkout_path)
+    else:
+        _update_tree(digest, docs_dir, checkout_path)
+    fingerprint = digest.hexdigest()
+    log.info(
+        'Source fingerprint for %s/%s: %s',
+        project.slug, version.slug, fingerprint)
+    return fingerprint
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""CPU allocation of builds."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import logging
+import os
+from multiprocessing import cpu_count
+
+from builtins import object
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+SOURCE_SUFFIXES = ('.rst', '.md', '.txt', '.ipynb')
+
+
+class BuildResources(object):
+
+    """
+    CPUs assigned to a build.
+
+    :param cpus: CPUs the build can use, for its Docker container CPU shares
+        and to build formats at the same time
+    :param parallelism: number of processes a single ``sphinx-build`` or
+        LaTeX step should use, at most ``cpus``
+    """
+
+    def __init__(self, cpus=1, parallelism=1):
+        self.cpus = max(1, cpus)
+        self.parallelism = max(1, min(parallelism, self.cpus))
+
+    @property
+    def cpu_shares(self):
+        """Relative CPU weight of the build container, 1024 per CPU."""
+        return 1024 * self.cpus
+
+    def __repr__(self):
+        return '<BuildResources cpus={0} parallelism={1}>'.format(
+            self.cpus, self.parallelism)
+
+
+def get_available_cpus():
+    """Number of CPUs of the builder that aren't busy, at least one."""
+    cpus = cpu_count()
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        load = 0
+    return max(1, int(cpus - load))
+
+
+def count_source_files(path):
+    """Count the documentation source files under ``path``."""
+    count = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [
+            name for name in dirs
+            if not name.startswith(('.', '_build'))
+        ]
+        count += len([
+            name for name in files
+            if name.endswith(SOURCE_SUFFIXES)
+        ])
+    return count
+
+
+def get_build_resources(project, version):
+    """
+    Assign CPUs to a build, from the builder load and the project size.
+
+    A build gets the idle CPUs of the builder, up to ``BUILD_CPU_LIMIT``.
+    Parallel Sphinx builds only pay off on larger projects, so the
+    parallelism is one process per ``BUILD_FILES_PER_CPU`` source files.
+    """
+    cpus = min(
+        getattr(settings, 'BUILD_CPU_LIMIT', 2),
+        get_available_cpus(),
+    )
+    files = count_source_files(project.checkout_path(version.slug))
+    parallelism = files // getattr(settings, 'BUILD_FILES_PER_CPU', 100)
+    resources = BuildResources(cpus=cpus, parallelism=parallelism)
+    log.info(
+        'Assigned %s to build of %s (%s source files)',
+        resources, project.slug, files)
+    return resources
@@ -7,6 +7,8 @@ class ProjectsConfig(AppConfig):
     name = 'readthedocs.projects'
 
     def ready(self):
+        import readthedocs.projects.badges  # noqa
+        import readthedocs.projects.ownership  # noqa
         from readthedocs.projects import tasks
         from readthedocs.worker import app
         app.tasks.register(tasks.SyncRepositoryTask)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Status badges of the project versions.
+
+The state of the badge of a version is cached by project and version slug, so
+the badge view doesn't hit the database on each embed. Saving a finished
+build, which the API does on the web servers, and changes to the version clear
+the cached state.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from readthedocs.builds.constants import BUILD_STATE_FINISHED
+from readthedocs.builds.models import Build, Version
+
+log = logging.getLogger(__name__)
+
+BADGE_STYLES = ('flat', 'plastic', 'flat-square', 'for-the-badge', 'social')
+BADGE_PATH = os.path.join(
+    os.path.dirname(__file__), 'static', 'projects', 'badges',
+    '{state}-{style}.svg')
+
+PASSING = 'passing'
+FAILING = 'failing'
+UNKNOWN = 'unknown'
+
+# Cached for versions that aren't public
+NOT_PUBLIC = ''
+
+_badges = {}
+
+
+def badge_cache_key(project_slug, version_slug):
+    return 'badge-state:{0}:{1}'.format(project_slug, version_slug)
+
+
+def get_version_badge_state(version):
+    """Badge state from the last finished HTML build of ``version``."""
+    last_build = (
+        version.builds.filter(
+            type='html', state=BUILD_STATE_FINISHED, skipped=False)
+        .order_by('-date')
+        .values_list('success', flat=True)
+        .first()
+    )
+    if last_build is None:
+        return UNKNOWN
+    return PASSING if last_build else FAILING
+
+
+def get_badge_state(project_slug, version_slug, user=None):
+    """
+    Badge state of a version, as seen by ``user``.
+
+    The state of public versions is cached, other versions are only looked up
+    for logged in users.
+
+    :returns: a tuple of the state and whether it's the same for all users
+    """
+    key = badge_cache_key(project_slug, version_slug)
+    state = cache.get(key)
+    if state is None:
+        try:
+            version = Version.objects.public().get(
+                project__slug=project_slug, slug=version_slug)
+            state = get_version_badge_state(version)
+        except Version.DoesNotExist:
+            state = NOT_PUBLIC
+        cache.set(
+            key, state, getattr(settings, 'BADGE_CACHE_TIMEOUT', 5 * 60))
+    if state != NOT_PUBLIC:
+        return state, True
+    if user is not None and user.is_authenticated():
+        try:
+            version = Version.objects.public(user).get(
+                project__slug=project_slug, slug=version_slug)
+            return get_version_badge_state(version), False
+        except Version.DoesNotExist:
+            pass
+    return UNKNOWN, True
+
+
+def get_badge(state, style):
+    """SVG of the badge, read once per process."""
+    path = BADGE_PATH.format(state=state, style=style)
+    if path not in _badges:
+        with io.open(path, 'rb') as fd:
+            _badges[path] = fd.read()
+    return _badges[path]
+
+
+def clear_badge_state(project_slug, version_slug):
+    cache.delete(badge_cache_key(project_slug, version_slug))
+
+
+@receiver(post_save, sender=Build)
+def clear_badge_state_on_build(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Clear the cached state when a build of the version finishes."""
+    if instance.state != BUILD_STATE_FINISHED:
+        return
+    try:
+        version = instance.version
+        project_slug = version.project.slug if version else None
+    except ObjectDoesNotExist:
+        return
+    if project_slug:
+        clear_badge_state(project_slug, version.slug)
+
+
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+def clear_badge_state_on_version_change(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """The privacy level or active state of the version may have changed."""
+    try:
+        project_slug = instance.project.slug
+    except ObjectDoesNotExist:
+        return
+    clear_badge_state(project_slug, instance.slug)
@@ -14,10 +14,9 @@ from django.template.loader import render_to_string
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 from future.backports.urllib.parse import urlparse
-from guardian.shortcuts import assign
 from textclassifier.validators import ClassifierValidator
 
-from readthedocs.builds.constants import TAG
+from readthedocs.builds.constants import BUILD_PRIORITY_HIGH, TAG
 from readthedocs.core.utils import slugify, trigger_build
 from readthedocs.core.utils.extend import SettingsOverrideObject
 from readthedocs.integrations.models import Integration
@@ -64,7 +63,7 @@ class ProjectTriggerBuildMixin(object):
         """Trigger build on commit save."""
         project = super(ProjectTriggerBuildMixin, self).save(commit)
         if commit:
-            trigger_build(project=project)
+            trigger_build(project=project, priority=BUILD_PRIORITY_HIGH)
         return project
 
 
@@ -368,7 +367,11 @@ class BaseVersionsForm(forms.Form):
         version.privacy_level = privacy_level
         version.save()
         if version.active and not version.built and not version.uploaded:
-            trigger_build(project=self.project, version=version)
+            trigger_build(
+                project=self.project,
+                version=version,
+                priority=BUILD_PRIORITY_HIGH,
+            )
 
 
 def build_versions_form(project):
@@ -470,8 +473,6 @@ class UserForm(forms.Form):
 
     def save(self):
         self.project.users.add(self.user)
-        # Force update of permissions
-        assign('view_project', self.user, self.project)
         return self.user
 
 
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0026_ad-free-option'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='max_concurrent_builds',
+            field=models.PositiveIntegerField(blank=True, help_text='Builds of this project running at the same time, when the build scheduler is enabled.', null=True, verbose_name='Maximum concurrent builds'),
+        ),
+    ]
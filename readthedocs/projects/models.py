@@ -16,12 +16,13 @@ from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from future.backports.urllib.parse import urlparse  # noqa
-from guardian.shortcuts import assign
 from taggit.managers import TaggableManager
 
 from readthedocs.builds.constants import LATEST, LATEST_VERBOSE_NAME, STABLE
 from readthedocs.core.resolver import resolve, resolve_domain
 from readthedocs.core.utils import broadcast, slugify
+from readthedocs.core.utils.side_effects import (
+    run_side_effect, run_side_effect_on_commit)
 from readthedocs.projects import constants
 from readthedocs.projects.exceptions import ProjectConfigurationError
 from readthedocs.projects.querysets import (
@@ -157,6 +158,10 @@ class Project(models.Model):
         _('Container time limit'), max_length=10, null=True, blank=True)
     build_queue = models.CharField(
         _('Alternate build queue id'), max_length=32, null=True, blank=True)
+    max_concurrent_builds = models.PositiveIntegerField(
+        _('Maximum concurrent builds'), null=True, blank=True,
+        help_text=_('Builds of this project running at the same time, '
+                    'when the build scheduler is enabled.'))
     allow_promos = models.BooleanField(
         _('Allow paid advertising'), default=True, help_text=_(
             'If unchecked, users will still see community ads.'))
@@ -319,8 +324,6 @@ class Project(models.Model):
             if self.slug == '':
                 raise Exception(_('Model must have slug'))
         super(Project, self).save(*args, **kwargs)
-        for owner in self.users.all():
-            assign('view_project', owner, self)
         try:
             if self.default_branch:
                 latest = self.versions.get(slug=LATEST)
@@ -332,7 +335,10 @@ class Project(models.Model):
 
         # Add exceptions here for safety
         try:
-            self.sync_supported_versions()
+            run_side_effect(
+                ('sync_supported_versions', self.pk),
+                self.sync_supported_versions,
+            )
         except Exception:
             log.exception('failed to sync supported versions')
         try:
@@ -341,7 +347,9 @@ class Project(models.Model):
                     'Re-symlinking project and subprojects: project=%s',
                     self.slug,
                 )
-                broadcast(
+                run_side_effect_on_commit(
+                    ('symlink_project', self.pk),
+                    broadcast,
                     type='app',
                     task=tasks.symlink_project,
                     args=[self.pk],
@@ -351,17 +359,21 @@ class Project(models.Model):
                     self.slug,
                 )
                 for relationship in self.superprojects.all():
-                    broadcast(
+                    run_side_effect_on_commit(
+                        ('symlink_project', relationship.parent_id),
+                        broadcast,
                         type='app',
                         task=tasks.symlink_project,
-                        args=[relationship.parent.pk],
+                        args=[relationship.parent_id],
                     )
 
         except Exception:
             log.exception('failed to symlink project')
         try:
             if not first_save:
-                broadcast(
+                run_side_effect_on_commit(
+                    ('update_static_metadata', self.pk),
+                    broadcast,
                     type='app', task=tasks.update_static_metadata, args=[self.pk],)
         except Exception:
             log.exception('failed to update static metadata')
@@ -603,7 +615,7 @@ class Project(models.Model):
 
     @property
     def has_good_build(self):
-        return self.builds.filter(success=True).exists()
+        return self.builds.filter(success=True, skipped=False).exists()
 
     @property
     def has_versions(self):
@@ -691,7 +703,7 @@ class Project(models.Model):
 
         :param finished: Return only builds that are in a finished state
         """
-        kwargs = {'type': 'html'}
+        kwargs = {'type': 'html', 'skipped': False}
         if finished:
             kwargs['state'] = 'finished'
         return self.builds.filter(**kwargs).first()
@@ -1043,6 +1055,8 @@ class Feature(models.Model):
     BUILD_JSON_ARTIFACTS_WITH_HTML = 'build_json_artifacts_with_html'
     DONT_OVERWRITE_SPHINX_CONTEXT = 'dont_overwrite_sphinx_context'
     ALLOW_V2_CONFIG_FILE = 'allow_v2_config_file'
+    SHARE_SPHINX_DOCTREE = 'share_sphinx_doctree'
+    SKIP_UNCHANGED_BUILDS = 'skip_unchanged_builds'
 
     FEATURES = (
         (USE_SPHINX_LATEST, _('Use latest version of Sphinx')),
@@ -1056,6 +1070,10 @@ class Feature(models.Model):
             'Do not overwrite context vars in conf.py with Read the Docs context',)),
         (ALLOW_V2_CONFIG_FILE, _(
             'Allow to use the v2 of the configuration file')),
+        (SHARE_SPHINX_DOCTREE, _(
+            'Share the Sphinx doctree between the output formats')),
+        (SKIP_UNCHANGED_BUILDS, _(
+            'Skip builds when the documentation sources did not change')),
     )
 
     projects = models.ManyToManyField(
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Object permissions of the project owners.
+
+The owners of a project get the ``view_project`` permission on it and the
+``view_version`` permission on its versions. They are granted and revoked in
+bulk when the owners change and when versions are created, instead of on each
+save of the project and its versions. Owner changes, and permissions given
+otherwise, like from the admin, also clear the cached visibility of the
+users.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from guardian.models import GroupObjectPermission, UserObjectPermission
+
+from readthedocs.builds.models import Version
+from readthedocs.core.permissions import assign_bulk, remove_bulk
+from readthedocs.core.visibility import clear_visibility
+from readthedocs.projects.models import Project
+
+
+def grant_project_permissions(user_pks, project_pks):
+    """Grant the permissions on the projects and their versions."""
+    assign_bulk('view_project', user_pks, Project, project_pks)
+    assign_bulk(
+        'view_version', user_pks, Version,
+        Version.objects.filter(project__in=project_pks)
+        .values_list('pk', flat=True),
+    )
+
+
+def revoke_project_permissions(user_pks, project_pks):
+    """Revoke the permissions on the projects and their versions."""
+    remove_bulk('view_project', user_pks, Project, project_pks)
+    remove_bulk(
+        'view_version', user_pks, Version,
+        Version.objects.filter(project__in=project_pks)
+        .values_list('pk', flat=True),
+    )
+
+
+@receiver(m2m_changed, sender=Project.users.through)
+def update_owner_permissions(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Follow the owners added to and removed from projects."""
+    if action == 'pre_clear':
+        # The cleared side isn't known after the clear
+        if reverse:
+            pk_set = set(instance.projects.values_list('pk', flat=True))
+        else:
+            pk_set = set(instance.users.values_list('pk', flat=True))
+        action = 'post_remove'
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    if reverse:
+        user_pks, project_pks = [instance.pk], pk_set
+    else:
+        user_pks, project_pks = pk_set, [instance.pk]
+    if action == 'post_add':
+        grant_project_permissions(user_pks, project_pks)
+    else:
+        revoke_project_permissions(user_pks, project_pks)
+    clear_visibility(user_pks)
+
+
+@receiver(post_save, sender=Version)
+def grant_version_permissions(sender, instance, created, **kwargs):
+    """Grant the permissions on a new version to the project owners."""
+    if created:
+        assign_bulk(
+            'view_version',
+            instance.project.users.values_list('pk', flat=True),
+            Version,
+            [instance.pk],
+        )
+
+
+@receiver(post_save, sender=UserObjectPermission)
+@receiver(post_delete, sender=UserObjectPermission)
+def clear_user_visibility(sender, instance, **kwargs):
+    clear_visibility([instance.user_id])
+
+
+@receiver(post_save, sender=GroupObjectPermission)
+@receiver(post_delete, sender=GroupObjectPermission)
+def clear_group_visibility(sender, instance, **kwargs):
+    clear_visibility(instance.group.user_set.values_list('pk', flat=True))
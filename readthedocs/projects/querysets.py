@@ -4,9 +4,9 @@ from __future__ import absolute_import
 
 from django.db import models
 from django.db.models import Q
-from guardian.shortcuts import get_objects_for_user
 
 from . import constants
+from readthedocs.core.visibility import get_visibility
 from readthedocs.core.utils.extend import SettingsOverrideObject
 
 
@@ -17,12 +17,12 @@ class ProjectQuerySetBase(models.QuerySet):
     use_for_related_fields = True
 
     def _add_user_repos(self, queryset, user):
-        if user.has_perm('projects.view_project'):
-            return self.all().distinct()
-        if user.is_authenticated():
-            user_queryset = get_objects_for_user(user, 'projects.view_project')
-            queryset = user_queryset | queryset
-        return queryset.distinct()
+        visibility = get_visibility(user)
+        if visibility.all_projects:
+            return self.all()
+        if visibility.project_pks:
+            queryset = queryset | self.filter(pk__in=visibility.project_pks)
+        return queryset
 
     def for_user_and_viewer(self, user, viewer):
         """Show projects that a user owns, that another user can see."""
@@ -80,16 +80,14 @@ class RelatedProjectQuerySetBase(models.QuerySet):
     project_field = 'project'
 
     def _add_user_repos(self, queryset, user=None):
-        # Hack around get_objects_for_user not supporting global perms
-        if user.has_perm('projects.view_project'):
-            return self.all().distinct()
-        if user.is_authenticated():
-            # Add in possible user-specific views
-            project_qs = get_objects_for_user(user, 'projects.view_project')
-            pks = project_qs.values_list('pk', flat=True)
-            kwargs = {'%s__pk__in' % self.project_field: pks}
-            queryset = self.filter(**kwargs) | queryset
-        return queryset.distinct()
+        visibility = get_visibility(user)
+        if visibility.all_projects:
+            return self.all()
+        if visibility.project_pks:
+            # Add in the projects of the user
+            kwargs = {'%s__in' % self.project_field: visibility.project_pks}
+            queryset = queryset | self.filter(**kwargs)
+        return queryset
 
     def public(self, user=None, project=None):
         kwargs = {'%s__privacy_level' % self.project_field: constants.PUBLIC}
@@ -15,7 +15,10 @@ import logging
 import os
 import shutil
 import socket
+import tempfile
+import time
 from collections import Counter, defaultdict
+from multiprocessing.pool import ThreadPool
 
 import requests
 from builtins import str
@@ -34,20 +37,33 @@ from .models import ImportedFile, Project, Domain, Feature
 from .signals import before_vcs, after_vcs, before_build, after_build, files_changed
 from readthedocs.builds.constants import (
     BUILD_STATE_BUILDING, BUILD_STATE_CLONING, BUILD_STATE_FINISHED,
-    BUILD_STATE_INSTALLING, LATEST, LATEST_VERBOSE_NAME, STABLE_VERBOSE_NAME)
+    BUILD_STATE_INSTALLING, BUILD_STATE_TRIGGERED, LATEST, LATEST_VERBOSE_NAME,
+    STABLE_VERBOSE_NAME)
+from readthedocs.builds.blobstore import BlobStore, blob_store_enabled
+from readthedocs.builds.bundles import (
+    BundleError, create_bundle, extract_bundle, get_bundle_path)
 from readthedocs.builds.models import APIVersion, Build, Version
+from readthedocs.builds.scheduler import (
+    BuildScheduler, build_scheduler_enabled)
 from readthedocs.builds.signals import build_complete
 from readthedocs.builds.syncers import Syncer
 from readthedocs.core.resolver import resolve_path
+from readthedocs.core.serve_cache import (
+    clear_project_served_files, clear_served_files)
 from readthedocs.core.symlink import PublicSymlink, PrivateSymlink
 from readthedocs.core.utils import send_email, broadcast
+from readthedocs.doc_builder.compression import is_precompressed
 from readthedocs.doc_builder.config import load_yaml_config
 from readthedocs.doc_builder.constants import DOCKER_LIMITS
+from readthedocs.doc_builder.context import BuildContext
+from readthedocs.doc_builder.environments import parse_memory_limit
 from readthedocs.doc_builder.environments import (LocalBuildEnvironment,
                                                   DockerBuildEnvironment)
 from readthedocs.doc_builder.exceptions import BuildEnvironmentError
+from readthedocs.doc_builder.fingerprint import get_source_fingerprint
 from readthedocs.doc_builder.loader import get_builder_class
 from readthedocs.doc_builder.python_environments import Virtualenv, Conda
+from readthedocs.doc_builder.resources import get_build_resources
 from readthedocs.projects.models import APIProject
 from readthedocs.restapi.client import api as api_v2
 from readthedocs.restapi.utils import index_search_request
@@ -245,7 +261,12 @@ class UpdateDocsTask(Task):
 
     def run(self, *args, **kwargs):
         step = UpdateDocsTaskStep(task=self)
-        return step.run(*args, **kwargs)
+        try:
+            return step.run(*args, **kwargs)
+        finally:
+            if build_scheduler_enabled():
+                # Dispatch the builds that were waiting for this one
+                schedule_builds.delay()
 
 
 class UpdateDocsTaskStep(SyncRepositoryMixin):
@@ -274,6 +295,8 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
         self.build_force = force
         self.build_search = search
         self.build_localmedia = localmedia
+        self.html_published = False
+        self.synced_formats = set()
         self.build = {}
         if build is not None:
             self.build = build
@@ -286,6 +309,7 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
         if config is not None:
             self.config = config
         self.task = task
+        self.build_context = None
 
     def _log(self, msg):
         log.info(LOG_TEMPLATE
@@ -333,6 +357,14 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
             self.project = self.get_project(pk)
             self.version = self.get_version(self.project, version_pk)
             self.build = self.get_build(build_pk)
+            if self.build.get('state') == BUILD_STATE_FINISHED:
+                log.info(
+                    LOG_TEMPLATE.format(
+                        project=self.project.slug,
+                        version=self.version.slug,
+                        msg='Build {0} was superseded, skipping'.format(build_pk),
+                    ))
+                return True
             self.build_search = search
             self.build_localmedia = localmedia
             self.build_force = force
@@ -341,6 +373,9 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
             setup_successful = self.run_setup(record=record)
             if not setup_successful:
                 return False
+            if self.is_up_to_date():
+                self.finish_up_to_date_build()
+                return True
 
         # Catch unhandled errors in the setup step
         except Exception as e:  # noqa
@@ -424,6 +459,13 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
                     'Problem parsing YAML configuration. {0}'.format(str(e))
                 )
 
+            # Shared by the builders, instead of each one querying the API
+            self.build_context = BuildContext.fetch(
+                self.project,
+                self.version,
+                commit=self.build.get('commit'),
+            )
+
         if self.setup_env.failure or self.config is None:
             self._log('Failing build because of setup failure: %s' % self.setup_env.failure)
 
@@ -440,6 +482,46 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
 
         return True
 
+    def is_up_to_date(self):
+        """
+        Whether the last successful build had the same sources.
+
+        The fingerprint of the sources is stored with the build, so the next
+        build can compare with it. Forced builds are never up to date.
+        """
+        if not self.project.has_feature(Feature.SKIP_UNCHANGED_BUILDS):
+            return False
+        try:
+            self.build['fingerprint'] = get_source_fingerprint(
+                self.project, self.version, self.config, self.setup_env)
+        except (IOError, OSError):
+            log.exception('Unable to compute the source fingerprint')
+            return False
+        if self.build_force or not getattr(self.version, 'built', False):
+            return False
+
+        try:
+            builds = api_v2.build.get(
+                version=self.version.pk,
+                state=BUILD_STATE_FINISHED,
+                success=True,
+                skipped=False,
+                limit=1,
+            )
+        except HttpClientError:
+            log.exception('Unable to get the last build: version=%s', self.version)
+            return False
+        results = builds.get('results', [])
+        return bool(results) and (
+            results[0].get('fingerprint') == self.build['fingerprint'])
+
+    def finish_up_to_date_build(self):
+        """Finish the build as successful, without building anything."""
+        self._log('Skipping build, the documentation sources did not change')
+        self.setup_env.update_on_success = True
+        self.setup_env.update_build(BUILD_STATE_FINISHED)
+        build_complete.send(sender=Build, build=self.build)
+
     def run_build(self, docker, record):
         """
         Build the docs in an environment.
@@ -457,7 +539,8 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
         else:
             env_cls = LocalBuildEnvironment
         self.build_env = env_cls(project=self.project, version=self.version, config=self.config,
-                                 build=self.build, record=record, environment=env_vars)
+                                 build=self.build, record=record, environment=env_vars,
+                                 resources=get_build_resources(self.project, self.version))
 
         # Environment used for building code, usually with Docker
         with self.build_env:
@@ -595,18 +678,8 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
         downloads, and search. Tasks are broadcast to all web servers from here.
         """
         # Update version if we have successfully built HTML output
-        try:
-            if html:
-                version = api_v2.version(self.version.pk)
-                version.patch({
-                    'active': True,
-                    'built': True,
-                })
-        except HttpClientError:
-            log.exception(
-                'Updating version failed, skipping file sync: version=%s',
-                self.version,
-            )
+        if html and not self.html_published:
+            self.publish_html()
 
         # Broadcast finalization steps to web application instances
         broadcast(
@@ -623,10 +696,31 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
                 search=search,
                 pdf=pdf,
                 epub=epub,
+                synced_formats=sorted(self.synced_formats),
             ),
             callback=sync_callback.s(version_pk=self.version.pk, commit=self.build['commit']),
         )
 
+    def publish_html(self):
+        """
+        Mark the version as built, to serve its HTML.
+
+        This is done as soon as the HTML is built, without waiting for the
+        other formats.
+        """
+        try:
+            version = api_v2.version(self.version.pk)
+            version.patch({
+                'active': True,
+                'built': True,
+            })
+            self.html_published = True
+        except HttpClientError:
+            log.exception(
+                'Updating version failed, skipping file sync: version=%s',
+                self.version,
+            )
+
     def setup_python_environment(self):
         """
         Build the virtualenv and install the project into it.
@@ -670,23 +764,109 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
         before_build.send(sender=self.version)
 
         outcomes = defaultdict(lambda: False)
+        timings = self.build['timings'] = {}
         with self.project.repo_nonblockinglock(
                 version=self.version,
                 max_lock_age=getattr(settings, 'REPO_LOCK_SECONDS', 30)):
+            start = time.time()
             outcomes['html'] = self.build_docs_html()
-            outcomes['search'] = self.build_docs_search()
-            outcomes['localmedia'] = self.build_docs_localmedia()
-            outcomes['pdf'] = self.build_docs_pdf()
-            outcomes['epub'] = self.build_docs_epub()
+            timings['html'] = round(time.time() - start, 2)
+            if outcomes['html'] and self.build.get('id'):
+                self.publish_html()
+            outcomes.update(self.build_docs_formats(
+                [
+                    ('search', self.build_docs_search),
+                    ('localmedia', self.build_docs_localmedia),
+                    ('pdf', self.build_docs_pdf),
+                    ('epub', self.build_docs_epub),
+                ],
+                timings=timings,
+            ))
 
         after_build.send(sender=self.version)
         return outcomes
 
+    def get_format_workers(self, count):
+        """
+        Number of formats to build at the same time.
+
+        This is bounded by the CPUs assigned to the build, leaving each format
+        the CPUs for its parallel jobs, and by the memory limit of the build
+        container, allowing ``BUILD_FORMAT_MEMORY`` for each format build.
+        """
+        workers = getattr(settings, 'BUILD_FORMAT_WORKERS', None)
+        if not workers:
+            resources = self.build_env.resources
+            workers = resources.cpus // resources.parallelism
+        mem_limit = parse_memory_limit(
+            getattr(self.build_env, 'container_mem_limit', None))
+        if mem_limit:
+            format_memory = parse_memory_limit(
+                getattr(settings, 'BUILD_FORMAT_MEMORY', '512m'))
+            workers = min(workers, mem_limit // format_memory)
+        return max(1, min(workers, count))
+
+    def build_docs_formats(self, formats, timings):
+        """
+        Build the secondary formats, at the same time if resources allow it.
+
+        Each format is synced to the web servers as soon as it is built,
+        except search, which is synced with the rest of the build so it is on
+        the web servers when they index it. If a format raises an exception,
+        the other formats are still built, and the first exception, in
+        ``formats`` order, is raised afterwards.
+
+        :param formats: list of ``(name, build function)`` pairs
+        :param timings: dictionary to add the build time of each format to
+        :returns: build outcome of each format, keyed by name
+        """
+        def build_format(item):
+            name, build_func = item
+            start = time.time()
+            try:
+                return name, build_func(), None
+            except Exception as e:  # pylint: disable=broad-except
+                return name, False, e
+            finally:
+                timings[name] = round(time.time() - start, 2)
+
+        outcomes = {}
+        errors = {}
+        pool = ThreadPool(self.get_format_workers(len(formats)))
+        try:
+            for name, success, error in pool.imap_unordered(
+                    build_format, formats):
+                outcomes[name] = success
+                if error is not None:
+                    errors[name] = error
+                elif success and name != 'search':
+                    self.sync_format(name)
+        finally:
+            pool.close()
+            pool.join()
+
+        for name, __ in formats:
+            if name in errors:
+                raise errors[name]
+        return outcomes
+
+    def sync_format(self, name):
+        """Gracefully attempt to move files of a format via task on web workers."""
+        try:
+            broadcast(type='app', task=move_files,
+                      args=[self.version.pk, socket.gethostname()],
+                      kwargs={name: True}
+                      )
+            self.synced_formats.add(name)
+        except socket.error:
+            log.exception('move_files task has failed on socket error.')
+
     def build_docs_html(self):
         """Build HTML docs."""
         html_builder = get_builder_class(self.project.documentation_type)(
             build_env=self.build_env,
             python_env=self.python_env,
+            context=self.build_context,
         )
         if self.build_force:
             html_builder.force()
@@ -694,16 +874,17 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
         success = html_builder.build()
         if success:
             html_builder.move()
-
-        # Gracefully attempt to move files via task on web workers.
-        try:
-            broadcast(type='app', task=move_files,
-                      args=[self.version.pk, socket.gethostname()],
-                      kwargs=dict(html=True)
-                      )
-        except socket.error:
-            log.exception('move_files task has failed on socket error.')
-
+            if getattr(settings, 'ARTIFACT_BUNDLES', False):
+                try:
+                    create_bundle(html_builder.target)
+                except (BundleError, IOError, OSError):
+                    # The web servers sync the files one by one instead, the
+                    # bundle of a previous build must not be used
+                    log.exception(
+                        'Failed to create bundle: %s', html_builder.target)
+                    remove_bundle(html_builder.target)
+
+        self.sync_format('html')
         return success
 
     def build_docs_search(self):
@@ -757,9 +938,17 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
         only raise a warning exception here. A hard error will halt the build
         process.
         """
-        builder = get_builder_class(builder_class)(self.build_env, python_env=self.python_env)
+        builder = get_builder_class(builder_class)(
+            self.build_env,
+            python_env=self.python_env,
+            context=self.build_context,
+        )
         success = builder.build()
         builder.move()
+        # Builders with several documents, like PDF, time each of them
+        for name, duration in getattr(builder, 'timings', {}).items():
+            self.build.setdefault('timings', {})[
+                '{0}:{1}'.format(builder.type, name)] = duration
         return success
 
     def send_notifications(self):
@@ -770,13 +959,19 @@ class UpdateDocsTaskStep(SyncRepositoryMixin):
 # Web tasks
 @app.task(queue='web')
 def sync_files(project_pk, version_pk, hostname=None, html=False,
-               localmedia=False, search=False, pdf=False, epub=False):
+               localmedia=False, search=False, pdf=False, epub=False,
+               synced_formats=None):
     """
     Sync build artifacts to application instances.
 
     This task broadcasts from a build instance on build completion and performs
     synchronization of build artifacts on each application instance.
+
+    :param synced_formats: formats already synced by :py:func:`move_files` as
+        soon as they were built, they aren't copied again
+    :returns: the sync results from :py:func:`move_files`
     """
+    synced_formats = synced_formats or []
     # Clean up unused artifacts
     version = Version.objects.get(pk=version_pk)
     if not pdf:
@@ -795,22 +990,30 @@ def sync_files(project_pk, version_pk, hostname=None, html=False,
         )
 
     # Sync files to the web servers
-    move_files(
+    results = move_files(
         version_pk,
         hostname,
         html=html,
-        localmedia=localmedia,
-        search=search,
-        pdf=pdf,
-        epub=epub,
+        localmedia=localmedia and 'localmedia' not in synced_formats,
+        search=search and 'search' not in synced_formats,
+        pdf=pdf and 'pdf' not in synced_formats,
+        epub=epub and 'epub' not in synced_formats,
     )
 
+    # Downloads are listed from the manifest, not from the media files
+    version.update_artifacts()
+
     # Symlink project
     symlink_project(project_pk)
 
     # Update metadata
     update_static_metadata(project_pk)
 
+    # Files served from Python are resolved again
+    clear_served_files(version)
+
+    return results
+
 
 @app.task(queue='web')
 def move_files(version_pk, hostname, html=False, localmedia=False, search=False,
@@ -830,16 +1033,25 @@ def move_files(version_pk, hostname, html=False, localmedia=False, search=False,
     :type pdf: bool
     :param epub: Sync ePub files
     :type epub: bool
+    :returns: per server results of each copy, keyed by artifact type. Syncers
+        that don't report results, like the local ones, have an empty list.
+    :rtype: dict
     """
     version = Version.objects.get(pk=version_pk)
     log.debug(LOG_TEMPLATE.format(project=version.project.slug, version=version.slug,
                                   msg='Moving files'))
+    results = {}
 
     if html:
         from_path = version.project.artifact_path(
             version=version.slug, type_=version.project.documentation_type)
         target = version.project.rtd_build_path(version.slug)
-        Syncer.copy(from_path, target, host=hostname)
+        if getattr(settings, 'ARTIFACT_BUNDLES', False):
+            results['html'] = sync_bundle(from_path, target, hostname)
+        else:
+            results['html'] = Syncer.copy(from_path, target, host=hostname) or []
+        if blob_store_enabled() and os.path.exists(target):
+            BlobStore().dedup_tree(target)
 
     if 'sphinx' in version.project.documentation_type:
         if search:
@@ -847,14 +1059,14 @@ def move_files(version_pk, hostname, html=False, localmedia=False, search=False,
                 version=version.slug, type_='sphinx_search')
             to_path = version.project.get_production_media_path(
                 type_='json', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
+            results['search'] = Syncer.copy(from_path, to_path, host=hostname) or []
 
         if localmedia:
             from_path = version.project.artifact_path(
                 version=version.slug, type_='sphinx_localmedia')
             to_path = version.project.get_production_media_path(
                 type_='htmlzip', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
+            results['localmedia'] = Syncer.copy(from_path, to_path, host=hostname) or []
 
         # Always move PDF's because the return code lies.
         if pdf:
@@ -862,13 +1074,55 @@ def move_files(version_pk, hostname, html=False, localmedia=False, search=False,
                                                       type_='sphinx_pdf')
             to_path = version.project.get_production_media_path(
                 type_='pdf', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
+            results['pdf'] = Syncer.copy(from_path, to_path, host=hostname) or []
         if epub:
             from_path = version.project.artifact_path(version=version.slug,
                                                       type_='sphinx_epub')
             to_path = version.project.get_production_media_path(
                 type_='epub', version_slug=version.slug, include_file=False)
-            Syncer.copy(from_path, to_path, host=hostname)
+            results['epub'] = Syncer.copy(from_path, to_path, host=hostname) or []
+
+    return results
+
+
+def sync_bundle(from_path, target, hostname):
+    """
+    Fetch the bundle of ``from_path`` from the build server and unpack it.
+
+    The bundle is copied as a single file to a temporary path on this server,
+    extracted to ``target`` and removed. Syncers that push the files to other
+    servers can't unpack the bundle there, the artifact directory is synced
+    with them instead, as it is when the bundle can't be copied or extracted.
+    """
+    if not getattr(Syncer, 'copies_locally', False):
+        return Syncer.copy(from_path, target, host=hostname) or []
+    bundle_file = get_bundle_path(from_path)
+    bundle_dir = os.path.dirname(bundle_file)
+    if not os.path.exists(bundle_dir):
+        os.makedirs(bundle_dir)
+    fd, local_file = tempfile.mkstemp(dir=bundle_dir, suffix='.tar.gz')
+    os.close(fd)
+    try:
+        results = Syncer.copy(
+            bundle_file, local_file, host=hostname, is_file=True) or []
+        if all(result['success'] for result in results):
+            extract_bundle(local_file, target)
+            return results
+    except (BundleError, IOError, OSError):
+        log.exception('Failed to sync bundle: %s', bundle_file)
+    finally:
+        if os.path.exists(local_file):
+            os.remove(local_file)
+    return Syncer.copy(from_path, target, host=hostname) or []
+
+
+@app.task()
+def remove_bundle(path):
+    """Remove the bundle of the artifact directory ``path`` on the build server."""
+    bundle_file = get_bundle_path(path)
+    if os.path.exists(bundle_file):
+        log.info('Removing bundle %s', bundle_file)
+        os.remove(bundle_file)
 
 
 @app.task(queue='web')
@@ -911,6 +1165,7 @@ def symlink_project(project_pk):
     for symlink in [PublicSymlink, PrivateSymlink]:
         sym = symlink(project=project)
         sym.run()
+    clear_project_served_files(project)
 
 
 @app.task(queue='web')
@@ -1004,6 +1259,8 @@ def _manage_imported_files(version, path, commit):
             dirpath = os.path.join(root.replace(path, '').lstrip('/'),
                                    filename.lstrip('/'))
             full_path = os.path.join(root, filename)
+            if is_precompressed(full_path):
+                continue
             md5 = hashlib.md5(open(full_path, 'rb').read()).hexdigest()
             try:
                 obj, __ = ImportedFile.objects.get_or_create(
@@ -1192,6 +1449,8 @@ def clear_artifacts(paths):
     """
     for path in paths:
         remove_dir(path)
+    if blob_store_enabled():
+        BlobStore().collect_garbage()
 
 
 @app.task(queue='web')
@@ -1203,6 +1462,23 @@ def sync_callback(_, version_pk, commit, *args, **kwargs):
     """
     fileify(version_pk, commit=commit)
     update_search(version_pk, commit=commit)
+    if getattr(settings, 'ARTIFACT_BUNDLES', False):
+        # Every web server has unpacked the bundle
+        version = Version.objects.get(pk=version_pk)
+        broadcast(
+            type='build',
+            task=remove_bundle,
+            args=[version.project.artifact_path(
+                version=version.slug,
+                type_=version.project.documentation_type)],
+        )
+
+
+@app.task(queue='web')
+def schedule_builds():
+    """Dispatch the builds held by the build scheduler that fit the limits."""
+    if build_scheduler_enabled():
+        BuildScheduler().schedule()
 
 
 @app.task()
@@ -1219,17 +1495,27 @@ def finish_inactive_builds():
     """
     time_limit = int(DOCKER_LIMITS['time'] * 1.2)
     delta = datetime.timedelta(seconds=time_limit)
+    # Builds are running since they were dispatched, or triggered if they
+    # weren't dispatched by the build scheduler
+    limit = datetime.datetime.now() - delta
     query = (~Q(state=BUILD_STATE_FINISHED) &
-             Q(date__lte=datetime.datetime.now() - delta))
+             (Q(dispatched__lte=limit) |
+              Q(dispatched__isnull=True, date__lte=limit)))
+
+    builds = Build.objects.filter(query)
+    if build_scheduler_enabled():
+        # Builds held by the scheduler aren't running yet
+        builds = builds.exclude(
+            state=BUILD_STATE_TRIGGERED, dispatched__isnull=True)
 
     builds_finished = 0
-    builds = Build.objects.filter(query)[:50]
-    for build in builds:
+    for build in builds[:50]:
 
         if build.project.container_time_limit:
             custom_delta = datetime.timedelta(
                 seconds=int(build.project.container_time_limit))
-            if build.date + custom_delta > datetime.datetime.now():
+            started = build.dispatched or build.date
+            if started + custom_delta > datetime.datetime.now():
                 # Do not mark as FINISHED builds with a custom time limit that wasn't
                 # expired yet (they are still building the project version)
                 continue
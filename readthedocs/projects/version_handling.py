@@ -8,11 +8,15 @@ from builtins import object, range
 from collections import defaultdict
 
 import six
+from django.db.models.query import QuerySet
 from packaging.version import InvalidVersion, Version
 
 from readthedocs.builds.constants import (
     LATEST_VERBOSE_NAME, STABLE_VERBOSE_NAME, TAG)
 
+#: Length of ``Version.sort_key``, longer keys aren't stored
+VERSION_SORT_KEY_LENGTH = 255
+
 
 def get_major(version):
     """
@@ -150,6 +154,107 @@ def parse_version_failsafe(version_string):
         return None
 
 
+def _number_key(number):
+    """Sortable string of ``number``, prefixed by its length."""
+    digits = six.text_type(number)
+    if len(digits) > 99:
+        raise ValueError('Number too large: {0}'.format(digits))
+    return '{0:02d}{1}'.format(len(digits), digits)
+
+
+def _segment_key(segment):
+    """
+    Sortable string of the alphanumeric ``segment``.
+
+    Each character is written as two digits, and the segment ends with
+    ``00``, which sorts before any character.
+    """
+    return ''.join(
+        '{0:02d}'.format(int(char, 36) + 10) for char in segment) + '00'
+
+
+# Normalized pre release letters
+PRE_RELEASE_KEYS = {'a': '0', 'b': '1', 'rc': '2'}
+
+
+def version_sort_key(version_string):
+    """
+    Return a string that sorts like the parsed ``version_string``.
+
+    Comparing the keys of two versions as strings gives the same result as
+    comparing their :py:class:`packaging.version.Version`, so versions can be
+    ordered by the database. Versions that can't be parsed, like ``latest``,
+    get an empty key.
+
+    Keys only have digits and lowercase letters, so they sort the same with
+    the collations of the databases, which may ignore punctuation. Each part
+    of the version, in the order of `PEP 440`_, is encoded so that no encoded
+    part is the prefix of another one: numbers are prefixed by their length,
+    each release number is prefixed by ``1`` and the release ends with ``0``,
+    and missing pre, post and dev parts are ``0`` or ``2`` to sort before or
+    after any value.
+
+    .. _PEP 440: https://www.python.org/dev/peps/pep-0440/#summary-of-permitted-suffixes-and-relative-ordering
+
+    :param version_string: version as string object (e.g. '3.10.1')
+    :type version_string: str or unicode
+    :rtype: unicode
+    """
+    version = parse_version_failsafe(version_string)
+    if version is None:
+        return ''
+
+    release = list(version.release)
+    # Trailing zeros don't change the version, 1.0 == 1
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+
+    try:
+        parts = [_number_key(version.epoch)]
+        parts.extend('1' + _number_key(number) for number in release)
+        parts.append('0')
+
+        # Development releases without a pre or post release go before any
+        # pre release: 1.0.dev1 < 1.0a1
+        if version.pre is not None:
+            letter, number = version.pre
+            parts.append(
+                '1' + PRE_RELEASE_KEYS[letter] + _number_key(number))
+        elif version.dev is not None and version.post is None:
+            parts.append('0')
+        else:
+            parts.append('2')
+
+        if version.post is not None:
+            parts.append('1' + _number_key(version.post))
+        else:
+            parts.append('0')
+
+        if version.dev is not None:
+            parts.append('1' + _number_key(version.dev))
+        else:
+            parts.append('2')
+
+        if version.local is not None:
+            parts.append('1')
+            for segment in version.local.split('.'):
+                # Alphanumeric segments go before numeric segments
+                if segment.isdigit():
+                    parts.append('2' + _number_key(int(segment)))
+                else:
+                    parts.append('1' + _segment_key(segment))
+            parts.append('0')
+        else:
+            parts.append('0')
+    except (KeyError, ValueError):
+        return ''
+
+    key = ''.join(parts)
+    if len(key) > VERSION_SORT_KEY_LENGTH:
+        return ''
+    return key
+
+
 def comparable_version(version_string):
     """
     Can be used as ``key`` argument to ``sorted``.
@@ -176,10 +281,17 @@ def comparable_version(version_string):
     return comparable
 
 
+def _order_by_version(queryset):
+    """Order a ``Version`` queryset by ``sort_key``, highest version first."""
+    return queryset.exclude(sort_key='').order_by('-sort_key', '-verbose_name')
+
+
 def sort_versions(version_list):
     """
     Take a list of Version models and return a sorted list.
 
+    A queryset is sorted by the database, using ``Version.sort_key``.
+
     :param version_list: list of Version models
     :type version_list: list(readthedocs.builds.models.Version)
 
@@ -188,6 +300,12 @@ def sort_versions(version_list):
     :rtype: list(tupe(readthedocs.builds.models.Version,
             packaging.version.Version))
     """
+    if isinstance(version_list, QuerySet):
+        return [
+            (version_obj, parse_version_failsafe(version_obj.verbose_name))
+            for version_obj in _order_by_version(version_list)
+        ]
+
     versions = []
     for version_obj in version_list:
         version_slug = version_obj.verbose_name
@@ -209,6 +327,12 @@ def highest_version(version_list):
 
     :rtype: tupe(readthedocs.builds.models.Version, packaging.version.Version)
     """
+    if isinstance(version_list, QuerySet):
+        version_obj = _order_by_version(version_list).first()
+        if version_obj is not None:
+            return (version_obj, parse_version_failsafe(version_obj.verbose_name))
+        return (None, None)
+
     versions = sort_versions(version_list)
     if versions:
         return versions[0]
@@ -227,6 +351,16 @@ def determine_stable_version(version_list):
 
     :rtype: readthedocs.builds.models.Version
     """
+    if isinstance(version_list, QuerySet):
+        # Only the highest versions are parsed, until one isn't a prerelease
+        ordered = _order_by_version(version_list)
+        for queryset in (ordered.filter(type=TAG), ordered):
+            for version_obj in queryset.iterator():
+                comparable = parse_version_failsafe(version_obj.verbose_name)
+                if comparable and not comparable.is_prerelease:
+                    return version_obj
+        return None
+
     versions = sort_versions(version_list)
     versions = [(version_obj, comparable)
                 for version_obj, comparable in versions
@@ -15,18 +15,21 @@ import requests
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.contrib.staticfiles.templatetags.staticfiles import static
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
-from django.views.decorators.cache import never_cache
+from django.utils.cache import (
+    add_never_cache_headers, get_conditional_response, patch_cache_control)
+from django.utils.http import quote_etag
 from django.views.generic import DetailView, ListView
 from taggit.models import Tag
 
 from readthedocs.builds.constants import LATEST
 from readthedocs.builds.models import Version
 from readthedocs.builds.views import BuildTriggerMixin
+from readthedocs.core.media import serve_file
+from readthedocs.projects import badges
 from readthedocs.projects.models import ImportedFile, Project
 from readthedocs.search.indexes import PageIndex
 from readthedocs.search.views import LOG_TEMPLATE
@@ -109,31 +112,29 @@ class ProjectDetailView(BuildTriggerMixin, ProjectOnboardMixin, DetailView):
         return context
 
 
-@never_cache
 def project_badge(request, project_slug):
     """Return a sweet badge for the project."""
     style = request.GET.get('style', 'flat')
-    if style not in ("flat", "plastic", "flat-square", "for-the-badge", "social"):
-        style = "flat"
-    badge_path = 'projects/badges/%s-' + style + '.svg'
+    if style not in badges.BADGE_STYLES:
+        style = 'flat'
     version_slug = request.GET.get('version', LATEST)
-    try:
-        version = Version.objects.public(request.user).get(
-            project__slug=project_slug, slug=version_slug)
-    except Version.DoesNotExist:
-        url = static(badge_path % 'unknown')
-        return HttpResponseRedirect(url)
-    version_builds = version.builds.filter(type='html',
-                                           state='finished').order_by('-date')
-    if not version_builds.exists():
-        url = static(badge_path % 'unknown')
-        return HttpResponseRedirect(url)
-    last_build = version_builds[0]
-    if last_build.success:
-        url = static(badge_path % 'passing')
+    state, shared = badges.get_badge_state(
+        project_slug, version_slug, user=request.user)
+
+    etag = '{0}-{1}'.format(state, style)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(
+            badges.get_badge(state, style), content_type='image/svg+xml')
+    response['ETag'] = quote_etag(etag)
+    if shared:
+        patch_cache_control(
+            response, public=True,
+            max_age=getattr(settings, 'BADGE_MAX_AGE', 60))
     else:
-        url = static(badge_path % 'failing')
-    return HttpResponseRedirect(url)
+        add_never_cache_headers(response)
+        patch_cache_control(response, private=True)
+    return response
 
 
 def project_downloads(request, project_slug):
@@ -180,6 +181,18 @@ def project_download_media(request, project_slug, type_, version_slug):
             settings.MEDIA_URL, type_, project_slug, version_slug,
             '%s.%s' % (project_slug, type_.replace('htmlzip', 'zip')))
         return HttpResponseRedirect(path)
+    elif getattr(settings, 'PYTHON_MEDIA', False):
+        path = version.project.get_production_media_path(
+            type_=type_, version_slug=version_slug)
+        # The checksum of the manifest makes a strong ETag
+        artifact = (version.artifacts or {}).get(type_, {})
+        return serve_file(
+            request,
+            path,
+            etag=artifact.get('sha1'),
+            filename='%s-%s.%s' % (
+                project_slug, version_slug, path.split('.')[-1]),
+        )
     else:
         # Get relative media path
         path = (
@@ -112,6 +112,7 @@ class BuildSerializer(serializers.ModelSerializer):
     version_slug = serializers.ReadOnlyField(source='version.slug')
     docs_url = serializers.ReadOnlyField(source='version.get_absolute_url')
     state_display = serializers.ReadOnlyField(source='get_state_display')
+    timings = serializers.JSONField(required=False, allow_null=True)
 
     class Meta(object):
         model = Build
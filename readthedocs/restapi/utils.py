@@ -27,6 +27,7 @@ def sync_versions(project, versions, type):  # pylint: disable=redefined-builtin
 
     # Add new versions
     added = set()
+    new_versions = []
     has_user_stable = False
     has_user_latest = False
     for version in versions:
@@ -74,13 +75,19 @@ def sync_versions(project, versions, type):  # pylint: disable=redefined-builtin
                 )
         else:
             # New Version
-            created_version = Version.objects.create(
+            new_versions.append(Version(
                 project=project,
                 type=type,
                 identifier=version_id,
                 verbose_name=version_name,
-            )
-            added.add(created_version.slug)
+            ))
+
+    # Allocate the slugs of all new versions with a single query
+    slug_field = Version._meta.get_field('slug')  # pylint: disable=protected-access
+    slug_field.create_slugs(new_versions)
+    for created_version in new_versions:
+        created_version.save()
+        added.add(created_version.slug)
     if not has_user_stable:
         stable_version = (
             project.versions
@@ -18,6 +18,7 @@ from readthedocs.builds.constants import BRANCH, TAG
 from readthedocs.builds.models import Build, BuildCommandResult, Version
 from readthedocs.core.utils import trigger_build
 from readthedocs.core.utils.extend import SettingsOverrideObject
+from readthedocs.core.utils.side_effects import collect_side_effects
 from readthedocs.oauth.models import RemoteOrganization, RemoteRepository
 from readthedocs.oauth.services import GitHubService, registry
 from readthedocs.projects.models import Domain, EmailHook, Project
@@ -184,15 +185,17 @@ class ProjectViewSet(UserSelectViewSet):
             # Update All Versions
             data = request.data
             added_versions = set()
-            if 'tags' in data:
-                ret_set = api_utils.sync_versions(
-                    project=project, versions=data['tags'], type=TAG)
-                added_versions.update(ret_set)
-            if 'branches' in data:
-                ret_set = api_utils.sync_versions(
-                    project=project, versions=data['branches'], type=BRANCH)
-                added_versions.update(ret_set)
-            deleted_versions = api_utils.delete_versions(project, data)
+            with collect_side_effects():
+                if 'tags' in data:
+                    ret_set = api_utils.sync_versions(
+                        project=project, versions=data['tags'], type=TAG)
+                    added_versions.update(ret_set)
+                if 'branches' in data:
+                    ret_set = api_utils.sync_versions(
+                        project=project, versions=data['branches'],
+                        type=BRANCH)
+                    added_versions.update(ret_set)
+                deleted_versions = api_utils.delete_versions(project, data)
         except Exception as e:
             log.exception('Sync Versions Error')
             return Response(
@@ -235,6 +238,16 @@ class VersionViewSet(UserSelectViewSet):
     model = Version
     filter_fields = ('active', 'project__slug',)
 
+    @detail_route()
+    def build_context(self, request, **kwargs):
+        """Data for the templates of a build of this version, in one call."""
+        version = self.get_object()
+        versions = version.project.versions.filter(active=True)
+        return Response({
+            'versions': VersionSerializer(versions, many=True).data,
+            'downloads': version.get_downloads(),
+        })
+
 
 class BuildViewSetBase(UserSelectViewSet):
     permission_classes = [APIRestrictedPermission]
@@ -242,7 +255,8 @@ class BuildViewSetBase(UserSelectViewSet):
     serializer_class = BuildSerializer
     admin_serializer_class = BuildAdminSerializer
     model = Build
-    filter_fields = ('project__slug',)
+    filter_fields = (
+        'project__slug', 'version', 'state', 'success', 'skipped')
 
 
 class BuildViewSet(SettingsOverrideObject):
@@ -182,6 +182,26 @@ class APIBuildTests(TestCase):
         self.assertEqual(build['success'], False)
         self.assertEqual(build['docs_url'], dashboard_url)
 
+    def test_make_build_timings(self):
+        client = APIClient()
+        client.login(username='super', password='test')
+        resp = client.post(
+            '/api/v2/build/',
+            {
+                'project': 1,
+                'version': 1,
+                'state': 'finished',
+                'timings': {'html': 12.5, 'pdf': 30.1},
+            },
+            format='json',
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        build = Build.objects.get(pk=resp.data['id'])
+        self.assertEqual(build.timings, {'html': 12.5, 'pdf': 30.1})
+
+        resp = client.get('/api/v2/build/%s/' % build.pk)
+        self.assertEqual(resp.data['timings'], {'html': 12.5, 'pdf': 30.1})
+
     def test_make_build_without_permission(self):
         """Ensure anonymous/non-staff users cannot write the build endpoint."""
         client = APIClient()
@@ -528,6 +548,25 @@ class APITests(TestCase):
         self.assertIn('features', resp.data)
         self.assertEqual(resp.data['features'], [feature.feature_id])
 
+    def test_version_build_context(self):
+        user = get(User, is_staff=True)
+        project = get(Project, main_language_project=None)
+        version = project.versions.get(slug='latest')
+        get(Version, project=project, slug='0.1', active=True)
+        get(Version, project=project, slug='0.2', active=False)
+        client = APIClient()
+
+        client.force_authenticate(user=user)
+        resp = client.get(
+            '/api/v2/version/{0}/build_context/'.format(version.pk))
+        self.assertEqual(resp.status_code, 200)
+        six.assertCountEqual(
+            self,
+            [data['slug'] for data in resp.data['versions']],
+            ['latest', '0.1'],
+        )
+        self.assertEqual(resp.data['downloads'], version.get_downloads())
+
     def test_project_pagination(self):
         for _ in range(100):
             get(Project)
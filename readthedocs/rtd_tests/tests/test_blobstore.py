@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from readthedocs.builds.blobstore import BlobStore
+
+
+class BlobStoreTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = BlobStore(os.path.join(self.root, 'blobs'))
+        self.versions = {}
+        for slug in ['latest', 'stable']:
+            path = os.path.join(self.root, 'rtd-builds', slug)
+            os.makedirs(os.path.join(path, '_static'))
+            for name, content in [('index.html', slug), ('_static/jquery.js', 'jquery')]:
+                with open(os.path.join(path, name), 'w') as fh:
+                    fh.write(content)
+            self.versions[slug] = path
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_dedup_static_files_across_versions(self):
+        self.assertEqual(self.store.dedup_tree(self.versions['latest']), 0)
+        self.assertEqual(self.store.dedup_tree(self.versions['stable']), 1)
+        latest = os.stat(os.path.join(self.versions['latest'], '_static/jquery.js'))
+        stable = os.stat(os.path.join(self.versions['stable'], '_static/jquery.js'))
+        self.assertEqual(latest.st_ino, stable.st_ino)
+        self.assertEqual(latest.st_nlink, 3)
+        # Files outside of the static directories are left alone
+        self.assertEqual(
+            os.stat(os.path.join(self.versions['latest'], 'index.html')).st_nlink, 1)
+        self.assertEqual(self.store.dedup_tree(self.versions['stable']), 0)
+
+    def test_collect_garbage(self):
+        self.store.dedup_tree(self.versions['latest'])
+        self.store.dedup_tree(self.versions['stable'])
+        shutil.rmtree(self.versions['latest'])
+        self.assertEqual(self.store.collect_garbage(), 0)
+        shutil.rmtree(self.versions['stable'])
+        self.assertEqual(self.store.collect_garbage(), 1)
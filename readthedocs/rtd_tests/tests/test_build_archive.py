@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+import tempfile
+import zipfile
+
+import mock
+from django.test import TestCase
+
+from readthedocs.doc_builder.archive import write_zip
+
+
+class WriteZipTests(TestCase):
+
+    files = {
+        'index.html': b'<html>' + b'index ' * 1000 + b'</html>',
+        'api/module.html': b'<html>' + b'module ' * 1000 + b'</html>',
+        '_images/logo.png': b'\x89PNG' + os.urandom(2048),
+        '_static/font.woff2': os.urandom(1024),
+        'caf\xe9.html': b'<html>caf\xc3\xa9</html>',
+        'empty.txt': b'',
+    }
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'localmedia')
+        self.zip_file = os.path.join(self.tmpdir, 'project.zip')
+        for name, content in self.files.items():
+            self.write_file(name, content)
+
+    def write_file(self, name, content):
+        full_path = os.path.join(self.path, name)
+        if not os.path.exists(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        with open(full_path, 'wb') as fh:
+            fh.write(content)
+
+    def assertArchive(self, files):
+        with zipfile.ZipFile(self.zip_file) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(
+                sorted(archive.namelist()),
+                sorted('project-latest/' + name for name in files),
+            )
+            for name, content in files.items():
+                self.assertEqual(
+                    archive.read('project-latest/' + name), content)
+            return dict(
+                (info.filename, info) for info in archive.infolist())
+
+    def test_write_zip(self):
+        reused = write_zip(
+            self.path, self.zip_file, prefix='project-latest', workers=2)
+        self.assertEqual(reused, 0)
+        infos = self.assertArchive(self.files)
+        self.assertEqual(
+            infos['project-latest/index.html'].compress_type,
+            zipfile.ZIP_DEFLATED,
+        )
+        self.assertEqual(
+            infos['project-latest/_images/logo.png'].compress_type,
+            zipfile.ZIP_STORED,
+        )
+        self.assertEqual(
+            infos['project-latest/_static/font.woff2'].compress_type,
+            zipfile.ZIP_STORED,
+        )
+
+    def test_reuse_unchanged_entries(self):
+        write_zip(self.path, self.zip_file, prefix='project-latest')
+        files = dict(self.files)
+        files['index.html'] = b'<html>changed</html>'
+        self.write_file('index.html', files['index.html'])
+        files['new.html'] = b'<html>new</html>'
+        self.write_file('new.html', files['new.html'])
+        os.remove(os.path.join(self.path, 'empty.txt'))
+        del files['empty.txt']
+
+        reused = write_zip(
+            self.path, self.zip_file, prefix='project-latest', workers=2)
+        self.assertEqual(reused, len(self.files) - 2)
+        self.assertArchive(files)
+
+    def test_invalid_previous_archive(self):
+        with open(self.zip_file, 'wb') as fh:
+            fh.write(b'not a zip file')
+        reused = write_zip(self.path, self.zip_file, prefix='project-latest')
+        self.assertEqual(reused, 0)
+        self.assertArchive(self.files)
+
+    @mock.patch('readthedocs.doc_builder.archive.zipfile.ZIP_FILECOUNT_LIMIT', 2)
+    def test_zip64(self):
+        write_zip(self.path, self.zip_file, prefix='project-latest')
+        self.assertArchive(self.files)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+import tempfile
+
+import mock
+from django.test import TestCase
+from django_dynamic_fixture import fixture, get
+
+from readthedocs.builds.constants import BUILD_STATE_FINISHED
+from readthedocs.doc_builder.config import load_yaml_config
+from readthedocs.doc_builder.environments import LocalBuildEnvironment
+from readthedocs.doc_builder.fingerprint import get_source_fingerprint
+from readthedocs.projects.models import Feature, Project
+from readthedocs.projects.tasks import UpdateDocsTaskStep
+
+
+class SourceFingerprintTests(TestCase):
+
+    def setUp(self):
+        self.checkout = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.checkout)
+        patcher = mock.patch(
+            'readthedocs.projects.models.Project.checkout_path',
+            return_value=self.checkout,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.project = get(
+            Project, slug='project-1', documentation_type='sphinx',
+            install_project=False, requirements_file=None, conf_py_file='',
+            versions=[fixture()])
+        self.version = self.project.versions.all()[0]
+        self.write('docs/conf.py', 'project = "project-1"')
+        self.write('docs/index.rst', 'Project\n=======')
+        self.write('requirements.txt', 'sphinx')
+        self.write('src/module.py', 'x = 1')
+
+    def write(self, path, content):
+        path = os.path.join(self.checkout, path)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fh:
+            fh.write(content)
+
+    def fingerprint(self):
+        build_env = LocalBuildEnvironment(
+            project=self.project, version=self.version, build={})
+        return get_source_fingerprint(
+            self.project, self.version, load_yaml_config(self.version),
+            build_env)
+
+    def test_fingerprint_is_stable(self):
+        self.assertEqual(self.fingerprint(), self.fingerprint())
+
+    def test_docs_changes(self):
+        fingerprint = self.fingerprint()
+        self.write('docs/index.rst', 'Project\n=======\n\nChanged')
+        self.assertNotEqual(self.fingerprint(), fingerprint)
+
+        fingerprint = self.fingerprint()
+        self.write('docs/new.rst', 'New page')
+        self.assertNotEqual(self.fingerprint(), fingerprint)
+
+    def test_requirements_changes(self):
+        fingerprint = self.fingerprint()
+        self.write('requirements.txt', 'sphinx==1.7.5')
+        self.assertNotEqual(self.fingerprint(), fingerprint)
+
+    def test_other_files_are_ignored(self):
+        fingerprint = self.fingerprint()
+        self.write('src/module.py', 'x = 2')
+        self.write('docs/_build/html/index.html', 'Output')
+        self.write('.git/HEAD', 'ref: refs/heads/master')
+        self.assertEqual(self.fingerprint(), fingerprint)
+
+    def test_installed_project_includes_checkout(self):
+        self.project.install_project = True
+        self.project.save()
+        fingerprint = self.fingerprint()
+        self.write('src/module.py', 'x = 2')
+        self.assertNotEqual(self.fingerprint(), fingerprint)
+
+    def test_options_change(self):
+        fingerprint = self.fingerprint()
+        self.project.language = 'es'
+        self.project.save()
+        self.assertNotEqual(self.fingerprint(), fingerprint)
+
+        fingerprint = self.fingerprint()
+        get(Feature, feature_id=Feature.SHARE_SPHINX_DOCTREE,
+            projects=[self.project])
+        self.assertNotEqual(self.fingerprint(), fingerprint)
+
+
+@mock.patch('readthedocs.projects.tasks.api_v2')
+@mock.patch('readthedocs.projects.tasks.get_source_fingerprint')
+class UpToDateBuildTests(TestCase):
+
+    def setUp(self):
+        self.project = get(Project, slug='project-1', versions=[fixture()])
+        self.version = self.project.versions.all()[0]
+        self.version.built = True
+        get(Feature, feature_id=Feature.SKIP_UNCHANGED_BUILDS,
+            projects=[self.project])
+        self.task = UpdateDocsTaskStep(
+            project=self.project, version=self.version, build={'id': 1},
+            config=mock.Mock())
+        self.task.setup_env = LocalBuildEnvironment(
+            project=self.project, version=self.version, build=self.task.build)
+
+    def test_up_to_date(self, get_source_fingerprint, api_v2):
+        get_source_fingerprint.return_value = 'a' * 40
+        api_v2.build.get.return_value = {
+            'results': [{'id': 1, 'fingerprint': 'a' * 40}],
+        }
+        self.assertTrue(self.task.is_up_to_date())
+        self.assertEqual(self.task.build['fingerprint'], 'a' * 40)
+        api_v2.build.get.assert_called_once_with(
+            version=self.version.pk,
+            state=BUILD_STATE_FINISHED,
+            success=True,
+            skipped=False,
+            limit=1,
+        )
+
+    def test_sources_changed(self, get_source_fingerprint, api_v2):
+        get_source_fingerprint.return_value = 'a' * 40
+        api_v2.build.get.return_value = {
+            'results': [{'id': 1, 'fingerprint': 'b' * 40}],
+        }
+        self.assertFalse(self.task.is_up_to_date())
+        # The fingerprint is stored for the next build
+        self.assertEqual(self.task.build['fingerprint'], 'a' * 40)
+
+        api_v2.build.get.return_value = {'results': []}
+        self.assertFalse(self.task.is_up_to_date())
+
+    def test_forced_build(self, get_source_fingerprint, api_v2):
+        get_source_fingerprint.return_value = 'a' * 40
+        self.task.build_force = True
+        self.assertFalse(self.task.is_up_to_date())
+        api_v2.build.get.assert_not_called()
+
+    def test_version_not_built(self, get_source_fingerprint, api_v2):
+        get_source_fingerprint.return_value = 'a' * 40
+        self.version.built = False
+        self.assertFalse(self.task.is_up_to_date())
+        api_v2.build.get.assert_not_called()
+
+    def test_without_feature(self, get_source_fingerprint, api_v2):
+        Feature.objects.all().delete()
+        self.assertFalse(self.task.is_up_to_date())
+        get_source_fingerprint.assert_not_called()
+
+    @mock.patch('readthedocs.projects.tasks.build_complete')
+    def test_finish_up_to_date_build(self, build_complete, get_source_fingerprint, api_v2):
+        with mock.patch.object(self.task.setup_env, 'update_build') as update_build:
+            self.task.finish_up_to_date_build()
+        update_build.assert_called_once_with(BUILD_STATE_FINISHED)
+        self.assertTrue(self.task.setup_env.update_on_success)
+        build_complete.send.assert_called_once()
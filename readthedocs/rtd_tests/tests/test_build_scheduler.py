@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import datetime
+
+import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import override_settings
+from django_dynamic_fixture import get
+from celery.backends.base import DisabledBackend
+from kombu import Connection
+
+from readthedocs.builds.constants import (
+    BUILD_PRIORITY_HIGH, BUILD_PRIORITY_LOW, BUILD_STATE_BUILDING,
+    BUILD_STATE_FINISHED, BUILD_STATE_TRIGGERED)
+from readthedocs.builds.models import Build, Version
+from readthedocs.builds.scheduler import BuildScheduler, get_queue_stats
+from readthedocs.core.utils import trigger_build
+from readthedocs.projects.models import Project
+from readthedocs.projects.tasks import finish_inactive_builds
+from readthedocs.worker import app
+
+
+@override_settings(
+    BUILD_SCHEDULER_ENABLED=True,
+    BUILD_PROJECT_CONCURRENCY=2,
+    BUILD_QUEUE_CONCURRENCY=None,
+)
+@mock.patch('readthedocs.builds.scheduler.update_docs_signature')
+class BuildSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.project = get(Project, build_queue=None, max_concurrent_builds=None)
+        self.other_project = get(
+            Project, build_queue=None, max_concurrent_builds=None)
+
+    def trigger(self, project, **kwargs):
+        version = get(Version, project=project)
+        trigger_build(project=project, version=version, **kwargs)
+        return Build.objects.filter(version=version).latest('pk')
+
+    def finish(self, build):
+        build.state = BUILD_STATE_FINISHED
+        build.save()
+
+    def dispatched_builds(self, update_docs):
+        return [
+            call[1]['build_pk']
+            for call in update_docs.call_args_list
+        ]
+
+    def test_project_limit(self, update_docs):
+        builds = [self.trigger(self.project) for __ in range(3)]
+        self.assertEqual(
+            self.dispatched_builds(update_docs),
+            [builds[0].pk, builds[1].pk],
+        )
+        held = Build.objects.get(pk=builds[2].pk)
+        self.assertEqual(held.state, BUILD_STATE_TRIGGERED)
+        self.assertIsNone(held.dispatched)
+
+        self.project.max_concurrent_builds = 3
+        self.project.save()
+        self.assertEqual(len(BuildScheduler().schedule()), 1)
+        self.assertIsNotNone(Build.objects.get(pk=builds[2].pk).dispatched)
+
+    def test_dispatch_after_build_ends(self, update_docs):
+        builds = [self.trigger(self.project) for __ in range(3)]
+        self.assertEqual(BuildScheduler().schedule(), [])
+        self.finish(builds[0])
+        self.assertEqual(
+            [build.pk for build in BuildScheduler().schedule()],
+            [builds[2].pk],
+        )
+
+    @override_settings(BUILD_QUEUE_CONCURRENCY=1)
+    def test_priority(self, update_docs):
+        running = self.trigger(self.project)
+        low = self.trigger(self.project, priority=BUILD_PRIORITY_LOW)
+        normal = self.trigger(self.other_project)
+        high = self.trigger(self.project, priority=BUILD_PRIORITY_HIGH)
+
+        self.assertEqual(self.dispatched_builds(update_docs), [running.pk])
+        for __ in range(3):
+            self.finish(Build.objects.get(
+                pk=self.dispatched_builds(update_docs)[-1]))
+            BuildScheduler().schedule()
+        self.assertEqual(
+            self.dispatched_builds(update_docs),
+            [running.pk, high.pk, normal.pk, low.pk],
+        )
+
+    @override_settings(BUILD_QUEUE_CONCURRENCY=2)
+    def test_fair_share(self, update_docs):
+        self.project.max_concurrent_builds = 10
+        self.project.save()
+        busy = [self.trigger(self.project) for __ in range(4)]
+        other = self.trigger(self.other_project)
+        self.assertEqual(
+            self.dispatched_builds(update_docs), [busy[0].pk, busy[1].pk])
+
+        # The project with no build running goes before the older builds
+        self.finish(busy[0])
+        BuildScheduler().schedule()
+        self.assertEqual(self.dispatched_builds(update_docs)[-1], other.pk)
+        self.finish(busy[1])
+        BuildScheduler().schedule()
+        self.assertEqual(self.dispatched_builds(update_docs)[-1], busy[2].pk)
+
+    def test_superseded_builds_are_not_dispatched(self, update_docs):
+        for __ in range(2):
+            get(Build, project=self.project, state=BUILD_STATE_BUILDING,
+                dispatched=datetime.datetime.now())
+        first = self.trigger(self.project)
+        trigger_build(project=self.project, version=first.version)
+        self.assertEqual(self.dispatched_builds(update_docs), [])
+
+        first.refresh_from_db()
+        self.assertEqual(first.state, BUILD_STATE_FINISHED)
+        self.assertEqual(
+            Build.objects.filter(
+                project=self.project, state=BUILD_STATE_TRIGGERED).count(),
+            1,
+        )
+
+    @override_settings(BUILD_DEBOUNCE_SECONDS=30)
+    @mock.patch('readthedocs.projects.tasks.schedule_builds')
+    def test_debounced_builds_are_held(self, schedule_builds, update_docs):
+        build = self.trigger(self.project)
+        user_build = self.trigger(
+            self.other_project, priority=BUILD_PRIORITY_HIGH)
+        self.assertEqual(self.dispatched_builds(update_docs), [user_build.pk])
+        schedule_builds.apply_async.assert_called_once_with(countdown=30)
+
+        Build.objects.filter(pk=build.pk).update(
+            date=datetime.datetime.now() - datetime.timedelta(seconds=31))
+        BuildScheduler().schedule()
+        self.assertEqual(
+            self.dispatched_builds(update_docs), [user_build.pk, build.pk])
+
+    def test_dispatch_once(self, update_docs):
+        build = get(Build, project=self.project, state=BUILD_STATE_TRIGGERED,
+                    dispatched=None)
+        scheduler = BuildScheduler()
+        self.assertTrue(scheduler.dispatch(build))
+        self.assertFalse(scheduler.dispatch(build))
+        self.assertEqual(self.dispatched_builds(update_docs), [build.pk])
+
+    def test_dispatch_error(self, update_docs):
+        update_docs().apply_async.side_effect = IOError
+        build = self.trigger(self.project)
+        build.refresh_from_db()
+        self.assertIsNone(build.dispatched)
+
+    def test_queue_stats(self, update_docs):
+        self.project.build_queue = 'build-large'
+        self.project.save()
+        builds = [self.trigger(self.project) for __ in range(3)]
+        self.trigger(self.other_project)
+        Build.objects.filter(pk=builds[0].pk).update(state=BUILD_STATE_BUILDING)
+
+        stats = get_queue_stats()
+        self.assertEqual([queue['queue'] for queue in stats], ['build-large', 'celery'])
+        self.assertEqual(stats[0]['held'], 1)
+        self.assertEqual(stats[0]['queued'], 1)
+        self.assertEqual(stats[0]['running'], 1)
+        self.assertIsNotNone(stats[0]['oldest_wait'])
+        self.assertIsNotNone(stats[0]['average_wait'])
+        self.assertEqual(stats[1]['queued'], 1)
+
+    def test_queue_admin_view(self, update_docs):
+        self.trigger(self.project)
+        get(User, username='admin', is_staff=True, is_superuser=True)
+        user = User.objects.get(username='admin')
+        user.set_password('admin')
+        user.save()
+        self.client.login(username='admin', password='admin')
+        response = self.client.get('/admin/builds/build/queue/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['queues'][0]['queued'], 1)
+
+    def test_finish_inactive_builds_skips_held_builds(self, update_docs):
+        date = datetime.datetime.now() - datetime.timedelta(days=1)
+        held = get(Build, project=self.project, state=BUILD_STATE_TRIGGERED,
+                   dispatched=None)
+        running = get(Build, project=self.project, state=BUILD_STATE_BUILDING,
+                      dispatched=date)
+        Build.objects.filter(pk__in=[held.pk, running.pk]).update(date=date)
+        finish_inactive_builds()
+        held.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(held.state, BUILD_STATE_TRIGGERED)
+        self.assertEqual(running.state, BUILD_STATE_FINISHED)
+
+
+@override_settings(BUILD_SCHEDULER_ENABLED=True, BUILD_PROJECT_CONCURRENCY=1)
+class BuildSchedulerBrokerTests(TestCase):
+
+    """Dispatch builds through an in-memory Celery broker."""
+
+    def setUp(self):
+        self.project = get(Project, build_queue=None, max_concurrent_builds=None)
+        self.versions = [get(Version, project=self.project) for __ in range(2)]
+
+        conf = {
+            'CELERY_ALWAYS_EAGER': False,
+            'BROKER_URL': 'memory://',
+        }
+        self.addCleanup(
+            app.conf.update, {key: app.conf[key] for key in conf})
+        app.conf.update(conf)
+        self.addCleanup(self.close_pool)
+        patcher = mock.patch.object(app, 'backend', DisabledBackend(app))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def close_pool(self):
+        app.pool.force_close_all()
+        app._pool = None
+
+    def get_messages(self, queue):
+        messages = []
+        with Connection('memory://') as connection:
+            with connection.SimpleQueue(queue) as simple_queue:
+                while simple_queue.qsize():
+                    message = simple_queue.get(block=False)
+                    messages.append(message.headers)
+                    message.ack()
+        return messages
+
+    def test_dispatch(self):
+        for version in self.versions:
+            trigger_build(project=self.project, version=version)
+
+        messages = self.get_messages('celery')
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(
+            messages[0]['task'], 'readthedocs.projects.tasks.update_docs')
+        build = Build.objects.get(dispatched__isnull=False)
+        self.assertIn(
+            "'build_pk': {0}".format(build.pk), messages[0]['kwargsrepr'])
+        self.assertEqual(Build.objects.filter(dispatched=None).count(), 1)
@@ -1,16 +1,25 @@
 from __future__ import absolute_import
 
+import os
+import shutil
+import tempfile
+import threading
+
 import mock
 import six
 
 from django.test import TestCase
+from django.test.utils import override_settings
 from django_dynamic_fixture import get
 from django_dynamic_fixture import fixture
 
 from readthedocs.projects.models import Project
 from readthedocs.doc_builder.config import load_yaml_config
-from readthedocs.doc_builder.environments import LocalBuildEnvironment
+from readthedocs.doc_builder.environments import (
+    DockerBuildEnvironment, LocalBuildEnvironment, parse_memory_limit)
 from readthedocs.doc_builder.python_environments import Virtualenv
+from readthedocs.doc_builder.resources import (
+    BuildResources, count_source_files, get_build_resources)
 from readthedocs.doc_builder.loader import get_builder_class
 from readthedocs.projects.tasks import UpdateDocsTaskStep
 from readthedocs.rtd_tests.tests.test_config_integration import create_load
@@ -177,7 +186,9 @@ class BuildEnvironmentTests(TestCase):
 
         with build_env:
             task.build_docs()
-        self.assertEqual(self.mocks.popen.call_count, 7)
+        # The first LaTeX pass didn't write an index or references, makeindex
+        # and the second pass are skipped
+        self.assertEqual(self.mocks.popen.call_count, 5)
         self.assertTrue(build_env.failed)
 
     @mock.patch('readthedocs.doc_builder.config.load_config')
@@ -221,5 +232,163 @@ class BuildEnvironmentTests(TestCase):
 
         with build_env:
             task.build_docs()
-        self.assertEqual(self.mocks.popen.call_count, 7)
+        # The first LaTeX pass didn't write an index or references, makeindex
+        # and the second pass are skipped
+        self.assertEqual(self.mocks.popen.call_count, 5)
         self.assertTrue(build_env.successful)
+
+
+class BuildFormatsTests(TestCase):
+
+    def setUp(self):
+        self.project = get(Project, slug='project-1', versions=[fixture()])
+        self.version = self.project.versions.all()[0]
+        self.build_env = LocalBuildEnvironment(
+            project=self.project, version=self.version, build={})
+        self.task = UpdateDocsTaskStep(
+            build_env=self.build_env, project=self.project,
+            version=self.version)
+
+    def test_parse_memory_limit(self):
+        self.assertEqual(parse_memory_limit('200m'), 200 * 1024 ** 2)
+        self.assertEqual(parse_memory_limit('1.5G'), 1536 * 1024 ** 2)
+        self.assertEqual(parse_memory_limit('2048'), 2048)
+        self.assertEqual(parse_memory_limit(4096), 4096)
+        self.assertIsNone(parse_memory_limit(None))
+
+    def test_format_workers_resources(self):
+        self.build_env.resources = BuildResources(cpus=4, parallelism=2)
+        self.assertEqual(self.task.get_format_workers(4), 2)
+        self.build_env.resources = BuildResources(cpus=4, parallelism=1)
+        self.assertEqual(self.task.get_format_workers(4), 4)
+        self.build_env.resources = BuildResources(cpus=2, parallelism=2)
+        self.assertEqual(self.task.get_format_workers(4), 1)
+
+    @override_settings(BUILD_FORMAT_WORKERS=8)
+    def test_format_workers(self):
+        self.assertEqual(self.task.get_format_workers(4), 4)
+        self.assertEqual(self.task.get_format_workers(2), 2)
+        with override_settings(BUILD_FORMAT_WORKERS=3):
+            self.assertEqual(self.task.get_format_workers(4), 3)
+
+    @override_settings(BUILD_FORMAT_WORKERS=8, BUILD_FORMAT_MEMORY='500m')
+    def test_format_workers_memory_limit(self):
+        self.task.build_env = mock.Mock(spec=DockerBuildEnvironment)
+        self.task.build_env.container_mem_limit = '1g'
+        self.assertEqual(self.task.get_format_workers(4), 2)
+        self.task.build_env.container_mem_limit = '200m'
+        self.assertEqual(self.task.get_format_workers(4), 1)
+
+    @override_settings(BUILD_FORMAT_WORKERS=2)
+    @mock.patch('readthedocs.projects.tasks.UpdateDocsTaskStep.sync_format')
+    def test_build_formats_concurrently(self, sync_format):
+        # Builds only succeed if both formats are running at the same time
+        running = []
+        both_running = threading.Event()
+
+        def build():
+            running.append(True)
+            if len(running) == 2:
+                both_running.set()
+            return both_running.wait(5)
+
+        timings = {}
+        outcomes = self.task.build_docs_formats(
+            [('pdf', build), ('epub', build)], timings=timings)
+        self.assertEqual(outcomes, {'pdf': True, 'epub': True})
+        self.assertEqual(set(timings), {'pdf', 'epub'})
+        six.assertCountEqual(
+            self, [c[0][0] for c in sync_format.call_args_list], ['pdf', 'epub'])
+
+    @mock.patch('readthedocs.projects.tasks.UpdateDocsTaskStep.sync_format')
+    def test_build_formats_errors(self, sync_format):
+        build_pdf = mock.Mock(side_effect=ValueError('pdf'))
+        build_epub = mock.Mock(return_value=False)
+        build_localmedia = mock.Mock(return_value=True)
+        build_search = mock.Mock(return_value=True)
+        timings = {}
+        with self.assertRaises(ValueError):
+            self.task.build_docs_formats(
+                [('pdf', build_pdf), ('epub', build_epub),
+                 ('localmedia', build_localmedia), ('search', build_search)],
+                timings=timings,
+            )
+        # The other formats were still built
+        build_epub.assert_called_once_with()
+        build_localmedia.assert_called_once_with()
+        build_search.assert_called_once_with()
+        self.assertEqual(
+            set(timings), {'pdf', 'epub', 'localmedia', 'search'})
+        # Search is synced with the rest of the build
+        sync_format.assert_called_once_with('localmedia')
+
+    @override_settings(ARTIFACT_BUNDLES=True)
+    @mock.patch('readthedocs.projects.tasks.UpdateDocsTaskStep.sync_format')
+    @mock.patch('readthedocs.projects.tasks.remove_bundle')
+    @mock.patch('readthedocs.projects.tasks.create_bundle')
+    @mock.patch('readthedocs.projects.tasks.get_builder_class')
+    def test_build_html_bundle_error(
+            self, get_builder_class, create_bundle, remove_bundle, sync_format):
+        builder = get_builder_class.return_value.return_value
+        builder.build.return_value = True
+        builder.target = '/tmp/html'
+        create_bundle.side_effect = IOError('No space left on device')
+        self.assertTrue(self.task.build_docs_html())
+        builder.move.assert_called_once_with()
+        # The files are synced without the bundle
+        remove_bundle.assert_called_once_with('/tmp/html')
+        sync_format.assert_called_once_with('html')
+
+
+class BuildResourcesTests(TestCase):
+
+    def setUp(self):
+        self.checkout = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.checkout)
+        self.project = get(Project, slug='project-1', versions=[fixture()])
+        self.version = self.project.versions.all()[0]
+        patcher = mock.patch(
+            'readthedocs.projects.models.Project.checkout_path',
+            return_value=self.checkout,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_files(self, path, count, suffix='.rst'):
+        path = os.path.join(self.checkout, path)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        for i in range(count):
+            open(os.path.join(path, 'file{0}{1}'.format(i, suffix)), 'w').close()
+
+    def test_count_source_files(self):
+        self.create_files('docs', 3)
+        self.create_files('docs/api', 2, suffix='.md')
+        self.create_files('docs/_static', 2, suffix='.css')
+        self.create_files('docs/_build/html', 5, suffix='.txt')
+        self.create_files('.git', 5, suffix='.txt')
+        self.assertEqual(count_source_files(self.checkout), 5)
+
+    def test_parallelism_is_bounded_by_cpus(self):
+        resources = BuildResources(cpus=2, parallelism=8)
+        self.assertEqual(resources.parallelism, 2)
+        self.assertEqual(resources.cpu_shares, 2048)
+        resources = BuildResources(cpus=0, parallelism=0)
+        self.assertEqual((resources.cpus, resources.parallelism), (1, 1))
+
+    @override_settings(BUILD_CPU_LIMIT=4, BUILD_FILES_PER_CPU=10)
+    @mock.patch('readthedocs.doc_builder.resources.get_available_cpus')
+    def test_get_build_resources(self, get_available_cpus):
+        get_available_cpus.return_value = 8
+        self.create_files('docs', 5)
+        resources = get_build_resources(self.project, self.version)
+        self.assertEqual((resources.cpus, resources.parallelism), (4, 1))
+
+        self.create_files('docs/api', 25)
+        resources = get_build_resources(self.project, self.version)
+        self.assertEqual((resources.cpus, resources.parallelism), (4, 3))
+
+        # A busy builder assigns fewer CPUs
+        get_available_cpus.return_value = 2
+        resources = get_build_resources(self.project, self.version)
+        self.assertEqual((resources.cpus, resources.parallelism), (2, 2))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+
+import mock
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from readthedocs.builds.bundles import (
+    BundleError, create_bundle, extract_bundle, get_bundle_path)
+from readthedocs.builds.syncers import RemoteSyncer
+from readthedocs.projects.tasks import remove_bundle, sync_bundle
+
+
+class BundleTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'html')
+        self.target = os.path.join(self.root, 'rtd-builds', 'latest')
+        self.files = {
+            'index.html': 'index',
+            'api/module.html': 'module',
+            '_static/jquery.js': 'jquery',
+            '_static/copy-of-jquery.js': 'jquery',
+            '_static/css/theme.css': 'theme',
+        }
+        for name, content in self.files.items():
+            path = os.path.join(self.source, name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as fh:
+                fh.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def assertTargetFiles(self):
+        found = {}
+        for root, __, files in os.walk(self.target):
+            for name in files:
+                path = os.path.join(root, name)
+                with open(path) as fh:
+                    found[os.path.relpath(path, self.target)] = fh.read()
+        self.assertEqual(found, self.files)
+
+    def test_round_trip(self):
+        bundle_file = create_bundle(self.source)
+        self.assertEqual(bundle_file, get_bundle_path(self.source))
+        self.assertEqual(bundle_file, self.source + '.tar.gz')
+        extract_bundle(bundle_file, self.target)
+        self.assertTargetFiles()
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(self.target))), ['latest'])
+
+        # Extracting again replaces the previous tree
+        os.remove(os.path.join(self.source, 'api/module.html'))
+        del self.files['api/module.html']
+        extract_bundle(create_bundle(self.source), self.target)
+        self.assertTargetFiles()
+
+    def test_static_files_are_deduplicated(self):
+        bundle_file = create_bundle(self.source)
+        with tarfile.open(bundle_file) as tar:
+            names = tar.getnames()
+        self.assertEqual(names[0], 'index.json')
+        self.assertEqual(
+            len([name for name in names if name.startswith('objects/')]), 2)
+        self.assertEqual(
+            sorted(name for name in names if name.startswith('files/')),
+            ['files/api/module.html', 'files/index.html'],
+        )
+
+        extract_bundle(bundle_file, self.target)
+        self.assertEqual(
+            os.stat(os.path.join(self.target, '_static/jquery.js')).st_ino,
+            os.stat(os.path.join(self.target, '_static/copy-of-jquery.js')).st_ino,
+        )
+
+    def test_checksum_mismatch_keeps_previous_tree(self):
+        extract_bundle(create_bundle(self.source), self.target)
+        bundle_file = os.path.join(self.root, 'bad.tar.gz')
+        index = {
+            'format': 1,
+            'files': {'index.html': {'size': 3, 'sha1': '0' * 40, 'object': False}},
+        }
+        with tarfile.open(bundle_file, 'w:gz') as tar:
+            for name, data in [('index.json', json.dumps(index)), ('files/index.html', 'bad')]:
+                data = data.encode('utf-8')
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        with self.assertRaises(BundleError):
+            extract_bundle(bundle_file, self.target)
+        self.assertTargetFiles()
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(self.target))), ['latest'])
+
+    def test_paths_outside_the_bundle_are_rejected(self):
+        bundle_file = os.path.join(self.root, 'bad.tar.gz')
+        index = {
+            'format': 1,
+            'files': {'../escape.html': {'size': 3, 'sha1': '0' * 40, 'object': False}},
+        }
+        with tarfile.open(bundle_file, 'w:gz') as tar:
+            data = json.dumps(index).encode('utf-8')
+            info = tarfile.TarInfo('index.json')
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        with self.assertRaises(BundleError):
+            extract_bundle(bundle_file, self.target)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'escape.html')))
+
+    def test_sync_bundle_removes_the_fetched_copy(self):
+        bundle_file = create_bundle(self.source)
+        results = sync_bundle(self.source, self.target, 'build01')
+        self.assertEqual(results, [])
+        self.assertTargetFiles()
+        # Only the bundle of the build server is left
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            ['html', 'html.tar.gz', 'rtd-builds'],
+        )
+
+        remove_bundle(self.source)
+        self.assertFalse(os.path.exists(bundle_file))
+
+    def test_sync_bundle_without_bundle_copies_the_tree(self):
+        results = sync_bundle(self.source, self.target, 'build01')
+        self.assertEqual(results, [])
+        self.assertTargetFiles()
+        self.assertEqual(
+            sorted(os.listdir(self.root)), ['html', 'rtd-builds'])
+
+    @override_settings(FILE_SYNCER='readthedocs.builds.syncers.RemoteSyncer')
+    def test_sync_bundle_with_pushing_syncer_copies_the_tree(self):
+        create_bundle(self.source)
+        with mock.patch.object(RemoteSyncer, 'copy', return_value=[]) as copy:
+            sync_bundle(self.source, self.target, 'build01')
+        copy.assert_called_once_with(self.source, self.target, host='build01')
@@ -69,6 +69,40 @@ class TestCeleryBuilding(RTDTestCase):
         self.assertTrue(result.successful())
         self.assertFalse(exists(directory))
 
+    @patch('readthedocs.projects.tasks.update_static_metadata', new=MagicMock)
+    @patch('readthedocs.projects.tasks.symlink_project', new=MagicMock)
+    @patch('readthedocs.projects.tasks.move_files', new=MagicMock)
+    def test_sync_files_updates_artifacts(self):
+        version = self.project.versions.all()[0]
+        path = self.project.get_production_media_path(
+            type_='epub', version_slug=version.slug)
+        os.makedirs(os.path.dirname(path))
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'wb') as fh:
+            fh.write(b'epub')
+
+        tasks.sync_files(self.project.pk, version.pk, epub=True)
+        version.refresh_from_db()
+        self.assertEqual(list(version.artifacts), ['epub'])
+        self.assertEqual(version.artifacts['epub']['size'], 4)
+
+        os.remove(path)
+        tasks.sync_files(self.project.pk, version.pk, epub=False)
+        version.refresh_from_db()
+        self.assertEqual(version.artifacts, {})
+
+    @patch('readthedocs.projects.tasks.update_static_metadata', new=MagicMock)
+    @patch('readthedocs.projects.tasks.symlink_project', new=MagicMock)
+    @patch('readthedocs.projects.tasks.move_files')
+    def test_sync_files_skips_synced_formats(self, move_files):
+        version = self.project.versions.all()[0]
+        tasks.sync_files(
+            self.project.pk, version.pk, 'builder', html=True, search=True,
+            pdf=True, epub=True, synced_formats=['html', 'pdf'])
+        move_files.assert_called_once_with(
+            version.pk, 'builder', html=True, localmedia=False, search=True,
+            pdf=False, epub=True)
+
     @patch('readthedocs.projects.tasks.UpdateDocsTaskStep.setup_python_environment', new=MagicMock)
     @patch('readthedocs.projects.tasks.UpdateDocsTaskStep.build_docs', new=MagicMock)
     @patch('readthedocs.projects.tasks.UpdateDocsTaskStep.setup_vcs', new=MagicMock)
@@ -120,6 +154,26 @@ class TestCeleryBuilding(RTDTestCase):
                 intersphinx=False)
         self.assertTrue(result.successful())
 
+    @patch('readthedocs.projects.tasks.UpdateDocsTaskStep.run_setup')
+    def test_update_docs_superseded_build(self, run_setup):
+        build = get(Build, project=self.project,
+                    version=self.project.versions.first())
+        with mock_api(self.repo) as mapi:
+            mapi.build = MagicMock(**{
+                'return_value.get.return_value': {
+                    'id': build.pk,
+                    'state': 'finished',
+                },
+            })
+            update_docs = tasks.UpdateDocsTask()
+            result = update_docs.delay(
+                self.project.pk,
+                build_pk=build.pk,
+                intersphinx=False)
+        self.assertTrue(result.successful())
+        self.assertTrue(result.result)
+        run_setup.assert_not_called()
+
     def test_sync_repository(self):
         version = self.project.versions.get(slug=LATEST)
         with mock_api(self.repo):
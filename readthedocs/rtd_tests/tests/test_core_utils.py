@@ -5,9 +5,13 @@ import mock
 
 from django_dynamic_fixture import get
 from django.test import TestCase
+from django.test.utils import override_settings
 
 from readthedocs.projects.models import Project
-from readthedocs.builds.models import Version
+from readthedocs.builds.constants import (
+    BUILD_PRIORITY_HIGH, BUILD_PRIORITY_LOW, BUILD_STATE_BUILDING,
+    BUILD_STATE_FINISHED, BUILD_STATE_TRIGGERED)
+from readthedocs.builds.models import Build, Version
 from readthedocs.core.utils import trigger_build, slugify
 
 
@@ -73,6 +77,67 @@ class CoreUtilTests(TestCase):
         ])
         update_docs().si().apply_async.assert_called()
 
+    @mock.patch('readthedocs.projects.tasks.UpdateDocsTask')
+    def test_trigger_build_supersedes_pending_builds(self, update_docs):
+        other_version = get(Version, project=self.project)
+        pending = get(
+            Build, project=self.project, version=self.version,
+            state=BUILD_STATE_TRIGGERED)
+        building = get(
+            Build, project=self.project, version=self.version,
+            state=BUILD_STATE_BUILDING)
+        other = get(
+            Build, project=self.project, version=other_version,
+            state=BUILD_STATE_TRIGGERED)
+
+        with override_settings(BUILD_DEBOUNCE_SECONDS=30):
+            trigger_build(project=self.project, version=self.version)
+
+        build = Build.objects.filter(version=self.version).latest('pk')
+        self.assertEqual(build.state, BUILD_STATE_TRIGGERED)
+        pending.refresh_from_db()
+        self.assertEqual(pending.state, BUILD_STATE_FINISHED)
+        self.assertTrue(pending.skipped)
+        self.assertEqual(
+            pending.output,
+            'Skipped, superseded by build #{0}'.format(build.pk))
+        building.refresh_from_db()
+        self.assertEqual(building.state, BUILD_STATE_BUILDING)
+        other.refresh_from_db()
+        self.assertEqual(other.state, BUILD_STATE_TRIGGERED)
+        update_docs().si().set.assert_called_once_with(countdown=30)
+        update_docs().si().apply_async.assert_called()
+
+    @mock.patch('readthedocs.projects.tasks.UpdateDocsTask')
+    def test_trigger_build_keeps_superseded_options(self, update_docs):
+        get(Build, project=self.project, version=self.version,
+            state=BUILD_STATE_TRIGGERED, force=True,
+            priority=BUILD_PRIORITY_HIGH)
+        trigger_build(project=self.project, version=self.version,
+                      priority=BUILD_PRIORITY_LOW)
+
+        build = Build.objects.filter(version=self.version).latest('pk')
+        self.assertTrue(build.force)
+        self.assertEqual(build.priority, BUILD_PRIORITY_HIGH)
+        self.assertEqual(update_docs().si.call_args[1]['force'], True)
+
+    @mock.patch('readthedocs.projects.tasks.UpdateDocsTask')
+    def test_trigger_build_without_pending_builds(self, update_docs):
+        get(Build, project=self.project, version=self.version,
+            state=BUILD_STATE_FINISHED)
+        with override_settings(BUILD_DEBOUNCE_SECONDS=30):
+            trigger_build(project=self.project, version=self.version)
+        # The first build of a burst waits for the next triggers too
+        update_docs().si().set.assert_called_once_with(countdown=30)
+        update_docs().si().apply_async.assert_called()
+
+    @mock.patch('readthedocs.projects.tasks.UpdateDocsTask')
+    def test_trigger_build_by_user_is_not_delayed(self, update_docs):
+        with override_settings(BUILD_DEBOUNCE_SECONDS=30):
+            trigger_build(project=self.project, version=self.version,
+                          priority=BUILD_PRIORITY_HIGH)
+        update_docs().si().set.assert_not_called()
+        update_docs().si().apply_async.assert_called()
 
     def test_slugify(self):
         """Test additional slugify"""
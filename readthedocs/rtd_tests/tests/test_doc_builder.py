@@ -2,11 +2,14 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
+import gzip
 import os
+import shutil
 import tempfile
 from collections import namedtuple
 
 import pytest
+import six
 import yaml
 import mock
 from django.test import TestCase
@@ -16,9 +19,20 @@ from mock import patch
 
 from readthedocs.builds.models import Version
 from readthedocs.doc_builder.backends.mkdocs import BaseMkdocs, MkdocsHTML
-from readthedocs.doc_builder.backends.sphinx import BaseSphinx, SearchBuilder
+from readthedocs.doc_builder.base import move_tree
+from readthedocs.doc_builder.compression import precompress_tree
+from readthedocs.doc_builder.backends.sphinx import (
+    BaseSphinx, HtmlBuilder, PdfBuilder, SearchBuilder)
+from readthedocs.doc_builder.context import BuildContext
+from readthedocs.doc_builder.environments import LocalBuildEnvironment
+from readthedocs.doc_builder.exceptions import (
+    BuildEnvironmentError, BuildEnvironmentWarning)
+from readthedocs.doc_builder.resources import BuildResources
+from readthedocs.doc_builder.constants import (
+    SPHINX_DOCTREE_FINGERPRINT, SPHINX_SHARED_DOCTREE_DIR)
 from readthedocs.projects.exceptions import ProjectConfigurationError
-from readthedocs.projects.models import Project
+from readthedocs.projects.models import Feature, Project
+from readthedocs.restapi.serializers import VersionSerializer
 
 
 class SphinxBuilderTest(TestCase):
@@ -77,6 +91,73 @@ class SphinxBuilderTest(TestCase):
             self.assertEqual(gf.read(), ef.read())
 
 
+class SphinxParallelBuildTest(TestCase):
+
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.project = Project.objects.get(slug='pip')
+        self.version = self.project.versions.first()
+        self.build_env = LocalBuildEnvironment(
+            project=self.project, version=self.version, build={},
+            resources=BuildResources(cpus=4, parallelism=4),
+        )
+        self.builder = SearchBuilder(
+            build_env=self.build_env, python_env=mock.Mock())
+        self.build_command = ['python', 'sphinx-build', '-b', 'json', '.']
+
+    def add_command(self, *args, **kwargs):
+        cmd = mock.Mock(command=args, successful=True)
+        self.build_env.commands.append(cmd)
+        return cmd
+
+    @patch('readthedocs.doc_builder.environments.BuildEnvironment.run')
+    def test_parallel_build(self, run):
+        run.side_effect = self.add_command
+        self.builder.run_sphinx_build(self.build_command, cwd='/tmp')
+        run.assert_called_once_with(
+            'python', 'sphinx-build', '-j', '4', '-b', 'json', '.', cwd='/tmp')
+
+    @patch('readthedocs.doc_builder.environments.BuildEnvironment.run')
+    def test_serial_build(self, run):
+        self.build_env.resources = BuildResources(cpus=4, parallelism=1)
+        self.builder.run_sphinx_build(self.build_command, cwd='/tmp')
+        run.assert_called_once_with(
+            'python', 'sphinx-build', '-b', 'json', '.', cwd='/tmp')
+
+    @patch('readthedocs.doc_builder.environments.BuildEnvironment.run')
+    def test_parallel_failure_falls_back_to_serial(self, run):
+        def run_command(*args, **kwargs):
+            self.add_command(*args)
+            if '-j' in args:
+                self.build_env.commands[-1].successful = False
+                raise BuildEnvironmentWarning(
+                    'Command failed:\nSphinx parallel build error:\n'
+                    "PicklingError: Can't pickle <function <lambda>>")
+            return self.build_env.commands[-1]
+
+        run.side_effect = run_command
+        cmd_ret = self.builder.run_sphinx_build(self.build_command, cwd='/tmp')
+        self.assertTrue(cmd_ret.successful)
+        self.assertEqual(run.call_count, 2)
+        self.assertEqual(
+            run.call_args[0], ('python', 'sphinx-build', '-b', 'json', '.'))
+        # The failed parallel attempt doesn't fail the build
+        self.assertEqual(
+            [cmd.command for cmd in self.build_env.commands],
+            [('python', 'sphinx-build', '-b', 'json', '.')],
+        )
+
+    @patch('readthedocs.doc_builder.environments.BuildEnvironment.run')
+    def test_other_failures_are_raised(self, run):
+        run.side_effect = BuildEnvironmentWarning(
+            'Command failed:\nWARNING: toctree contains reference to '
+            'nonexisting document')
+        with self.assertRaises(BuildEnvironmentWarning):
+            self.builder.run_sphinx_build(self.build_command, cwd='/tmp')
+        run.assert_called_once()
+
+
 class SphinxSearchBuilderTest(TestCase):
 
     fixtures = ['test_data']
@@ -116,6 +197,407 @@ class SphinxSearchBuilderTest(TestCase):
         self.assertTrue(os.path.exists(dest_other))
 
 
+class MoveTreeTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.source = os.path.join(self.tmpdir, '_build', 'html')
+        self.target = os.path.join(self.tmpdir, 'artifacts', 'latest', 'sphinx')
+        for path in ('index.html', '_static/style.css', 'api/module.html'):
+            full_path = os.path.join(self.source, path)
+            if not os.path.exists(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            with open(full_path, 'w') as fh:
+                fh.write(path)
+        os.makedirs(self.target)
+        with open(os.path.join(self.target, 'old.html'), 'w') as fh:
+            fh.write('old')
+
+    def test_rename(self):
+        inode = os.stat(os.path.join(self.source, 'index.html')).st_ino
+        move_tree(self.source, self.target, ignore_patterns=['_static'])
+        self.assertFalse(os.path.exists(self.source))
+        self.assertEqual(
+            os.stat(os.path.join(self.target, 'index.html')).st_ino, inode)
+        self.assertTrue(os.path.exists(os.path.join(self.target, 'api', 'module.html')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, '_static')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'old.html')))
+
+    @patch('readthedocs.doc_builder.base.os.rename')
+    def test_link_when_rename_fails(self, rename):
+        rename.side_effect = OSError(18, 'Invalid cross-device link')
+        move_tree(self.source, self.target, ignore_patterns=['_static'])
+        self.assertTrue(os.path.exists(os.path.join(self.source, 'index.html')))
+        for path in ('index.html', 'api/module.html'):
+            self.assertEqual(
+                os.stat(os.path.join(self.target, path)).st_ino,
+                os.stat(os.path.join(self.source, path)).st_ino,
+            )
+        self.assertFalse(os.path.exists(os.path.join(self.target, '_static')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'old.html')))
+
+    @patch('readthedocs.doc_builder.base.os.link')
+    @patch('readthedocs.doc_builder.base.os.rename')
+    def test_copy_when_link_fails(self, rename, link):
+        rename.side_effect = link.side_effect = OSError(18, 'Invalid cross-device link')
+        move_tree(self.source, self.target)
+        with open(os.path.join(self.target, '_static', 'style.css')) as fh:
+            self.assertEqual(fh.read(), '_static/style.css')
+        self.assertNotEqual(
+            os.stat(os.path.join(self.target, 'index.html')).st_ino,
+            os.stat(os.path.join(self.source, 'index.html')).st_ino,
+        )
+
+
+class PrecompressTreeTest(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.source = os.path.join(self.tmpdir, '_build', 'html')
+        self.target = os.path.join(self.tmpdir, 'artifacts', 'latest', 'sphinx')
+        self.files = {
+            'index.html': 'index ' * 500,
+            'searchindex.js': 'search ' * 500,
+            'small.html': 'small',
+            '_images/logo.png': 'png ' * 500,
+        }
+        self.write_files(self.source, self.files)
+
+    def write_files(self, root, files):
+        for path, content in files.items():
+            full_path = os.path.join(root, path)
+            if not os.path.exists(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            with open(full_path, 'w') as fh:
+                fh.write(content)
+
+    @patch('readthedocs.doc_builder.compression.brotli', None)
+    def test_precompress(self):
+        self.assertEqual(precompress_tree(self.source), (2, 0))
+        for path in ('index.html', 'searchindex.js'):
+            with gzip.open(os.path.join(self.source, path + '.gz')) as fh:
+                self.assertEqual(fh.read().decode(), self.files[path])
+        self.assertFalse(os.path.exists(os.path.join(self.source, 'small.html.gz')))
+        self.assertFalse(
+            os.path.exists(os.path.join(self.source, '_images', 'logo.png.gz')))
+
+    @patch('readthedocs.doc_builder.compression.brotli', None)
+    def test_reuse_previous_output(self):
+        self.write_files(self.target, self.files)
+        self.write_files(self.target, {'searchindex.js': 'changed ' * 500})
+        precompress_tree(self.target)
+        inode = os.stat(os.path.join(self.target, 'index.html.gz')).st_ino
+
+        self.assertEqual(
+            precompress_tree(self.source, previous_path=self.target), (1, 1))
+        self.assertEqual(
+            os.stat(os.path.join(self.source, 'index.html.gz')).st_ino, inode)
+        with gzip.open(os.path.join(self.source, 'searchindex.js.gz')) as fh:
+            self.assertEqual(fh.read().decode(), self.files['searchindex.js'])
+
+    @patch('readthedocs.doc_builder.compression.brotli')
+    def test_brotli(self, brotli):
+        brotli.compress.return_value = b'brotli'
+        with override_settings(PRECOMPRESS_BROTLI_QUALITY=4):
+            precompress_tree(self.source, workers=2)
+        with open(os.path.join(self.source, 'index.html.br'), 'rb') as fh:
+            self.assertEqual(fh.read(), b'brotli')
+        self.assertTrue(os.path.exists(os.path.join(self.source, 'index.html.gz')))
+        brotli.compress.assert_called_with(mock.ANY, quality=4)
+
+    @patch('readthedocs.doc_builder.base.precompress_tree')
+    def test_move_html(self, precompress_tree):
+        project = get(Project, main_language_project=None)
+        build_env = mock.Mock(project=project, version=project.versions.first())
+        for builder_class, precompress in [(HtmlBuilder, True), (PdfBuilder, False)]:
+            precompress_tree.reset_mock()
+            builder = builder_class(build_env, python_env=None)
+            builder.old_artifact_path = self.source
+            builder.target = self.target
+            with patch('readthedocs.doc_builder.base.move_tree'):
+                builder.move()
+            self.assertEqual(precompress_tree.called, precompress)
+
+        # Files are compressed with the parallelism of the build
+        build_env.resources = BuildResources(cpus=4, parallelism=3)
+        builder = HtmlBuilder(build_env, python_env=None)
+        builder.old_artifact_path = self.source
+        builder.target = self.target
+        with patch('readthedocs.doc_builder.base.move_tree'):
+            builder.move()
+        self.assertEqual(precompress_tree.call_args[1]['workers'], 3)
+
+
+class BuildContextTest(TestCase):
+
+    def setUp(self):
+        self.project = get(
+            Project, repo='https://github.com/pypa/pip', main_language_project=None)
+        self.version = self.project.versions.get(slug='latest')
+        self.other_version = get(
+            Version, project=self.project, slug='1.0', active=True)
+
+        self.build_env = namedtuple('project', 'version')
+        self.build_env.project = self.project
+        self.build_env.version = self.version
+
+    @patch('readthedocs.projects.models.Project.vcs_repo')
+    @patch('readthedocs.doc_builder.context.api')
+    def test_fetch(self, api, vcs_repo):
+        api.version().build_context.get.return_value = {
+            'versions': [
+                VersionSerializer(version).data
+                for version in (self.other_version, self.version)
+            ],
+            'downloads': {'pdf': 'https://example.com/pip.pdf'},
+        }
+        api.reset_mock()
+        context = BuildContext.fetch(self.project, self.version, commit='a1b2c3')
+
+        api.version.assert_called_once_with(self.version.pk)
+        self.assertEqual(api.version().build_context.get.call_count, 1)
+        vcs_repo.assert_not_called()
+        self.assertEqual(context.commit, 'a1b2c3')
+        self.assertEqual(
+            [version.slug for version in context.versions], ['latest', '1.0'])
+        self.assertEqual(
+            context.downloads, {'pdf': 'https://example.com/pip.pdf'})
+        self.assertEqual(context.github_user, 'pypa')
+        self.assertEqual(context.github_repo, 'pip')
+        self.assertIsNone(context.gitlab_user)
+
+    @override_settings(DONT_HIT_API=True)
+    @patch('readthedocs.projects.models.Project.vcs_repo')
+    @patch('readthedocs.doc_builder.context.api')
+    def test_fetch_without_api(self, api, vcs_repo):
+        vcs_repo().commit = 'a1b2c3'
+        context = BuildContext.fetch(self.project, self.version)
+        api.version.assert_not_called()
+        self.assertEqual(context.commit, 'a1b2c3')
+        self.assertEqual(context.downloads, {})
+
+    @patch('readthedocs.builds.models.Version.get_conf_py_path')
+    @patch('readthedocs.doc_builder.context.api')
+    def test_builders_share_context(self, api, get_conf_py_path):
+        get_conf_py_path.return_value = 'docs'
+        context = BuildContext(
+            self.project, self.version, commit='a1b2c3',
+            versions=[self.version], downloads={'PDF': 'pip.pdf'})
+        BaseSphinx.type = 'base'
+        BaseSphinx.sphinx_build_dir = tempfile.mkdtemp()
+        for builder_class in (HtmlBuilder, PdfBuilder):
+            builder = builder_class(
+                build_env=self.build_env, python_env=None, context=context)
+            params = builder.get_config_params()
+            self.assertEqual(params['commit'], 'a1b2c3')
+            self.assertEqual(params['versions'], [self.version])
+            self.assertEqual(params['downloads'], {'PDF': 'pip.pdf'})
+            self.assertEqual(params['github_user'], 'pypa')
+            self.assertTrue(params['display_github'])
+        api.version.assert_not_called()
+
+
+class SphinxSharedDoctreeTest(TestCase):
+
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.project = Project.objects.get(slug='pip')
+        self.version = self.project.versions.first()
+        feature = get(Feature, feature_id=Feature.SHARE_SPHINX_DOCTREE)
+        feature.projects.add(self.project)
+
+        self.conf_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.conf_dir)
+        self.conf_file = os.path.join(self.conf_dir, 'conf.py')
+        with open(self.conf_file, 'w') as fh:
+            fh.write('project = "pip"\n')
+        for name, value in (
+                ('conf_dir', self.conf_dir), ('conf_file', self.conf_file)):
+            patcher = patch(
+                'readthedocs.projects.models.Project.{0}'.format(name),
+                return_value=value,
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.build_env = namedtuple('project', 'version')
+        self.build_env.project = self.project
+        self.build_env.version = self.version
+
+    def get_builder(self, cls):
+        builder = cls(build_env=self.build_env, python_env=mock.Mock())
+        builder.run = mock.Mock()
+        builder.run.return_value.successful = True
+        return builder
+
+    def get_doctree_arg(self, builder):
+        args = builder.run.call_args_list[0][0]
+        return args[list(args).index('-d') + 1]
+
+    def build_html(self):
+        builder = self.get_builder(HtmlBuilder)
+        os.makedirs(os.path.join(self.conf_dir, SPHINX_SHARED_DOCTREE_DIR))
+        with open(os.path.join(
+                self.conf_dir, SPHINX_SHARED_DOCTREE_DIR, 'index.doctree'), 'w') as fh:
+            fh.write('doctree')
+        builder.build()
+        return builder
+
+    def test_html_writes_shared_doctree(self):
+        builder = self.build_html()
+        self.assertEqual(self.get_doctree_arg(builder), SPHINX_SHARED_DOCTREE_DIR)
+        fingerprint_path = os.path.join(
+            self.conf_dir, SPHINX_SHARED_DOCTREE_DIR, SPHINX_DOCTREE_FINGERPRINT)
+        with open(fingerprint_path) as fh:
+            self.assertEqual(fh.read(), builder.get_doctree_fingerprint())
+
+    def test_failed_html_build_invalidates_shared_doctree(self):
+        self.build_html()
+        builder = self.get_builder(HtmlBuilder)
+        builder.run.return_value.successful = False
+        builder.build()
+        self.assertFalse(os.path.exists(os.path.join(
+            self.conf_dir, SPHINX_SHARED_DOCTREE_DIR, SPHINX_DOCTREE_FINGERPRINT)))
+
+    def test_formats_start_from_shared_doctree(self):
+        self.build_html()
+        builder = self.get_builder(SearchBuilder)
+        builder.build()
+        self.assertEqual(self.get_doctree_arg(builder), '_build/doctrees-json')
+        self.assertTrue(os.path.exists(os.path.join(
+            self.conf_dir, '_build/doctrees-json', 'index.doctree')))
+
+        builder = self.get_builder(PdfBuilder)
+        with self.assertRaises(BuildEnvironmentError):
+            # There are no TeX files to convert
+            builder.build()
+        self.assertEqual(self.get_doctree_arg(builder), '_build/doctrees')
+        self.assertTrue(os.path.exists(os.path.join(
+            self.conf_dir, '_build/doctrees', 'index.doctree')))
+
+    def test_shared_doctree_not_used_when_config_changes(self):
+        self.build_html()
+        with open(self.conf_file, 'a') as fh:
+            fh.write('extensions = ["sphinx.ext.autodoc"]\n')
+        builder = self.get_builder(SearchBuilder)
+        builder.build()
+        self.assertEqual(self.get_doctree_arg(builder), '_build/doctrees-json')
+        self.assertFalse(os.path.exists(
+            os.path.join(self.conf_dir, '_build/doctrees-json')))
+
+    def test_shared_doctree_not_used_when_forced(self):
+        self.build_html()
+        builder = self.get_builder(SearchBuilder)
+        builder.force()
+        builder.build()
+        self.assertFalse(os.path.exists(
+            os.path.join(self.conf_dir, '_build/doctrees-json')))
+
+    def test_without_feature(self):
+        Feature.objects.all().delete()
+        builder = self.get_builder(HtmlBuilder)
+        builder.build()
+        self.assertEqual(self.get_doctree_arg(builder), '_build/doctrees-readthedocs')
+        self.assertFalse(os.path.exists(
+            os.path.join(self.conf_dir, SPHINX_SHARED_DOCTREE_DIR)))
+
+
+class PdfBuilderTest(TestCase):
+
+    fixtures = ['test_data']
+
+    def setUp(self):
+        self.project = Project.objects.get(slug='pip')
+        self.version = self.project.versions.first()
+        self.conf_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.conf_dir)
+        self.latex_dir = os.path.join(self.conf_dir, '_build', 'latex')
+        patcher = patch(
+            'readthedocs.projects.models.Project.conf_dir',
+            return_value=self.conf_dir,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.build_env = LocalBuildEnvironment(
+            project=self.project, version=self.version, build={},
+            resources=BuildResources(cpus=2, parallelism=2),
+        )
+        self.builder = PdfBuilder(
+            build_env=self.build_env, python_env=mock.Mock())
+        self.builder.run_sphinx_build = mock.Mock(
+            side_effect=self.write_tex_files)
+        self.build_env.run_command_class = mock.Mock(
+            side_effect=self.run_command)
+        self.commands = []
+
+    def write_tex_files(self, *args, **kwargs):
+        os.makedirs(self.latex_dir)
+        for name in ('manual', 'simple'):
+            open(os.path.join(self.latex_dir, name + '.tex'), 'w').close()
+
+    def write(self, name, content):
+        with open(os.path.join(self.latex_dir, name), 'w') as fh:
+            fh.write(content)
+
+    def run_command(self, cls, cmd, **kwargs):
+        """Write the files pdflatex and makeindex would write."""
+        self.commands.append(cmd)
+        base = os.path.splitext(os.path.basename(cmd[-1]))[0]
+        if cmd[0] == 'makeindex':
+            self.write(base + '.ind', 'index')
+        elif base == 'manual':
+            self.write('manual.aux', '\\relax\n\\newlabel{intro}{{1}{1}}\n')
+            self.write('manual.toc', 'toc')
+            self.write('manual.idx', 'idx')
+        else:
+            self.write('simple.aux', '\\relax\n')
+        return mock.Mock(
+            successful=True,
+            output='Output written on {0}.pdf'.format(base),
+        )
+
+    def test_build(self):
+        self.assertTrue(self.builder.build())
+        manual = os.path.join(self.latex_dir, 'manual.tex')
+        simple = os.path.join(self.latex_dir, 'simple.tex')
+        six.assertCountEqual(self, self.commands, [
+            ['pdflatex', '-interaction=nonstopmode', manual],
+            ['makeindex', '-s', 'python.ist', 'manual.idx'],
+            ['pdflatex', '-interaction=nonstopmode', manual],
+            # No index nor references, a single pass is enough
+            ['pdflatex', '-interaction=nonstopmode', simple],
+        ])
+        # Each document runs its steps in order
+        self.assertEqual(
+            [cmd[0] for cmd in self.commands if cmd[-1] in (manual, 'manual.idx')],
+            ['pdflatex', 'makeindex', 'pdflatex'],
+        )
+        self.assertEqual(set(self.builder.timings), {'manual', 'simple'})
+
+    def test_build_rerun_requested(self):
+        def run_command(cls, cmd, **kwargs):
+            self.commands.append(cmd)
+            return mock.Mock(
+                successful=True,
+                output='LaTeX Warning: Label(s) may have changed. '
+                'Rerun to get cross-references right.',
+            )
+
+        self.build_env.run_command_class.side_effect = run_command
+        self.builder.build()
+        self.assertEqual(len(self.commands), 4)
+
+    def test_build_failure(self):
+        self.build_env.run_command_class.side_effect = None
+        self.build_env.run_command_class.return_value = mock.Mock(
+            successful=False, output='')
+        self.assertFalse(self.builder.build())
+
+
 @override_settings(PRODUCTION_DOMAIN='readthedocs.org')
 class MkdocsBuilderTest(TestCase):
 
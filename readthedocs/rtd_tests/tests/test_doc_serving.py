@@ -1,13 +1,23 @@
 from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+
 import mock
+import six
 import django_dynamic_fixture as fixture
 
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.test.utils import override_settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
 from django.http import Http404
 from django.conf import settings
 
+from readthedocs.core.media import serve
+from readthedocs.core.serve_cache import (
+    clear_project_served_files, clear_served_files, served_files)
 from readthedocs.rtd_tests.base import RequestFactoryTestMixin
 from readthedocs.projects import constants
 from readthedocs.projects.models import Project
@@ -98,3 +108,234 @@ class TestPublicDocs(BaseDocServing):
             _serve_symlink_docs(request, project=self.private, filename='/en/latest/usage.html', privacy_level='public')
         self.assertTrue('private_web_root' not in str(exc.exception))
         self.assertTrue('public_web_root' in str(exc.exception))
+
+
+@override_settings(
+    SERVE_DOCS=[constants.PRIVATE, constants.PUBLIC], PYTHON_MEDIA=False,
+    SERVE_FILE_CACHE_SIZE=100, SERVE_PERMISSION_CACHE_TIMEOUT=60,
+)
+class TestServeCache(BaseDocServing):
+
+    def setUp(self):
+        super(TestServeCache, self).setUp()
+        cache.clear()
+        served_files.clear()
+
+    def patch_exists(self):
+        """Docs files exist, other paths are checked."""
+        exists = os.path.exists
+        return mock.patch(
+            'readthedocs.core.views.serve.os.path.exists',
+            side_effect=lambda path: '_web_root' in path or exists(path),
+        )
+
+    def test_cached_file(self):
+        with self.patch_exists() as exists:
+            r = self.client.get(self.public_url)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(
+                r['X-Accel-Redirect'], '/public_web_root/public/en/latest/usage.html')
+            exists.reset_mock()
+
+            # Only the project is fetched, by the middleware and the view
+            with self.assertNumQueries(2):
+                r = self.client.get(self.public_url)
+            self.assertEqual(
+                r['X-Accel-Redirect'], '/public_web_root/public/en/latest/usage.html')
+            exists.assert_not_called()
+
+            clear_served_files(self.public.versions.get(slug='latest'))
+            r = self.client.get(self.public_url)
+            self.assertEqual(r.status_code, 200)
+            exists.assert_any_call(
+                settings.SITE_ROOT + '/public_web_root/public/en/latest/usage.html')
+
+    def test_cached_file_invalidation(self):
+        with self.patch_exists() as exists:
+            self.client.get(self.public_url)
+
+            # Symlinks of the project were updated
+            exists.reset_mock()
+            clear_project_served_files(self.public)
+            r = self.client.get(self.public_url)
+            self.assertEqual(r.status_code, 200)
+            exists.assert_any_call(
+                settings.SITE_ROOT + '/public_web_root/public/en/latest/usage.html')
+
+            # Entries expire after the max age
+            exists.reset_mock()
+            with mock.patch('readthedocs.core.serve_cache.time.time') as now:
+                now.return_value = 1e10
+                r = self.client.get(self.public_url)
+            self.assertEqual(r.status_code, 200)
+            exists.assert_any_call(
+                settings.SITE_ROOT + '/public_web_root/public/en/latest/usage.html')
+
+    @mock.patch('readthedocs.projects.tasks.PrivateSymlink')
+    @mock.patch('readthedocs.projects.tasks.PublicSymlink')
+    def test_symlink_project_clears_files(self, public_symlink, private_symlink):
+        from readthedocs.projects.tasks import symlink_project
+        with self.patch_exists() as exists:
+            self.client.get(self.public_url)
+            exists.reset_mock()
+            symlink_project(self.public.pk)
+            self.client.get(self.public_url)
+            exists.assert_any_call(
+                settings.SITE_ROOT + '/public_web_root/public/en/latest/usage.html')
+
+    def test_file_not_cached_when_missing(self):
+        r = self.client.get(self.public_url)
+        self.assertEqual(r.status_code, 404)
+        with self.patch_exists():
+            r = self.client.get(self.public_url)
+        self.assertEqual(r.status_code, 200)
+
+    def test_cached_permissions(self):
+        version = self.private.versions.get(slug='latest')
+        version.privacy_level = constants.PRIVATE
+        version.save()
+        with self.patch_exists():
+            r = self.client.get(self.private_url)
+            self.assertEqual(r.status_code, 401)
+            self.client.login(username='eric', password='eric')
+            r = self.client.get(self.private_url)
+            self.assertEqual(r.status_code, 200)
+
+            # Permissions are kept until they time out
+            self.private.users.remove(self.eric)
+            r = self.client.get(self.private_url)
+            self.assertEqual(r.status_code, 200)
+            cache.clear()
+            r = self.client.get(self.private_url)
+            self.assertEqual(r.status_code, 401)
+
+
+class TestPythonMediaServing(RequestFactoryTestMixin, TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.content = b''.join(
+            six.int2byte(i % 256) for i in range(200 * 1024))
+        with open(os.path.join(self.root, 'file.pdf'), 'wb') as fd:
+            fd.write(self.content)
+
+    def serve(self, **headers):
+        request = self.request('/file.pdf', **headers)
+        return serve(request, 'file.pdf', self.root)
+
+    def test_serve_file(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_not_found(self):
+        with self.assertRaises(Http404):
+            serve(self.request('/'), 'missing.pdf', self.root)
+        with self.assertRaises(SuspiciousFileOperation):
+            serve(self.request('/'), '../file.pdf', self.root + '/foo')
+        with self.assertRaises(Http404):
+            serve(self.request('/'), '', self.root)
+
+    def test_conditional(self):
+        etag = self.serve()['ETag']
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.serve(HTTP_IF_NONE_MATCH='"foo"').status_code, 200)
+        last_modified = self.serve()['Last-Modified']
+        self.assertEqual(
+            self.serve(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_range(self):
+        for header, first, last in [
+                ('bytes=0-99', 0, 99),
+                ('bytes=100000-', 100000, len(self.content) - 1),
+                ('bytes=-10', len(self.content) - 10, len(self.content) - 1),
+                ('bytes=10-999999999', 10, len(self.content) - 1)]:
+            response = self.serve(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(
+                b''.join(response.streaming_content),
+                self.content[first:last + 1])
+            self.assertEqual(response['Content-Length'], str(last - first + 1))
+            self.assertEqual(
+                response['Content-Range'],
+                'bytes {0}-{1}/{2}'.format(first, last, len(self.content)))
+
+    def test_invalid_range(self):
+        response = self.serve(HTTP_RANGE='bytes=999999999-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(
+            response['Content-Range'], 'bytes */{0}'.format(len(self.content)))
+
+        # Unsupported ranges serve the whole file
+        for header in ['bytes=0-1,5-9', 'bytes=10-5', 'items=0-5']:
+            response = self.serve(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200)
+
+    def test_if_range(self):
+        etag = self.serve()['ETag']
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"foo"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_precompressed(self):
+        for name, content in [
+                ('page.html', b'page'), ('page.html.gz', b'gzip'),
+                ('page.html.br', b'brotli'), ('other.html', b'other'),
+                ('other.html.gz', b'gzip')]:
+            with open(os.path.join(self.root, name), 'wb') as fd:
+                fd.write(content)
+
+        for accept_encoding, content, encoding in [
+                ('gzip, deflate, br', b'brotli', 'br'),
+                ('gzip;q=1.0, br;q=0', b'gzip', 'gzip'),
+                ('identity', b'page', None),
+                ('', b'page', None)]:
+            request = self.request(
+                '/page.html', HTTP_ACCEPT_ENCODING=accept_encoding)
+            response = serve(request, 'page.html', self.root)
+            self.assertEqual(b''.join(response.streaming_content), content)
+            self.assertEqual(response.get('Content-Encoding'), encoding)
+            self.assertEqual(response['Content-Type'], 'text/html')
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        request = self.request('/other.html', HTTP_ACCEPT_ENCODING='br')
+        response = serve(request, 'other.html', self.root)
+        self.assertEqual(b''.join(response.streaming_content), b'other')
+
+        # Variants don't share ETags
+        request = self.request('/page.html', HTTP_ACCEPT_ENCODING='gzip')
+        etag = serve(request, 'page.html', self.root)['ETag']
+        request = self.request(
+            '/page.html', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            serve(request, 'page.html', self.root).status_code, 304)
+        request = self.request('/page.html', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(
+            serve(request, 'page.html', self.root).status_code, 200)
+
+    @override_settings(PYTHON_MEDIA=True, DEFAULT_PRIVACY_LEVEL='private')
+    def test_download_media(self):
+        project = fixture.get(Project, slug='pip', main_language_project=None)
+        version = project.versions.get(slug='latest')
+        version.artifacts = {'pdf': {'sha1': 'abc123'}}
+        version.save()
+        with override_settings(PRODUCTION_MEDIA_ARTIFACTS=self.root):
+            path = project.get_production_media_path(
+                type_='pdf', version_slug='latest')
+            os.makedirs(os.path.dirname(path))
+            shutil.copy(os.path.join(self.root, 'file.pdf'), path)
+            response = self.client.get(
+                '/projects/pip/downloads/pdf/latest/',
+                HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            b''.join(response.streaming_content), self.content[:10])
+        self.assertEqual(response['ETag'], '"abc123"')
+        self.assertEqual(
+            response['Content-Disposition'], 'filename=pip-latest.pdf')
@@ -48,3 +48,15 @@ class ImportedFileTests(TestCase):
         self.assertNotEqual(ImportedFile.objects.get(name='test.html').md5, 'c7532f22a052d716f7b2310fb52ad981')
 
         self.assertEqual(ImportedFile.objects.count(), 3)
+
+    def test_precompressed_files_skipped(self):
+        test_dir = os.path.join(base_dir, 'files')
+        gzip_path = os.path.join(test_dir, 'test.html.gz')
+        with open(gzip_path, 'wb') as f:
+            f.write(b'gzip')
+        self.addCleanup(os.remove, gzip_path)
+
+        _manage_imported_files(self.version, test_dir, 'commit01')
+        self.assertEqual(ImportedFile.objects.count(), 3)
+        self.assertFalse(
+            ImportedFile.objects.filter(name='test.html.gz').exists())
@@ -93,8 +93,8 @@ class MiddlewareTests(TestCase):
         with self.assertRaises(Http404):
             self.middleware.process_request(request)
 
+    @patch.object(cache, 'get', lambda x: 'my_slug')
     def test_proper_cname(self):
-        cache.get = lambda x: 'my_slug'
         request = self.factory.get(self.url, HTTP_HOST='my.valid.homename')
         self.middleware.process_request(request)
         self.assertEqual(request.urlconf, self.urlconf_subdomain)
@@ -110,8 +110,8 @@ class MiddlewareTests(TestCase):
         self.assertEqual(request.slug, 'pip')
 
     @override_settings(PRODUCTION_DOMAIN='readthedocs.org')
+    @patch.object(cache, 'get', lambda x: x.split('.')[0])
     def test_proper_cname_uppercase(self):
-        cache.get = lambda x: x.split('.')[0]
         request = self.factory.get(self.url, HTTP_HOST='PIP.RANDOM.COM')
         self.middleware.process_request(request)
         self.assertEqual(request.urlconf, self.urlconf_subdomain)
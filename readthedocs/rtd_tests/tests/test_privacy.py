@@ -5,10 +5,13 @@ import mock
 
 from django.test import TestCase
 from django.test.utils import override_settings
-from django.contrib.auth.models import User
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from guardian.shortcuts import assign_perm, get_perms
 
 from readthedocs.builds.constants import LATEST
 from readthedocs.builds.models import Version, Build
+from readthedocs.core.visibility import get_visibility
 from readthedocs.projects.models import Project
 from readthedocs.projects.forms import UpdateProjectForm
 from readthedocs.projects import tasks
@@ -376,3 +379,153 @@ class PrivacyTests(TestCase):
             kong.versions.private().get(slug='latest').slug,
             'latest'
         )
+
+
+class OwnerPermissionTests(TestCase):
+
+    def setUp(self):
+        self.eric = User.objects.create(username='eric')
+        self.tester = User.objects.create(username='tester')
+        self.project = Project.objects.create(
+            name='kong', slug='kong', privacy_level='private')
+        self.version = Version.objects.create(
+            project=self.project, identifier='1.0', verbose_name='1.0',
+            slug='1.0', privacy_level='private', active=True)
+
+    def test_permissions_granted_on_owner_change(self):
+        self.assertNotIn('view_project', get_perms(self.eric, self.project))
+        self.project.users.add(self.eric)
+        self.assertIn('view_project', get_perms(self.eric, self.project))
+        for version in self.project.versions.all():
+            self.assertIn('view_version', get_perms(self.eric, version))
+
+        self.project.users.remove(self.eric)
+        self.assertNotIn('view_project', get_perms(self.eric, self.project))
+        self.assertNotIn('view_version', get_perms(self.eric, self.version))
+
+    def test_permissions_granted_from_user_side(self):
+        self.eric.projects.add(self.project)
+        self.assertIn('view_project', get_perms(self.eric, self.project))
+        self.eric.projects.clear()
+        self.assertNotIn('view_project', get_perms(self.eric, self.project))
+
+    def test_permissions_granted_on_new_version(self):
+        self.project.users.add(self.eric)
+        version = Version.objects.create(
+            project=self.project, identifier='2.0', verbose_name='2.0',
+            slug='2.0', privacy_level='private')
+        self.assertIn('view_version', get_perms(self.eric, version))
+
+    def test_saves_dont_assign_permissions(self):
+        self.project.users.add(self.eric)
+        with mock.patch(
+                'readthedocs.projects.ownership.assign_bulk') as assign_bulk:
+            self.project.save()
+            self.version.save()
+        assign_bulk.assert_not_called()
+
+    def test_querysets_use_owners(self):
+        self.project.users.add(self.eric, self.tester)
+        public = Project.objects.create(
+            name='public', slug='public', privacy_level='public')
+        public.users.add(self.eric, self.tester)
+
+        self.assertEqual(
+            set(Project.objects.public(self.eric)),
+            {self.project, public},
+        )
+        self.assertEqual(list(Project.objects.public(User.objects.create(
+            username='other'))), [public])
+        versions = Version.objects.public(self.eric)
+        self.assertNotIn('DISTINCT', str(versions.query))
+        self.assertEqual(
+            sorted(versions.values_list('slug', flat=True)),
+            ['1.0', 'latest', 'latest'],
+        )
+        self.assertNotIn(
+            self.version, Version.objects.public(User.objects.get(
+                username='other')))
+        self.assertEqual(
+            list(Build.objects.public(self.eric)),
+            [],
+        )
+        build = Build.objects.create(project=self.project, version=self.version)
+        self.assertEqual(list(Build.objects.public(self.eric)), [build])
+
+
+class VisibilityTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.eric = User.objects.create(username='eric')
+        self.project = Project.objects.create(
+            name='kong', slug='kong', privacy_level='private')
+        self.project.users.add(self.eric)
+        self.eric = User.objects.get(pk=self.eric.pk)
+
+    def test_visibility_computed_once_per_request(self):
+        latest = self.project.versions.get(slug=LATEST)
+        self.assertEqual(
+            list(Project.objects.public(self.eric)), [self.project])
+        # Only the queries of the listings
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                list(Project.objects.public(self.eric)), [self.project])
+            self.assertEqual(list(Version.objects.public(self.eric)), [latest])
+
+    @override_settings(VISIBILITY_CACHE_TIMEOUT=60)
+    def test_visibility_cached_between_requests(self):
+        self.assertEqual(get_visibility(self.eric).project_pks,
+                         {self.project.pk})
+        eric = User.objects.get(pk=self.eric.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_visibility(eric).project_pks,
+                             {self.project.pk})
+
+    @override_settings(VISIBILITY_CACHE_TIMEOUT=60)
+    def test_visibility_cleared_on_owner_change(self):
+        self.assertEqual(
+            list(Project.objects.public(self.eric)), [self.project])
+        self.project.users.remove(self.eric)
+        self.assertEqual(list(Project.objects.public(self.eric)), [])
+        eric = User.objects.get(pk=self.eric.pk)
+        self.assertEqual(list(Project.objects.public(eric)), [])
+
+        other = Project.objects.create(
+            name='other', slug='other', privacy_level='private')
+        self.eric.projects.add(other)
+        self.assertEqual(list(Project.objects.public(self.eric)), [other])
+
+    def test_superuser_sees_everything(self):
+        admin = User.objects.create(username='admin', is_superuser=True)
+        other = Project.objects.create(
+            name='other', slug='other', privacy_level='private')
+        self.assertEqual(get_visibility(admin).project_pks, frozenset())
+        self.assertEqual(
+            set(Project.objects.private(admin)), {self.project, other})
+
+    def test_owned_versions_not_in_granted_versions(self):
+        other = Project.objects.create(
+            name='other', slug='other', privacy_level='private')
+        version = other.versions.get(slug=LATEST)
+        assign_perm('view_version', self.eric, version)
+        self.assertTrue(self.project.versions.exists())
+        visibility = get_visibility(self.eric)
+        self.assertEqual(visibility.member_project_pks, {self.project.pk})
+        self.assertEqual(visibility.version_pks, {version.pk})
+
+    def test_object_permissions_grant_access(self):
+        other = User.objects.create(username='other')
+        version = self.project.versions.get(slug=LATEST)
+        version.privacy_level = 'private'
+        version.save()
+        self.assertEqual(list(Version.objects.public(other)), [])
+
+        assign_perm('view_version', other, version)
+        self.assertEqual(list(Version.objects.public(other)), [version])
+        self.assertEqual(list(Project.objects.public(other)), [])
+
+        group = Group.objects.create(name='readers')
+        group.user_set.add(other)
+        assign_perm('view_project', group, self.project)
+        self.assertEqual(list(Project.objects.public(other)), [self.project])
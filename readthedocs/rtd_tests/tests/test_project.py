@@ -3,11 +3,16 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals)
 
 import datetime
+import hashlib
 import json
+import os
+import shutil
+import tempfile
 
 from django.contrib.auth.models import User
 from django.forms.models import model_to_dict
 from django.test import TestCase
+from django.test.utils import override_settings
 from django_dynamic_fixture import get
 from mock import patch
 from rest_framework.reverse import reverse
@@ -51,6 +56,18 @@ class TestProject(ProjectMixin, TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertEqual(resp['token'], None)
 
+    def test_latest_build_ignores_skipped_builds(self):
+        self.pip.builds.all().delete()
+        now = datetime.datetime.now()
+        built = get(Build, project=self.pip, type='html',
+                    state=BUILD_STATE_FINISHED, success=False,
+                    date=now - datetime.timedelta(minutes=1))
+        skipped = get(Build, project=self.pip, type='html',
+                      state=BUILD_STATE_FINISHED, success=True, skipped=True)
+        Build.objects.filter(pk=skipped.pk).update(date=now)
+        self.assertEqual(self.pip.get_latest_build(), built)
+        self.assertFalse(self.pip.has_good_build)
+
     def test_has_pdf(self):
         # The project has a pdf if the PDF file exists on disk.
         with fake_paths_by_regex('\.pdf$'):
@@ -81,6 +98,32 @@ class TestProject(ProjectMixin, TestCase):
         with fake_paths_by_regex('\.epub$'):
             self.assertFalse(self.pip.has_epub(LATEST))
 
+    def test_downloads_from_artifacts(self):
+        version = self.pip.versions.first()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            path = self.pip.get_production_media_path(
+                type_='pdf', version_slug=version.slug)
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as fh:
+                fh.write(b'pdf')
+            artifacts = version.update_artifacts()
+        self.assertEqual(list(artifacts), ['pdf'])
+        self.assertEqual(artifacts['pdf']['size'], 3)
+        self.assertEqual(
+            artifacts['pdf']['sha1'], hashlib.sha1(b'pdf').hexdigest())
+
+        # The manifest is used instead of the files on disk
+        version = self.pip.versions.get(pk=version.pk)
+        with fake_paths_by_regex(r'\.(pdf|epub|zip)$', exists=False):
+            self.assertEqual(list(version.get_downloads()), ['pdf'])
+        with fake_paths_by_regex(r'\.(pdf|epub|zip)$'):
+            self.assertEqual(
+                list(version.get_downloads(pretty=True)), ['PDF'])
+            version.project.enable_pdf_build = False
+            self.assertEqual(version.get_downloads(), {})
+
     @patch('readthedocs.projects.models.Project.find')
     def test_conf_file_found(self, find_method):
         find_method.return_value = [
@@ -1,10 +1,12 @@
 from __future__ import absolute_import
+import os
 from datetime import datetime, timedelta
 
 from mock import patch
 from django.test import TestCase
 from django.contrib.auth.models import User
-from django.contrib.staticfiles.templatetags.staticfiles import static
+from django.conf import settings
+from django.core.cache import cache
 from django.contrib.messages import constants as message_const
 from django.core.urlresolvers import reverse
 from django.http.response import HttpResponseRedirect
@@ -15,6 +17,7 @@ from django_dynamic_fixture import new
 import six
 
 from readthedocs.builds.models import Build, Version
+from readthedocs.builds.constants import BUILD_STATE_FINISHED, BUILD_STATE_TRIGGERED
 from readthedocs.rtd_tests.base import (WizardTestCase, MockBuildTestCase,
                                         RequestFactoryTestMixin)
 from readthedocs.oauth.models import RemoteRepository
@@ -425,10 +428,15 @@ class TestBadges(TestCase):
     """Test a static badge asset is served for each build."""
 
     # To set `flat` as default style as done in code.
-    def get_badge_path(self, version, style='flat'):
-        return static(self.BADGE_PATH % (version, style))
+    def get_badge(self, version, style='flat'):
+        path = os.path.join(
+            settings.SITE_ROOT, 'readthedocs', 'projects', 'static',
+            self.BADGE_PATH % (version, style))
+        with open(path, 'rb') as fd:
+            return fd.read()
 
     def setUp(self):
+        cache.clear()
         self.BADGE_PATH = 'projects/badges/%s-%s.svg'
         self.project = get(Project, slug='badgey')
         self.version = Version.objects.get(project=self.project)
@@ -436,32 +444,92 @@ class TestBadges(TestCase):
 
     def test_unknown_badge(self):
         res = self.client.get(self.badge_url, {'version': self.version.slug})
-        static_badge = self.get_badge_path('unknown')
-        self.assertEquals(res.url, static_badge)
+        self.assertEqual(res.content, self.get_badge('unknown'))
+        self.assertEqual(res['Content-Type'], 'image/svg+xml')
 
     def test_passing_badge(self):
         get(Build, project=self.project, version=self.version, success=True)
         res = self.client.get(self.badge_url, {'version': self.version.slug})
-        static_badge = self.get_badge_path('passing')
-        self.assertEquals(res.url, static_badge)
+        self.assertEqual(res.content, self.get_badge('passing'))
 
     def test_failing_badge(self):
         get(Build, project=self.project, version=self.version, success=False)
         res = self.client.get(self.badge_url, {'version': self.version.slug})
-        static_badge = self.get_badge_path('failing')
-        self.assertEquals(res.url, static_badge)
+        self.assertEqual(res.content, self.get_badge('failing'))
+
+    def test_skipped_build_badge(self):
+        get(Build, project=self.project, version=self.version, success=False)
+        get(Build, project=self.project, version=self.version, success=True,
+            skipped=True)
+        res = self.client.get(self.badge_url, {'version': self.version.slug})
+        self.assertEqual(res.content, self.get_badge('failing'))
 
     def test_plastic_failing_badge(self):
         get(Build, project=self.project, version=self.version, success=False)
         res = self.client.get(self.badge_url, {'version': self.version.slug, 'style': 'plastic'})
-        static_badge = self.get_badge_path('failing', 'plastic')
-        self.assertEquals(res.url, static_badge)
+        self.assertEqual(res.content, self.get_badge('failing', 'plastic'))
 
     def test_social_passing_badge(self):
         get(Build, project=self.project, version=self.version, success=True)
         res = self.client.get(self.badge_url, {'version': self.version.slug , 'style': 'social'})
-        static_badge = self.get_badge_path('passing', 'social')
-        self.assertEquals(res.url, static_badge)
+        self.assertEqual(res.content, self.get_badge('passing', 'social'))
+
+    def test_cached_badge(self):
+        get(Build, project=self.project, version=self.version, success=True)
+        self.client.get(self.badge_url, {'version': self.version.slug})
+        with self.assertNumQueries(0):
+            res = self.client.get(
+                self.badge_url, {'version': self.version.slug})
+        self.assertEqual(res.content, self.get_badge('passing'))
+        self.assertEqual(res['ETag'], '"passing-flat"')
+        self.assertIn('public', res['Cache-Control'])
+        self.assertIn('max-age=60', res['Cache-Control'])
+
+        res = self.client.get(
+            self.badge_url, {'version': self.version.slug},
+            HTTP_IF_NONE_MATCH='"passing-flat"')
+        self.assertEqual(res.status_code, 304)
+
+        # A new build clears the state once it's finished
+        build = get(Build, project=self.project, version=self.version,
+                    state=BUILD_STATE_TRIGGERED, success=False)
+        res = self.client.get(
+            self.badge_url, {'version': self.version.slug},
+            HTTP_IF_NONE_MATCH='"passing-flat"')
+        self.assertEqual(res.status_code, 304)
+        build.state = BUILD_STATE_FINISHED
+        build.save()
+        res = self.client.get(
+            self.badge_url, {'version': self.version.slug},
+            HTTP_IF_NONE_MATCH='"passing-flat"')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, self.get_badge('failing'))
+
+    def test_inactive_build_clears_badge(self):
+        build = get(Build, project=self.project, version=self.version,
+                    state=BUILD_STATE_TRIGGERED, success=True,
+                    date=datetime.now() - timedelta(days=1), dispatched=None)
+        self.client.get(self.badge_url, {'version': self.version.slug})
+        tasks.finish_inactive_builds()
+        build.refresh_from_db()
+        self.assertEqual(build.state, BUILD_STATE_FINISHED)
+        res = self.client.get(self.badge_url, {'version': self.version.slug})
+        self.assertEqual(res.content, self.get_badge('failing'))
+
+    def test_private_version_badge(self):
+        get(Build, project=self.project, version=self.version, success=True)
+        self.version.privacy_level = 'private'
+        self.version.save()
+        res = self.client.get(self.badge_url, {'version': self.version.slug})
+        self.assertEqual(res.content, self.get_badge('unknown'))
+
+        user = get(User, is_superuser=True)
+        user.set_password('test')
+        user.save()
+        self.client.login(username=user.username, password='test')
+        res = self.client.get(self.badge_url, {'version': self.version.slug})
+        self.assertEqual(res.content, self.get_badge('passing'))
+        self.assertIn('private', res['Cache-Control'])
 
 
 class TestTags(TestCase):
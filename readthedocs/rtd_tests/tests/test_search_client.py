@@ -0,0 +1,62 @@
+from __future__ import absolute_import
+
+import mock
+from celery.signals import worker_process_shutdown
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from readthedocs.search import client
+from readthedocs.search.indexes import PageIndex, ProjectIndex, SectionIndex
+
+
+@override_settings(ES_HOSTS=['127.0.0.1:9200'])
+class TestSearchClient(TestCase):
+
+    def setUp(self):
+        client.clear_clients()
+
+    def tearDown(self):
+        client.clear_clients()
+
+    def test_indexes_share_client(self):
+        es = ProjectIndex().es
+        self.assertIs(PageIndex().es, es)
+        self.assertIs(SectionIndex().es, es)
+        self.assertIsNot(client.get_client(['127.0.0.2:9200']), es)
+
+    @override_settings(
+        ES_TIMEOUT=3, ES_MAX_RETRIES=1, ES_RETRY_ON_TIMEOUT=True,
+        ES_MAX_CONNECTIONS=4)
+    def test_client_settings(self):
+        es = client.get_client()
+        self.assertEqual(es.transport.max_retries, 1)
+        self.assertTrue(es.transport.retry_on_timeout)
+        connection, = es.transport.connection_pool.connections
+        self.assertEqual(connection.timeout, 3)
+        self.assertEqual(connection.pool.pool.maxsize, 4)
+
+    def test_new_client_after_fork(self):
+        es = client.get_client()
+        with mock.patch('os.getpid', return_value=-1):
+            self.assertIsNot(client.get_client(), es)
+            self.assertEqual(len(client.get_client_stats()), 1)
+        self.assertEqual(client.get_client_stats(), [])
+
+    def test_client_stats(self):
+        es = client.get_client()
+        connection, = es.transport.connection_pool.connections
+        connection.pool.num_connections = 2
+        connection.pool.num_requests = 10
+        self.assertEqual(client.get_client_stats(), [{
+            'host': 'http://127.0.0.1:9200',
+            'connections': 2,
+            'requests': 10,
+            'reused': 8,
+        }])
+
+    @mock.patch('readthedocs.search.client.log')
+    def test_stats_logged_on_worker_shutdown(self, log):
+        client.get_client()
+        worker_process_shutdown.send(sender=None, pid=1, exitcode=0)
+        log.info.assert_called_once_with(
+            mock.ANY, 'http://127.0.0.1:9200', 0, 0, 0, mock.ANY)
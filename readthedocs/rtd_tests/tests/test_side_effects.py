@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import mock
+from django.test import TestCase
+from django_dynamic_fixture import get
+
+from readthedocs.builds.models import Version
+from readthedocs.core.utils.side_effects import (
+    collect_side_effects, run_side_effect)
+from readthedocs.projects.models import Project
+from readthedocs.projects.tasks import symlink_project
+
+
+@mock.patch('readthedocs.core.utils.side_effects.transaction.on_commit')
+@mock.patch('readthedocs.projects.models.Project.sync_supported_versions')
+@mock.patch('readthedocs.builds.models.broadcast')
+class SideEffectsTests(TestCase):
+
+    def setUp(self):
+        self.project = get(Project, main_language_project=None)
+
+    def create_version(self, project):
+        return Version.objects.create(
+            project=project,
+            identifier='v{0}'.format(Version.objects.count()),
+            verbose_name='v{0}'.format(Version.objects.count()),
+        )
+
+    def test_run_immediately(self, broadcast, sync_supported_versions, on_commit):
+        self.create_version(self.project)
+        self.create_version(self.project)
+        self.assertEqual(sync_supported_versions.call_count, 2)
+        self.assertEqual(broadcast.call_count, 2)
+        on_commit.assert_not_called()
+
+    def test_collect(self, broadcast, sync_supported_versions, on_commit):
+        with collect_side_effects():
+            for __ in range(10):
+                self.create_version(self.project)
+            sync_supported_versions.assert_not_called()
+        sync_supported_versions.assert_called_once_with()
+
+        # Tasks are sent once the transaction commits
+        broadcast.assert_not_called()
+        self.assertEqual(on_commit.call_count, 1)
+        on_commit.call_args[0][0]()
+        broadcast.assert_called_once_with(
+            type='app', task=symlink_project, args=[self.project.pk])
+
+    def test_collect_per_project(self, broadcast, sync_supported_versions,
+                                 on_commit):
+        other_project = get(Project, main_language_project=None)
+        sync_supported_versions.reset_mock()
+        broadcast.reset_mock()
+        with collect_side_effects():
+            with collect_side_effects():
+                self.create_version(self.project)
+                self.create_version(other_project)
+            self.create_version(self.project)
+        self.assertEqual(sync_supported_versions.call_count, 2)
+        on_commit.call_args[0][0]()
+        self.assertEqual(
+            [call[1]['args'] for call in broadcast.call_args_list],
+            [[self.project.pk], [other_project.pk]],
+        )
+
+    def test_discard_on_error(self, broadcast, sync_supported_versions,
+                              on_commit):
+        with self.assertRaises(ValueError):
+            with collect_side_effects():
+                self.create_version(self.project)
+                raise ValueError
+        sync_supported_versions.assert_not_called()
+        on_commit.assert_not_called()
+
+        # Actions run right away again after the block
+        run_side_effect('action', sync_supported_versions)
+        sync_supported_versions.assert_called_once_with()
+
+    def test_failed_action(self, broadcast, sync_supported_versions, on_commit):
+        sync_supported_versions.side_effect = ValueError
+        with collect_side_effects():
+            self.create_version(self.project)
+        sync_supported_versions.assert_called_once_with()
+        on_commit.call_args[0][0]()
+        broadcast.assert_called_once_with(
+            type='app', task=symlink_project, args=[self.project.pk])
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import os
+import shutil
+import tempfile
+
+import mock
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from readthedocs.builds.syncers import (
+    LocalFanOutSyncer, LocalSnapshotSyncer, SyncError, build_manifest,
+    diff_manifests, files_equal, manifest_path)
+
+
+class LocalSnapshotSyncerTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'source')
+        self.target = os.path.join(self.root, 'target')
+        os.makedirs(os.path.join(self.source, '_static'))
+        self.write(self.source, 'index.html', 'index')
+        self.write(self.source, '_static/style.css', 'body {}')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, base, name, content):
+        with open(os.path.join(base, name), 'w') as fh:
+            fh.write(content)
+
+    def read(self, base, name):
+        with open(os.path.join(base, name)) as fh:
+            return fh.read()
+
+    def test_copy_tree_to_missing_target(self):
+        LocalSnapshotSyncer.copy(self.source, self.target)
+        self.assertEqual(self.read(self.target, 'index.html'), 'index')
+        self.assertEqual(self.read(self.target, '_static/style.css'), 'body {}')
+        self.assertEqual(sorted(os.listdir(self.root)), ['source', 'target'])
+
+    def test_copy_tree_links_unchanged_files(self):
+        LocalSnapshotSyncer.copy(self.source, self.target)
+        css_inode = os.stat(os.path.join(self.target, '_static/style.css')).st_ino
+        self.write(self.source, 'index.html', 'changed')
+        self.write(self.source, 'new.html', 'new')
+        os.remove(os.path.join(self.source, '_static/style.css'))
+        self.write(self.source, '_static/style.css', 'body {}')
+
+        LocalSnapshotSyncer.copy(self.source, self.target)
+
+        self.assertEqual(self.read(self.target, 'index.html'), 'changed')
+        self.assertEqual(self.read(self.target, 'new.html'), 'new')
+        # The unchanged file is the same file on disk, it was not rewritten
+        self.assertEqual(
+            os.stat(os.path.join(self.target, '_static/style.css')).st_ino,
+            css_inode,
+        )
+        self.assertEqual(sorted(os.listdir(self.root)), ['source', 'target'])
+
+    def test_copy_tree_removes_stale_files(self):
+        self.write(self.source, 'old.html', 'old')
+        LocalSnapshotSyncer.copy(self.source, self.target)
+        os.remove(os.path.join(self.source, 'old.html'))
+        LocalSnapshotSyncer.copy(self.source, self.target)
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'old.html')))
+
+    def test_copy_file(self):
+        source = os.path.join(self.source, 'index.html')
+        target = os.path.join(self.root, 'media', 'index.html')
+        LocalSnapshotSyncer.copy(source, target, is_file=True)
+        self.assertTrue(files_equal(source, target))
+        self.assertEqual(os.listdir(os.path.join(self.root, 'media')), ['index.html'])
+
+
+class LocalFanOutSyncerTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'source')
+        os.makedirs(self.source)
+        for name in ['index.html', 'search.html']:
+            with open(os.path.join(self.source, name), 'w') as fh:
+                fh.write(name)
+        self.settings = override_settings(
+            MULTIPLE_APP_SERVERS=['web01', 'web02', 'web03'],
+            SYNC_LOCAL_ROOT=os.path.join(self.root, 'servers'),
+            SYNC_MAX_WORKERS=2,
+            SYNC_RETRIES=1,
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.root)
+
+    def test_manifest_diff(self):
+        manifest = build_manifest(self.source)
+        self.assertEqual(sorted(manifest), ['index.html', 'search.html'])
+        previous = dict(manifest)
+        previous['old.html'] = [3, 'abc']
+        previous['index.html'] = [1, 'abc']
+        self.assertEqual(
+            diff_manifests(previous, manifest),
+            (['index.html'], ['old.html']),
+        )
+
+    def test_copy_to_all_servers(self):
+        results = LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        self.assertEqual(
+            sorted(result['server'] for result in results),
+            ['web01', 'web02', 'web03'],
+        )
+        self.assertTrue(all(result['success'] for result in results))
+        for server in ['web01', 'web02', 'web03']:
+            path = LocalFanOutSyncer.server_path(server, '/docs/pip/latest')
+            self.assertEqual(
+                sorted(os.listdir(path)),
+                ['index.html', 'search.html'],
+            )
+
+    def test_copy_only_sends_changes(self):
+        LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        with open(os.path.join(self.source, 'index.html'), 'w') as fh:
+            fh.write('changed')
+        with mock.patch.object(
+                LocalFanOutSyncer, 'copy_to_server',
+                side_effect=LocalFanOutSyncer.copy_to_server) as copy:
+            LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        self.assertEqual(copy.call_count, 3)
+        for call in copy.call_args_list:
+            self.assertEqual(call[1]['files'], ['index.html'])
+        path = LocalFanOutSyncer.server_path('web01', '/docs/pip/latest')
+        with open(os.path.join(path, 'index.html')) as fh:
+            self.assertEqual(fh.read(), 'changed')
+
+        # The servers have the same files, so nothing is sent
+        with mock.patch.object(LocalFanOutSyncer, 'copy_to_server') as copy:
+            results = LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        copy.assert_not_called()
+        self.assertTrue(all(result['success'] for result in results))
+
+    def test_failed_server_is_retried_and_reported(self):
+        copy_to_server = LocalFanOutSyncer.copy_to_server
+
+        def flaky_copy(server, *args, **kwargs):
+            if server == 'web02':
+                raise SyncError('connection refused')
+            return copy_to_server(server, *args, **kwargs)
+
+        with mock.patch.object(
+                LocalFanOutSyncer, 'copy_to_server', side_effect=flaky_copy):
+            results = LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+
+        results = {result['server']: result for result in results}
+        self.assertTrue(results['web01']['success'])
+        self.assertEqual(results['web01']['attempts'], 1)
+        self.assertFalse(results['web02']['success'])
+        self.assertEqual(results['web02']['attempts'], 2)
+        self.assertEqual(results['web02']['error'], 'connection refused')
+
+    def test_removed_target_is_sent_again(self):
+        LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        path = LocalFanOutSyncer.server_path('web02', '/docs/pip/latest')
+        shutil.rmtree(path)
+        LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        self.assertEqual(
+            sorted(os.listdir(path)),
+            ['index.html', 'search.html'],
+        )
+
+    def test_manifest_is_written_next_to_the_target(self):
+        LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        for server in ['web01', 'web02', 'web03']:
+            path = LocalFanOutSyncer.server_path(server, '/docs/pip/latest')
+            self.assertTrue(os.path.isfile(manifest_path(path)))
+            self.assertNotIn('rtd-manifest', ''.join(os.listdir(path)))
+
+        # Only the source is hashed, the servers' manifests are read
+        with mock.patch(
+                'readthedocs.builds.syncers.build_manifest',
+                side_effect=build_manifest) as manifest:
+            LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        manifest.assert_called_once_with(self.source)
+
+    def test_missing_manifest_sends_everything(self):
+        LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        path = LocalFanOutSyncer.server_path('web02', '/docs/pip/latest')
+        os.remove(manifest_path(path))
+        with mock.patch.object(LocalFanOutSyncer, 'copy_to_server') as copy:
+            LocalFanOutSyncer.copy(self.source, '/docs/pip/latest')
+        copy.assert_called_once_with(
+            'web02', self.source, '/docs/pip/latest', is_file=False,
+            files=None)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import itertools
+
+from django.test import TestCase
+from django_dynamic_fixture import get
+
+from readthedocs.builds.constants import BRANCH, TAG
+from readthedocs.builds.models import Version
+from readthedocs.projects.models import Project
+from readthedocs.projects.version_handling import (
+    determine_stable_version, highest_version, parse_version_failsafe,
+    sort_versions, version_sort_key)
+
+
+class VersionSortKeyTests(TestCase):
+
+    versions = [
+        '0.0.1', '0.1', '1', '1.0', '1.0.0', '1.0.1', '1.1', '1.9', '1.10',
+        '10.0', '20180101', '1!0.1', 'v2.0',
+        '1.0.dev1', '1.0a1.dev1', '1.0a1', '1.0a2', '1.0b1', '1.0c1',
+        '1.0rc1', '1.0rc1.post2.dev3', '1.0.post0', '1.0.post1.dev2',
+        '1.0.post1', '1.0+abc', '1.0+5', '1.0+abc.5', '1.0+abc.b', '1.0+ab',
+        '1.0+abz', '1.0+ab9', '1.2', '1.2.0.1',
+    ]
+
+    def test_same_order_as_parsed_versions(self):
+        for first, second in itertools.product(self.versions, repeat=2):
+            parsed = (
+                parse_version_failsafe(first), parse_version_failsafe(second))
+            keys = (version_sort_key(first), version_sort_key(second))
+            self.assertEqual(
+                parsed[0] < parsed[1], keys[0] < keys[1], (first, second))
+            self.assertEqual(
+                parsed[0] == parsed[1], keys[0] == keys[1], (first, second))
+
+    def test_keys_are_alphanumeric(self):
+        # Collations may ignore punctuation, like most of the PostgreSQL ones
+        for version in self.versions:
+            self.assertRegexpMatches(version_sort_key(version), '^[0-9a-z]+$')
+
+    def test_invalid_versions(self):
+        self.assertEqual(version_sort_key('latest'), '')
+        self.assertEqual(version_sort_key('feature/foo'), '')
+        self.assertEqual(version_sort_key('1.' + '9' * 100), '')
+
+    def test_saved_on_version(self):
+        project = get(Project, main_language_project=None)
+        version = get(Version, project=project, verbose_name='1.2.3')
+        self.assertEqual(version.sort_key, version_sort_key('1.2.3'))
+        version.verbose_name = 'foo'
+        version.save()
+        self.assertEqual(
+            Version.objects.get(pk=version.pk).sort_key, '')
+
+
+class VersionQuerySetHandlingTests(TestCase):
+
+    def setUp(self):
+        self.project = get(Project, main_language_project=None)
+        for verbose_name, type_ in [
+                ('1.0', TAG), ('1.10', TAG), ('1.9', TAG), ('2.0rc1', TAG),
+                ('3.0', BRANCH), ('foo', BRANCH), ('0.1.post1', TAG)]:
+            get(Version, project=self.project, verbose_name=verbose_name,
+                slug=verbose_name, type=type_)
+        self.queryset = self.project.versions.all()
+
+    def test_sort_versions(self):
+        sorted_versions = sort_versions(self.queryset)
+        self.assertEqual(
+            [(version.verbose_name, str(comparable))
+             for version, comparable in sorted_versions],
+            [(version.verbose_name, str(comparable))
+             for version, comparable in sort_versions(list(self.queryset))],
+        )
+        self.assertEqual(
+            [version.verbose_name for version, __ in sorted_versions],
+            ['3.0', '2.0rc1', '1.10', '1.9', '1.0', '0.1.post1'],
+        )
+
+    def test_highest_version(self):
+        version, comparable = highest_version(self.queryset)
+        self.assertEqual(version.verbose_name, '3.0')
+        self.assertEqual(str(comparable), '3.0')
+        self.assertEqual(
+            highest_version(self.queryset.filter(verbose_name='foo')),
+            (None, None),
+        )
+
+    def test_determine_stable_version(self):
+        self.assertEqual(
+            determine_stable_version(self.queryset).verbose_name, '1.10')
+        self.assertEqual(
+            determine_stable_version(
+                self.queryset.filter(type=BRANCH)).verbose_name,
+            '3.0',
+        )
+        self.assertIsNone(determine_stable_version(
+            self.queryset.filter(verbose_name__in=['2.0rc1', 'foo'])))
@@ -95,3 +95,48 @@ class VersionSlugFieldTests(TestCase):
         self.assertEqual(field.uniquifying_suffix(25), '_z')
         self.assertEqual(field.uniquifying_suffix(26), '_ba')
         self.assertEqual(field.uniquifying_suffix(52), '_ca')
+
+    def test_uniqueness_single_query(self):
+        for verbose_name in ['1!0', '1%0', '1?0', '1-0-beta', '2-0']:
+            Version.objects.create(verbose_name=verbose_name, project=self.pip)
+        version = Version(verbose_name='1#0', project=self.pip)
+        field = Version._meta.get_field('slug')
+        with self.assertNumQueries(1):
+            slug = field.create_slug(version)
+        self.assertEqual(slug, '1-0_c')
+
+    def test_uniqueness_truncated(self):
+        field = Version._meta.get_field('slug')
+        verbose_name = 'a' * field.max_length
+        version = Version.objects.create(
+            verbose_name=verbose_name, project=self.pip)
+        self.assertEqual(version.slug, verbose_name)
+
+        version = Version.objects.create(
+            verbose_name=verbose_name + 'b', project=self.pip)
+        self.assertEqual(version.slug, 'a' * (field.max_length - 2) + '_a')
+
+    def test_create_slugs(self):
+        Version.objects.create(verbose_name='1.0', project=self.pip)
+        Version.objects.create(verbose_name='1.0', project=self.pip)
+        other = Project.objects.exclude(pk=self.pip.pk).first()
+        versions = [
+            Version(verbose_name='1.0', project=self.pip),
+            Version(verbose_name='1%0', project=self.pip),
+            Version(verbose_name='1?0', project=self.pip),
+            Version(verbose_name='1.0', project=other),
+            Version(verbose_name='2.0', project=self.pip, slug='two'),
+        ]
+        field = Version._meta.get_field('slug')
+        with self.assertNumQueries(2):
+            slugs = field.create_slugs(versions)
+        self.assertEqual(slugs, ['1.0_b', '1-0', '1-0_a', '1.0', 'two'])
+        self.assertEqual(
+            [version.slug for version in versions],
+            ['1.0_b', '1-0', '1-0_a', '1.0', 'two'],
+        )
+
+        for version in versions:
+            version.save()
+        self.assertEqual(
+            Version.objects.get(pk=versions[0].pk).slug, '1.0_b')
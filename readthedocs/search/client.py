@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Elasticsearch clients shared by the search indexes.
+
+Each client keeps a pool of keep-alive connections per host, so the indexes
+use a single client per process instead of creating one, and opening new
+connections, each time they are instantiated. Processes forked from one that
+already had clients, like the celery and uwsgi workers, create their own
+instead of sharing the sockets of the parent. The connection reuse of the
+clients is logged when a celery worker process shuts down.
+
+Settings
+--------
+
+ES_HOSTS - Hosts of the Elasticsearch cluster
+ES_TIMEOUT (10) - Seconds to wait for a response
+ES_MAX_RETRIES (3) - Number of times a failed request is retried on another
+    connection
+ES_RETRY_ON_TIMEOUT (False) - Whether timed out requests are retried
+ES_MAX_CONNECTIONS (10) - Number of connections kept open to each host
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import logging
+import os
+import threading
+
+from django.conf import settings
+from elasticsearch import Elasticsearch
+
+log = logging.getLogger(__name__)
+
+_clients = {}
+_clients_pid = None
+_lock = threading.Lock()
+
+
+def create_client(hosts):
+    """Elasticsearch client for ``hosts``, configured from the settings."""
+    return Elasticsearch(
+        hosts,
+        timeout=getattr(settings, 'ES_TIMEOUT', 10),
+        max_retries=getattr(settings, 'ES_MAX_RETRIES', 3),
+        retry_on_timeout=getattr(settings, 'ES_RETRY_ON_TIMEOUT', False),
+        maxsize=getattr(settings, 'ES_MAX_CONNECTIONS', 10),
+    )
+
+
+def get_client(hosts=None):
+    """
+    Shared Elasticsearch client of this process for ``hosts``.
+
+    :param hosts: list of hosts, defaults to ``ES_HOSTS``
+    """
+    global _clients_pid
+    if hosts is None:
+        hosts = settings.ES_HOSTS
+    key = tuple(hosts)
+    pid = os.getpid()
+    with _lock:
+        if _clients_pid != pid:
+            # Forked, the connections of the parent can't be used
+            _clients.clear()
+            _clients_pid = pid
+        client = _clients.get(key)
+        if client is None:
+            log.debug('Creating Elasticsearch client: hosts=%s pid=%s',
+                      hosts, pid)
+            client = _clients[key] = create_client(hosts)
+    return client
+
+
+def clear_clients():
+    """Drop the clients of this process, they are created again on use."""
+    with _lock:
+        _clients.clear()
+
+
+def get_client_stats():
+    """
+    Connection reuse of the clients of this process.
+
+    :returns: a list of dictionaries with the host, the number of connections
+        opened and the number of requests made to it, for each connection of
+        the clients
+    """
+    stats = []
+    with _lock:
+        if _clients_pid != os.getpid():
+            return stats
+        clients = list(_clients.values())
+    for client in clients:
+        for connection in client.transport.connection_pool.connections:
+            pool = getattr(connection, 'pool', None)
+            if pool is None:
+                continue
+            stats.append({
+                'host': connection.host,
+                'connections': pool.num_connections,
+                'requests': pool.num_requests,
+                'reused': max(pool.num_requests - pool.num_connections, 0),
+            })
+    return stats
+
+
+def log_client_stats():
+    """Log the connection reuse of the clients of this process."""
+    for stats in get_client_stats():
+        log.info(
+            'Elasticsearch connections: host=%s connections=%s requests=%s '
+            'reused=%s pid=%s',
+            stats['host'], stats['connections'], stats['requests'],
+            stats['reused'], os.getpid(),
+        )
@@ -10,6 +10,9 @@ Django settings that should be defined:
 
     `ES_DEFAULT_NUM_SHARDS`: An integer of the number of shards.
 
+The client and its connections are shared, see
+:py:mod:`readthedocs.search.client` for the connection settings.
+
 
 TODO: Handle page removal case in Page.
 
@@ -18,11 +21,13 @@ from __future__ import absolute_import
 from builtins import object
 import datetime
 
-from elasticsearch import Elasticsearch, exceptions
+from elasticsearch import exceptions
 from elasticsearch.helpers import bulk_index
 
 from django.conf import settings
 
+from readthedocs.search.client import get_client
+
 
 class Index(object):
 
@@ -34,7 +39,7 @@ class Index(object):
     _type = None
 
     def __init__(self):
-        self.es = Elasticsearch(settings.ES_HOSTS)
+        self.es = get_client()
 
     def get_settings(self, settings_override=None):
         """
@@ -252,6 +252,11 @@ class CommunityBaseSettings(Settings):
             'schedule': crontab(minute=30),
             'options': {'queue': 'web'},
         },
+        'minutely-schedule-builds': {
+            'task': 'readthedocs.projects.tasks.schedule_builds',
+            'schedule': crontab(),
+            'options': {'queue': 'web'},
+        },
         'quarter-finish-inactive-builds': {
             'task': 'readthedocs.projects.tasks.finish_inactive_builds',
             'schedule': crontab(minute='*/15'),
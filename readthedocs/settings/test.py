@@ -17,6 +17,14 @@ class CommunityTestSettings(CommunityDevSettings):
     DEBUG = False
     TEMPLATE_DEBUG = False
 
+    # These are kept between tests, the serving tests enable them
+    SERVE_FILE_CACHE_SIZE = 0
+    SERVE_PERMISSION_CACHE_TIMEOUT = 0
+    VISIBILITY_CACHE_TIMEOUT = 0
+
+    # Builds start right away, the build trigger tests enable it
+    BUILD_DEBOUNCE_SECONDS = 0
+
     @property
     def LOGGING(self):  # noqa - avoid pep8 N802
         logging = super(CommunityDevSettings, self).LOGGING
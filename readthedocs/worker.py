@@ -6,6 +6,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown
 from django.conf import settings
 
 
@@ -23,3 +24,11 @@ def create_application():
 
 
 app = create_application()  # pylint: disable=invalid-name
+
+
+@worker_process_shutdown.connect
+def log_search_client_stats(**__):
+    """Log the reuse of the Elasticsearch connections of the process."""
+    # Avoid loading the search clients on startup
+    from readthedocs.search.client import log_client_stats
+    log_client_stats()
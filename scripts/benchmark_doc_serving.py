@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the doc serving from Python.
+
+Serves the pages of a private version to a member of the project, with the
+serving caches disabled and then enabled, and prints the requests per second
+of each. It runs on a test database and a temporary web root::
+
+    PYTHONPATH=.:readthedocs DJANGO_SETTINGS_MODULE=readthedocs.settings.test \\
+        python scripts/benchmark_doc_serving.py --requests 2000
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import django
+
+
+def create_docs(pages):
+    """Create a private project with ``pages`` pages in its ``latest``."""
+    from django.contrib.auth.models import User
+    from readthedocs.projects import constants
+    from readthedocs.projects.models import Project
+
+    user = User.objects.create_user('bench', password='bench')
+    project = Project.objects.create(
+        name='bench', slug='bench', repo='https://example.com/bench',
+        privacy_level=constants.PRIVATE, main_language_project=None)
+    project.users.add(user)
+    version = project.versions.get(slug='latest')
+    version.privacy_level = constants.PRIVATE
+    version.save()
+
+    # The web root links to the built docs
+    docs = project.rtd_build_path(version.slug)
+    os.makedirs(docs)
+    for page in range(pages):
+        with open(os.path.join(docs, 'page{0}.html'.format(page)), 'w') as fd:
+            fd.write('<html><body>{0}</body></html>'.format('x' * 10000))
+    return user
+
+
+def benchmark(client, pages, requests):
+    """Requests per second serving the pages in turn."""
+    urls = [
+        '/docs/bench/en/latest/page{0}.html'.format(page)
+        for page in range(pages)
+    ]
+    # Warm up
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+        b''.join(response.streaming_content)
+
+    start = time.time()
+    for request in range(requests):
+        response = client.get(urls[request % pages])
+        b''.join(response.streaming_content)
+    return requests / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--pages', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'readthedocs.settings.test')
+    django.setup()
+
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings, setup_test_environment
+    from readthedocs.core.serve_cache import served_files
+    from readthedocs.core.symlink import PrivateSymlinkBase
+
+    setup_test_environment()
+    database = connection.creation.create_test_db(verbosity=0)
+    root = tempfile.mkdtemp()
+    for attribute in ['WEB_ROOT', 'CNAME_ROOT', 'PROJECT_CNAME_ROOT']:
+        setattr(
+            PrivateSymlinkBase, attribute,
+            os.path.join(root, attribute.lower()))
+    try:
+        with override_settings(
+                DOCROOT=os.path.join(root, 'user_builds'), USE_SUBDOMAIN=False,
+                PYTHON_MEDIA=True, SERVE_DOCS=['private']):
+            user = create_docs(args.pages)
+            client = Client()
+            client.force_login(user)
+            results = []
+            for name, file_cache_size, permission_timeout in [
+                    ('uncached', 0, 0), ('cached', 10000, 60)]:
+                cache.clear()
+                served_files.clear()
+                with override_settings(
+                        SERVE_FILE_CACHE_SIZE=file_cache_size,
+                        SERVE_PERMISSION_CACHE_TIMEOUT=permission_timeout):
+                    results.append(
+                        (name, benchmark(client, args.pages, args.requests)))
+        for name, requests_per_second in results:
+            print('{0}: {1:.0f} requests/s'.format(name, requests_per_second))
+    finally:
+        shutil.rmtree(root)
+        connection.creation.destroy_test_db(database, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
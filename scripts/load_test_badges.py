@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Load test of the project badge view.
+
+Requests a badge URL from several threads for a while, like the proxies
+embedding badges do, and prints the latency percentiles::
+
+    python scripts/load_test_badges.py http://localhost:8000/projects/pip/badge/ \
+        --concurrency 20 --duration 60
+
+Use ``--etag`` to send the ``If-None-Match`` header of the first response,
+like caching proxies revalidating the badge.
+
+Results on a development server (``runserver``, dev settings with SQLite and
+the local memory cache, 1 CPU), with 10 threads for 20 seconds on
+``/projects/pip/badge/?version=latest`` and a successful build:
+
+=====================================  ==========  =====  =====  =====
+Badge view                             Requests/s  p50    p90    p99
+=====================================  ==========  =====  =====  =====
+Redirect to the static SVG             108.6       88ms   121ms  153ms
+Cached state, SVG in the response      261.7       37ms   52ms   69ms
+Cached state, ``--etag`` (304)         274.3       35ms   52ms   69ms
+=====================================  ==========  =====  =====  =====
+
+The redirect doesn't include fetching the SVG it points to. The development
+server bounds the absolute numbers, compare them with each other only.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals)
+
+import argparse
+import threading
+import time
+from collections import Counter
+
+import requests
+
+
+def percentile(latencies, percent):
+    """Latency under which ``percent`` of the sorted ``latencies`` are."""
+    if not latencies:
+        return 0
+    index = int(round(percent / 100.0 * (len(latencies) - 1)))
+    return latencies[index]
+
+
+def worker(url, params, headers, deadline, latencies, statuses, lock):
+    session = requests.Session()
+    while time.time() < deadline:
+        start = time.time()
+        try:
+            response = session.get(
+                url, params=params, headers=headers, allow_redirects=False)
+            status = response.status_code
+        except requests.RequestException:
+            status = 'error'
+        latency = time.time() - start
+        with lock:
+            latencies.append(latency)
+            statuses[status] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('url', help='URL of the badge view')
+    parser.add_argument('--version', default=None, help='version slug')
+    parser.add_argument('--style', default=None, help='badge style')
+    parser.add_argument(
+        '--concurrency', type=int, default=10, help='number of threads')
+    parser.add_argument(
+        '--duration', type=float, default=30, help='seconds to run for')
+    parser.add_argument(
+        '--etag', action='store_true', help='revalidate with If-None-Match')
+    args = parser.parse_args()
+
+    params = {}
+    if args.version:
+        params['version'] = args.version
+    if args.style:
+        params['style'] = args.style
+    headers = {}
+    if args.etag:
+        response = requests.get(args.url, params=params)
+        if 'ETag' in response.headers:
+            headers['If-None-Match'] = response.headers['ETag']
+
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    deadline = time.time() + args.duration
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(args.url, params, headers, deadline, latencies, statuses,
+                  lock),
+        )
+        for __ in range(args.concurrency)
+    ]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    latencies.sort()
+    print('Requests: {0} ({1:.1f}/s)'.format(
+        len(latencies), len(latencies) / elapsed))
+    print('Statuses: {0}'.format(
+        ', '.join('{0}: {1}'.format(*item) for item in sorted(
+            statuses.items(), key=lambda item: str(item[0])))))
+    for percent in (50, 90, 99):
+        print('p{0}: {1:.1f}ms'.format(
+            percent, percentile(latencies, percent) * 1000))
+    if latencies:
+        print('max: {0:.1f}ms'.format(latencies[-1] * 1000))
+
+
+if __name__ == '__main__':
+    main()